@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+
+## @file argoReader.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_bloom as ab
+import argo2parquet.argo_catalog as ac
+import argo2parquet.argo_layout as al
+import argo2parquet.argo_manifest as am
+import argo2parquet.argo_normalize as an
+import argo2parquet.argo_summary as asm
+import dask.dataframe as dd
+import numpy as np
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pds
+import pyarrow.parquet as pq
+##########################################################################
+
+# columns returned by query() for any parameter
+QUERY_VARS = ["PLATFORM_NUMBER", "CYCLE_NUMBER", "N_PROF", "N_LEVELS", "DIRECTION", "DATA_MODE", "JULD", "JULD_QC", "LATITUDE", "LONGITUDE", "POSITION_QC", "PRES_ADJUSTED", "PRES_ADJUSTED_QC"]
+
+# columns of each parameter returned by query()
+PARAM_SUFFIXES = ["", "_QC", "_ADJUSTED", "_ADJUSTED_QC", "_ADJUSTED_ERROR", "_DATA_MODE", "_dPRES"]
+
+class argoReader():
+
+    """class argoReader: reads floats and cycles of a parquet database
+    through its catalog (see argo_catalog.py), decoding only the row groups
+    that hold them, and runs queries by region, time, pressure, float,
+    parameter and QC flags on the files whose bounding box and time range
+    (summarized from the catalog) overlap the query; queries by float skip
+    the row groups that the membership index (see argo_bloom.py) rules out;
+    gridded statistics are answered from the summaries (see argo_summary.py),
+    and profiles from the normalized tables (see argo_normalize.py), whose
+    levels are joined on demand
+    """
+
+    # ------------------------------------------------------------------ #
+    # Constructors/Destructors                                           #
+    # ------------------------------------------------------------------ #
+
+    def __init__(self, db_dir, db_type=None):
+        """Constructor
+
+        Arguments:
+        db_dir  -- folder of the parquet database
+        db_type -- "PHY" (default) or "BGC"
+        """
+
+        self.db_dir = db_dir
+
+        if db_type is None:
+            self.db_type = "PHY"
+        elif db_type.upper() not in ["PHY", "BGC"]:
+            raise ValueError("db_type can only take values PHY or BGC.")
+        else:
+            self.db_type = db_type.upper()
+
+        self.catalog = ac.load_catalog(self.db_dir, self.db_type)
+        if self.catalog is None:
+            print("No catalog found at " + ac.catalog_fname(self.db_dir, self.db_type) + ", indexing the database.")
+            self.catalog, _ = ac.build_catalog(self.db_dir, self.db_type)
+
+        self.bloom = ab.load_index(self.db_dir, self.db_type)
+        if self.bloom is None:
+            print("No membership index found at " + ab.bloom_fname(self.db_dir, self.db_type) + ", indexing the row groups.")
+            self.bloom, _ = ab.build_index(self.db_dir, self.db_type)
+
+        self.platforms = self.catalog["PLATFORM_NUMBER"].to_numpy()
+        self.files = {}
+        self.grid_summary = None
+
+        # per-file bounding box and time range, used to prune files
+        self.summary = self.catalog.groupby("file").agg(
+            lat_min=("lat_min", "min"),
+            lat_max=("lat_max", "max"),
+            lon_min=("lon_min", "min"),
+            lon_max=("lon_max", "max"),
+            juld_min=("juld_min", "min"),
+            juld_max=("juld_max", "max"),
+        )
+
+        # schema of the database, with the partition keys if any
+        fragments = am.list_fragments(self.db_dir, self.db_type)
+        self.schema = None
+        if len(fragments) > 0:
+            self.schema = pds.dataset(fragments[:1], format="parquet", partitioning="hive", partition_base_dir=self.db_dir).schema
+
+        pass
+
+    # ------------------------------------------------------------------ #
+    # Methods                                                            #
+    # ------------------------------------------------------------------ #
+
+#------------------------------------------------------------------------------#
+## Catalog entries of a float
+    def lookup(self, platform_number, cycle_number=None):
+        """Catalog entries of a float, or of some of its cycles
+
+        Arguments:
+        platform_number -- WMO identifier of the float
+        cycle_number    -- cycle number or list of cycle numbers (default:
+                           None, all the cycles)
+
+        Returns:
+        entries -- dataframe with the rows of the catalog (see
+                   argo_catalog.index_fragment)
+        """
+
+        start, stop = np.searchsorted(self.platforms, [platform_number, platform_number + 1])
+        entries = self.catalog.iloc[start:stop]
+
+        if cycle_number is not None:
+            entries = entries.loc[ entries["CYCLE_NUMBER"].isin(np.atleast_1d(cycle_number)) ]
+
+        return entries
+
+#------------------------------------------------------------------------------#
+## Read a float
+    def read_float(self, platform_number, cycle_number=None, columns=None):
+        """Read the rows of a float, or of some of its cycles
+
+        Arguments:
+        platform_number -- WMO identifier of the float
+        cycle_number    -- cycle number or list of cycle numbers (default:
+                           None, all the cycles)
+        columns         -- list of columns to read (default: all)
+
+        Returns:
+        table -- pyarrow table with the rows of the float, in the order of
+                 the catalog
+        """
+
+        entries = self.lookup(platform_number, cycle_number)
+
+        read_columns = columns
+        if columns is not None:
+            read_columns = list(columns) + [c for c in ["PLATFORM_NUMBER", "CYCLE_NUMBER"] if c not in columns]
+
+        tables = []
+        for (fname, row_group), group in entries.groupby(["file", "row_group"], sort=False):
+            table = self.__file(fname).read_row_group(row_group, columns=read_columns)
+            start = group["row_start"].min()
+            table = table.slice(start, group["row_stop"].max() - start)
+
+            keep = pc.equal(table["PLATFORM_NUMBER"].cast(pa.int64()), platform_number)
+            if cycle_number is not None:
+                keep = pc.and_(keep, pc.is_in(table["CYCLE_NUMBER"].cast(pa.int64()), value_set=pa.array(np.atleast_1d(cycle_number), type=pa.int64())))
+            tables.append( table.filter(keep) )
+
+        if len(tables) == 0:
+            return self.__empty_table(columns)
+
+        table = pa.concat_tables(tables)
+        if columns is not None:
+            table = table.select(columns)
+
+        return table
+
+#------------------------------------------------------------------------------#
+## Row groups of floats
+    def bloom_row_groups(self, floats, cycles=None):
+        """Row groups that may hold some of the floats, according to the
+        membership index
+
+        Arguments:
+        floats -- list of PLATFORM_NUMBER
+        cycles -- list of CYCLE_NUMBER (default: None, any cycle)
+
+        Returns:
+        row_groups -- dict with the list of row groups of each file (path
+                      relative to db_dir); the files without any are left out
+        """
+
+        keep = ab.might_contain(self.bloom["PLATFORM_NUMBER"], floats)
+        if cycles is not None:
+            keep &= ab.might_contain(self.bloom["CYCLE_NUMBER"], cycles)
+
+        row_groups = {}
+        for fname, row_group in zip(self.bloom["fragment"][keep], self.bloom["row_group"][keep]):
+            row_groups.setdefault(str(fname), []).append(int(row_group))
+
+        return row_groups
+
+#------------------------------------------------------------------------------#
+## Report the row groups skipped for a float
+    def bloom_report(self, platform_number, cycle_number=None):
+        """Print the row groups that a query of a single float skips thanks to
+        the membership index, compared to the min/max statistics of the row
+        groups
+
+        Arguments:
+        platform_number -- WMO identifier of the float
+        cycle_number    -- cycle number (default: None, all the cycles)
+
+        Returns:
+        selected -- number of row groups read with the membership index
+        stats    -- number of row groups read with the statistics alone
+        total    -- number of row groups in the database
+        """
+
+        cycles = None if cycle_number is None else [cycle_number]
+        selected = sum(len(rgs) for rgs in self.bloom_row_groups([platform_number], cycles).values())
+
+        filters = [("PLATFORM_NUMBER", "==", platform_number)]
+        if cycle_number is not None:
+            filters.append( ("CYCLE_NUMBER", "==", cycle_number) )
+        dataset = pds.dataset(am.list_fragments(self.db_dir, self.db_type), schema=self.schema, format="parquet", partitioning="hive", partition_base_dir=self.db_dir)
+        stats, total = al.row_group_pruning(dataset, filters)
+
+        if total > 0:
+            print("Float " + str(platform_number) + ": " + str(total - selected) + " of " + str(total) + " row groups skipped by the membership index (" + "{:.1%}".format(1 - selected/total) + "), " + str(total - stats) + " by the row group statistics.")
+
+        return selected, stats, total
+
+#------------------------------------------------------------------------------#
+## Filters of a query
+    def filters(self, region=None, time=None, pres=None, floats=None, params=None, qc=None):
+        """Filters of a query in disjunctive normal form, as taken by
+        pyarrow.parquet.filters_to_expression and dask.dataframe.read_parquet;
+        all bounds are inclusive
+
+        Arguments:
+        region -- (lat_min, lat_max, lon_min, lon_max) in degrees; if lon_min
+                  is larger than lon_max, the region crosses the antimeridian
+        time   -- (start, end) of JULD, as datetimes or strings
+        pres   -- (min, max) of PRES_ADJUSTED in dbar
+        floats -- list of PLATFORM_NUMBER
+        params -- list of parameters, e.g. ["TEMP", "PSAL"]; with qc, the
+                  <PARAM>_ADJUSTED_QC flags are filtered
+        qc     -- list of accepted QC flags, e.g. [1, 2], applied to the
+                  adjusted QC flags of params and of PRES_ADJUSTED if pres is
+                  given
+
+        Returns:
+        filters -- list of lists of (column, op, value) tuples: the inner
+                   lists are combined with AND, the outer with OR
+        """
+
+        conjunction = []
+
+        lon_wrap = None
+        if region is not None:
+            lat_min, lat_max, lon_min, lon_max = region
+            conjunction += [("LATITUDE", ">=", lat_min), ("LATITUDE", "<=", lat_max)]
+            if lon_min <= lon_max:
+                conjunction += [("LONGITUDE", ">=", lon_min), ("LONGITUDE", "<=", lon_max)]
+            else:
+                lon_wrap = [("LONGITUDE", ">=", lon_min), ("LONGITUDE", "<=", lon_max)]
+
+        if time is not None:
+            conjunction += [("JULD", ">=", pd.Timestamp(time[0]).to_datetime64()), ("JULD", "<=", pd.Timestamp(time[1]).to_datetime64())]
+
+        if pres is not None:
+            conjunction += [("PRES_ADJUSTED", ">=", pres[0]), ("PRES_ADJUSTED", "<=", pres[1])]
+
+        if floats is not None:
+            conjunction.append( ("PLATFORM_NUMBER", "in", [int(f) for f in np.atleast_1d(floats)]) )
+
+        if qc is not None:
+            if params is None:
+                raise ValueError("qc requires params.")
+            qc_vars = [p + "_ADJUSTED_QC" for p in params]
+            if pres is not None:
+                qc_vars.append("PRES_ADJUSTED_QC")
+            for name in qc_vars:
+                if name in self.schema.names:
+                    conjunction.append( (name, "in", [int(q) for q in qc]) )
+
+        if lon_wrap is None:
+            return [conjunction]
+
+        # across the antimeridian, the longitudes are east of lon_min or west
+        # of lon_max
+        return [conjunction + [lon_wrap[0]], conjunction + [lon_wrap[1]]]
+
+#------------------------------------------------------------------------------#
+## Files of a query
+    def query_files(self, region=None, time=None, floats=None):
+        """Files of the database that may hold rows of a query, from the
+        bounding boxes and time ranges of the files (see filters)
+
+        Returns:
+        files -- list of paths to the files
+        """
+
+        keep = np.ones(len(self.summary), dtype=bool)
+
+        if region is not None:
+            lat_min, lat_max, lon_min, lon_max = region
+            keep &= (self.summary["lat_max"] >= lat_min).to_numpy() & (self.summary["lat_min"] <= lat_max).to_numpy()
+            east = (self.summary["lon_max"] >= lon_min).to_numpy()
+            west = (self.summary["lon_min"] <= lon_max).to_numpy()
+            keep &= (east & west) if lon_min <= lon_max else (east | west)
+
+        if time is not None:
+            keep &= (self.summary["juld_max"] >= pd.Timestamp(time[0])).to_numpy() & (self.summary["juld_min"] <= pd.Timestamp(time[1])).to_numpy()
+
+        files = self.summary.index[keep]
+        if floats is not None:
+            selected = self.catalog.loc[ self.catalog["PLATFORM_NUMBER"].isin(np.atleast_1d(floats)), "file" ]
+            files = files[ files.isin(selected) ]
+
+        return [os.path.join(self.db_dir, f) for f in files]
+
+#------------------------------------------------------------------------------#
+## Run a query
+    def query(self, region=None, time=None, pres=None, floats=None, params=None, qc=None, columns=None, output=None):
+        """Read the rows of the database selected by a query: the files are
+        pruned with the catalog summary, then the filters are pushed down to
+        the row groups and rows of the remaining files
+
+        Arguments:
+        region, time, pres, floats, params, qc -- see filters
+        columns -- list of columns to return (default: QUERY_VARS and the
+                   columns of params, or all the columns if params is None)
+        output  -- "arrow" (default) for a pyarrow table, "pandas" for a
+                   dataframe, "dask" for a dask dataframe
+
+        Returns:
+        rows -- table or dataframe with the selected rows
+        """
+
+        if output is None:
+            output = "arrow"
+        elif output not in ["arrow", "pandas", "dask"]:
+            raise ValueError("output can only take values arrow, pandas or dask.")
+
+        if self.schema is None:
+            # empty database, without columns to select
+            files = []
+        else:
+            files = self.query_files(region, time, floats)
+            filters = self.filters(region, time, pres, floats, params, qc)
+            if columns is None and params is not None:
+                columns = [c for c in QUERY_VARS if c in self.schema.names]
+                columns += [p + s for p in params for s in PARAM_SUFFIXES if p + s in self.schema.names]
+
+        if len(files) == 0:
+            if self.schema is None:
+                table = pa.table({})
+            else:
+                table = self.schema.empty_table()
+                if columns is not None:
+                    table = table.select(columns)
+            if output == "arrow":
+                return table
+            elif output == "pandas":
+                return table.to_pandas()
+            else:
+                return dd.from_pandas(table.to_pandas(), npartitions=1)
+
+        if len(filters[0]) == 0:
+            filters = None
+
+        if output == "dask":
+            return dd.read_parquet(files, columns=columns, filters=filters, engine="pyarrow")
+
+        dataset = pds.dataset(files, schema=self.schema, format="parquet", partitioning="hive", partition_base_dir=self.db_dir)
+        if floats is not None:
+            dataset = self.__bloom_subset(dataset, floats)
+        table = dataset.to_table(columns=columns, filter=None if filters is None else pq.filters_to_expression(filters))
+        if output == "pandas":
+            return table.to_pandas()
+
+        return table
+
+#------------------------------------------------------------------------------#
+## Restrict a dataset to the row groups of floats
+    def __bloom_subset(self, dataset, floats):
+        """Dataset with only the row groups of its fragments that may hold
+        some of the floats (see bloom_row_groups); the fragments changed since
+        they were indexed keep all their row groups"""
+
+        row_groups = self.bloom_row_groups(floats)
+        indexed = dict(zip(self.bloom["fragment"], self.bloom["mtime"]))
+
+        fragments = []
+        for fragment in dataset.get_fragments():
+            fname = os.path.relpath(fragment.path, self.db_dir)
+            if indexed.get(fname) != os.path.getmtime(fragment.path):
+                fragments.append(fragment)
+            elif fname in row_groups:
+                fragments.append( fragment.subset(row_group_ids=row_groups[fname]) )
+
+        return pds.FileSystemDataset(fragments, dataset.schema, dataset.format, dataset.filesystem)
+
+#------------------------------------------------------------------------------#
+## Gridded statistics
+    def gridded(self, params, region=None, time=None, pres=None, by=None):
+        """Count, mean, standard deviation, min and max of the adjusted
+        parameters from the summaries of the database, without reading the
+        levels; the selection is at the resolution of the summary grid: the
+        cells, months and pressure bins that overlap the query are merged
+
+        Arguments:
+        params -- list of parameters, e.g. ["TEMP", "DOXY"]
+        region, time, pres -- see filters
+        by     -- keys of the summary to group by (default: ["lat_cell",
+                  "lon_cell"], a map; see argo_summary.SUMMARY_KEYS)
+
+        Returns:
+        summary -- dataframe with the keys of by and, for each parameter,
+                   <PARAM>_ADJUSTED_<stat> for count, sum, sumsq, min, max,
+                   mean and std
+        """
+
+        if self.grid_summary is None:
+            self.grid_summary = asm.load_summary(self.db_dir, self.db_type)
+            if self.grid_summary is None:
+                raise ValueError("No summary found at " + asm.summary_fname(self.db_dir, self.db_type) + ", convert the database with summaries or run argo_summary.update_summary.")
+
+        summary = self.grid_summary
+        cell = summary.attrs["grid"]["cell"]
+        pres_bins = np.asarray(summary.attrs["grid"]["pres_bins"])
+        if by is None:
+            by = ["lat_cell", "lon_cell"]
+
+        keep = np.ones(len(summary), dtype=bool)
+
+        if region is not None:
+            lat_min, lat_max, lon_min, lon_max = region
+            keep &= (summary["lat_cell"] + cell > lat_min).to_numpy() & (summary["lat_cell"] <= lat_max).to_numpy()
+            east = (summary["lon_cell"] + cell > lon_min).to_numpy()
+            west = (summary["lon_cell"] <= lon_max).to_numpy()
+            keep &= (east & west) if lon_min <= lon_max else (east | west)
+
+        if time is not None:
+            keep &= (summary["month"] >= pd.Timestamp(time[0]).to_period("M").to_timestamp()).to_numpy() & (summary["month"] <= pd.Timestamp(time[1])).to_numpy()
+
+        if pres is not None:
+            upper = np.append(pres_bins[1:], np.inf)[ np.searchsorted(pres_bins, summary["pres_bin"].to_numpy()) ]
+            keep &= (upper > pres[0]) & (summary["pres_bin"] <= pres[1]).to_numpy()
+
+        variables = [p + "_ADJUSTED" for p in params]
+        columns = [v + "_" + stat for v in variables for stat in asm.SUMMARY_STATS]
+        summary = asm.merge_summaries([summary.loc[keep, asm.SUMMARY_KEYS + columns]], by=by)
+
+        return asm.summary_stats(summary, variables)
+
+#------------------------------------------------------------------------------#
+## Read profiles
+    def profiles(self, region=None, time=None, floats=None, columns=None):
+        """Read the profiles selected by region, time and floats from the
+        profile table of the normalized database, without reading the levels
+
+        Arguments:
+        region, time, floats -- see filters
+        columns -- list of columns to return (default: all the columns of the
+                   profile table); PROFILE_ID is always returned
+
+        Returns:
+        profiles -- pyarrow table with one row per profile
+        """
+
+        files = self.__normalized_files("profiles", self.query_files(region, time, floats))
+        if columns is not None:
+            columns = ["PROFILE_ID"] + [c for c in columns if c != "PROFILE_ID"]
+
+        table = self.__read_normalized("profiles", files, self.filters(region, time, None, floats), columns)
+
+        # a profile whose levels span two fragments is in the profile table
+        # of both
+        _, first = np.unique(table["PROFILE_ID"].to_numpy(), return_index=True)
+
+        return table.take(np.sort(first))
+
+#------------------------------------------------------------------------------#
+## Join the levels of profiles
+    def levels(self, profiles, pres=None, params=None, columns=None):
+        """Read the levels of profiles from the levels table of the normalized
+        database and join them to the columns of the profiles
+
+        Arguments:
+        profiles -- pyarrow table with PROFILE_ID (see profiles)
+        pres     -- (min, max) of PRES_ADJUSTED in dbar
+        params   -- list of parameters whose columns are read (default: all
+                    the columns of the levels table)
+        columns  -- list of level columns to read, instead of params
+
+        Returns:
+        rows -- pyarrow table with the columns of profiles followed by the
+                level columns, one row per level
+        """
+
+        # an empty database has no levels to join
+        if self.schema is None:
+            return profiles
+
+        ids = np.unique(profiles["PROFILE_ID"].to_numpy())
+        platforms = np.unique(ids//an.PROFILE_ID_STRIDE)
+        files = self.catalog.loc[ self.catalog["PLATFORM_NUMBER"].isin(platforms), "file" ].unique()
+        files = self.__normalized_files("levels", [os.path.join(self.db_dir, f) for f in files])
+
+        if columns is None and params is not None:
+            columns = ["N_LEVELS", "PRES_ADJUSTED", "PRES_ADJUSTED_QC"]
+            columns += [p + s for p in params for s in PARAM_SUFFIXES if p + s in self.schema.names]
+        if columns is not None:
+            schema = an.split_schema(self.schema, "levels")
+            columns = ["PROFILE_ID"] + [c for c in columns if c in schema.names and c != "PROFILE_ID"]
+
+        filters = self.filters(pres=pres)
+        filters[0].append( ("PROFILE_ID", "in", [int(i) for i in ids]) )
+        levels = self.__read_normalized("levels", files, filters, columns)
+
+        index = pc.index_in(levels["PROFILE_ID"], value_set=profiles["PROFILE_ID"])
+        rows = profiles.take(index)
+        for name in levels.schema.names:
+            if name != "PROFILE_ID":
+                rows = rows.append_column(levels.schema.field(name), levels[name])
+
+        return rows
+
+#------------------------------------------------------------------------------#
+## Close the files
+    def close(self):
+        """Close the parquet files opened by the reader"""
+
+        for pqfile in self.files.values():
+            pqfile.close()
+        self.files = {}
+
+#------------------------------------------------------------------------------#
+## Open a fragment
+    def __file(self, fname):
+        """Parquet file of a fragment of the catalog, kept open for the next
+        reads"""
+
+        if fname not in self.files:
+            self.files[fname] = pq.ParquetFile(os.path.join(self.db_dir, fname))
+
+        return self.files[fname]
+
+#------------------------------------------------------------------------------#
+## Normalized files of fragments
+    def __normalized_files(self, table, files):
+        """Paths to the profiles or levels of fragments of the database"""
+
+        if not os.path.isdir(an.normalized_dir(self.db_dir)):
+            raise ValueError("No normalized tables found at " + an.normalized_dir(self.db_dir) + ", convert the database with normalized tables or run argo_normalize.update_normalized.")
+
+        fnames = [an.normalized_fname(self.db_dir, f, table) for f in files]
+
+        return [f for f in fnames if os.path.isfile(f)]
+
+#------------------------------------------------------------------------------#
+## Read a normalized table
+    def __read_normalized(self, table, files, filters, columns):
+        """Rows of the profiles or levels files selected by filters (see
+        filters)"""
+
+        if len(files) == 0:
+            if self.schema is None:
+                return pa.table({"PROFILE_ID": pa.array([], pa.int64())})
+            empty = an.split_schema(self.schema, table).empty_table()
+            return empty if columns is None else empty.select(columns)
+
+        if len(filters[0]) == 0:
+            filters = None
+
+        dataset = pds.dataset(files, format="parquet", partitioning="hive", partition_base_dir=an.normalized_dir(self.db_dir, table))
+
+        return dataset.to_table(columns=columns, filter=None if filters is None else pq.filters_to_expression(filters))
+
+#------------------------------------------------------------------------------#
+## Empty table
+    def __empty_table(self, columns):
+        """Table without rows, with the schema of the database"""
+
+        fragments = am.list_fragments(self.db_dir, self.db_type)
+        if len(fragments) == 0:
+            return pa.table({})
+
+        table = pq.read_schema(fragments[0]).empty_table()
+        if columns is not None:
+            table = table.select(columns)
+
+        return table
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+## @file argo_arrow.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Wed 06 Nov 2024
+
+##########################################################################
+#
+# Reader of Argo profile files straight into pyarrow tables, bypassing xarray
+# and pandas: the variables in params.params are read with netCDF4 and the
+# N_PROF x N_LEVELS matrices are flattened with numpy into arrow arrays shaped
+# for the target schema
+
+import json
+import re
+import netCDF4
+import numpy as np
+import pyarrow as pa
+import argo2parquet.params as params
+from xarray.backends.locks import HDF5_LOCK, NETCDFC_LOCK, combine_locks
+##########################################################################
+
+# netCDF4 and HDF5 are not thread safe: files are read holding the same locks
+# that xarray takes for these libraries, so that both readers can run in
+# workers with several threads
+NETCDF_LOCK = combine_locks([NETCDFC_LOCK, HDF5_LOCK])
+
+# variables of the profiles, repeated on each of their levels
+PROFILE_VARS = ["PLATFORM_NUMBER", "N_PROF", "N_LEVELS", "CYCLE_NUMBER", "DIRECTION", "DATA_MODE", "LATITUDE", "LONGITUDE", "POSITION_QC", "JULD", "JULD_QC"]
+
+#------------------------------------------------------------------------------#
+## Per-profile data mode of each parameter
+def profile_data_modes(parameter, param_data_mode, data_mode_vars):
+    """Spread PARAMETER_DATA_MODE across the <PARAM>_DATA_MODE variables
+
+    Arguments:
+    parameter       -- (N_PROF, N_PARAM) array of parameter names
+    param_data_mode -- (N_PROF, N_PARAM) array of data modes
+    data_mode_vars  -- names of the <PARAM>_DATA_MODE variables to build
+
+    Returns:
+    data_modes     -- dict with a (N_PROF,) array of one-character strings for
+                      each variable in data_mode_vars ("" where the parameter is
+                      not measured in the profile)
+    skipped_params -- <PARAM>_DATA_MODE names of the parameters in the file
+                      that are not in data_mode_vars
+    """
+
+    parameter = np.char.strip( np.asarray(parameter).astype(str) )
+    param_data_mode = np.char.strip( np.asarray(param_data_mode).astype(str) )
+    nprof = parameter.shape[0]
+
+    data_modes = {}
+    for v in data_mode_vars:
+        data_modes[v] = np.full( nprof, "", dtype=str )
+
+    skipped_params = []
+    for p in range(parameter.shape[1]):
+        # later N_PARAM slots overwrite earlier ones
+        for param_name in dict.fromkeys(parameter[:,p]):
+            if len(param_name) < 1:
+                continue
+
+            param_data_mode_name = param_name + "_DATA_MODE"
+            if param_data_mode_name not in data_modes:
+                if param_data_mode_name not in skipped_params:
+                    skipped_params.append(param_data_mode_name)
+                continue
+
+            prof_ids = parameter[:,p] == param_name
+            data_mode = param_data_mode[prof_ids,p]
+            if (np.char.str_len(data_mode) > 1).any():
+                raise ValueError("Data mode should be a one-character long string.")
+
+            data_modes[param_data_mode_name][prof_ids] = data_mode
+
+    return data_modes, skipped_params
+
+#------------------------------------------------------------------------------#
+## Read netCDF char variable into strings
+def _read_chars(var):
+    """Read a netCDF char variable, joining the string dimension if present"""
+
+    values = var[:]
+    if values.dtype.kind == "S" and values.dtype.itemsize == 1 and len(var.dimensions) > 0 and var.dimensions[-1].startswith("STRING"):
+        width = values.shape[-1]
+        values = np.ascontiguousarray(values).view("S" + str(width))[...,0]
+
+    if values.dtype.kind == "S":
+        values = np.char.decode(values, "ascii", "replace")
+
+    return np.char.strip( values.astype(str) )
+
+#------------------------------------------------------------------------------#
+## Read netCDF numeric variable with missing values as mask
+def _read_numeric(var):
+    """Read a numeric netCDF variable
+
+    Returns:
+    values -- numpy array
+    mask   -- boolean array, True where values are fill values or NaN
+    """
+
+    values = var[:]
+    mask = np.zeros(values.shape, dtype=bool)
+    for attr in ["_FillValue", "missing_value"]:
+        if attr in var.ncattrs():
+            mask |= values == var.getncattr(attr)
+    if values.dtype.kind == "f":
+        mask |= np.isnan(values)
+
+    return values, mask
+
+#------------------------------------------------------------------------------#
+## Convert Argo julian days to timestamps
+def _julian_to_datetime(var):
+    """Convert a JULD-like variable (days since reference date) to datetime64[ns]
+
+    Returns:
+    values -- datetime64[ns] array
+    mask   -- boolean array, True where values are missing
+    """
+
+    days, mask = _read_numeric(var)
+    units = var.getncattr("units") if "units" in var.ncattrs() else "days since 1950-01-01 00:00:00"
+    ref = re.search(r"since\s+([0-9]{4}-[0-9]{2}-[0-9]{2})(?:[ T]([0-9:.]+))?", units)
+    ref = np.datetime64( ref.group(1) + "T" + (ref.group(2) or "00:00:00"), "ns" )
+
+    ns = np.round( np.where(mask, 0, days)*86400e9 ).astype("int64")
+    values = ref + ns.astype("timedelta64[ns]")
+
+    return values, mask
+
+#------------------------------------------------------------------------------#
+## Convert QC flags to integers
+def _qc_to_int(var):
+    """Convert a char QC variable to integers: blank or non-numeric flags are
+    set to 0, as the argo xarray engine does"""
+
+    values = var[:]
+    if values.dtype.kind == "S" and values.dtype.itemsize == 1:
+        codes = values.view(np.uint8).astype(np.int16) - ord("0")
+    else:
+        codes = np.zeros(values.shape, dtype=np.int16)
+        flags = np.char.strip( values.astype(str) )
+        digits = np.char.isdigit(flags)
+        codes[digits] = flags[digits].astype(np.int16)
+
+    codes[(codes < 0) | (codes > 9)] = 0
+
+    return codes
+
+#------------------------------------------------------------------------------#
+## Read Argo profile file into arrow table
+def read_argo_arrow(argo_file, schema):
+    """Read the variables of an Argo profile file into a pyarrow table
+
+    Arguments:
+    argo_file -- path to the _prof.nc or _Sprof.nc file
+    schema    -- pyarrow schema of the target database; variables in the
+                 schema that are absent from the file are all-null columns
+
+    Returns:
+    table -- pyarrow table with one row per (N_PROF, N_LEVELS) and the columns
+             in the order of schema
+    """
+
+    with NETCDF_LOCK, netCDF4.Dataset(argo_file, "r") as nc:
+        nc.set_auto_maskandscale(False)
+        nc.set_always_mask(False)
+
+        nprof = nc.dimensions["N_PROF"].size
+        nlevels = nc.dimensions["N_LEVELS"].size
+        nrows = nprof*nlevels
+
+        data_modes = {}
+        data_mode_vars = [n for n in schema.names if "_DATA_MODE" in n]
+        if "PARAMETER_DATA_MODE" in nc.variables and len(data_mode_vars) > 0:
+            parameter = _read_chars(nc.variables["PARAMETER"])
+            if not (parameter[:,[0],:] == parameter).all():
+                raise ValueError("PARAMETER not independent of N_CALIB.")
+            data_modes, _ = profile_data_modes(
+                parameter[:,0,:],
+                _read_chars(nc.variables["PARAMETER_DATA_MODE"]),
+                data_mode_vars
+            )
+
+        # row -> profile index, used to repeat profile variables on levels
+        prof_index = pa.array( np.repeat(np.arange(nprof), nlevels) )
+
+        arrays = []
+        for field in schema:
+            name = field.name
+            # dictionary columns are read as their values and encoded last
+            value_type = field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+
+            if name == "N_PROF":
+                arrays.append( prof_index.cast(field.type) )
+                continue
+            elif name == "N_LEVELS":
+                values, mask = np.tile(np.arange(nlevels), nprof), None
+            elif name in data_modes:
+                values, mask = data_modes[name], None
+            elif name not in nc.variables:
+                arrays.append( pa.nulls(nrows, type=field.type) )
+                continue
+            else:
+                var = nc.variables[name]
+                if name == "JULD":
+                    values, mask = _julian_to_datetime(var)
+                elif "_QC" in name:
+                    values, mask = _qc_to_int(var), None
+                elif pa.types.is_string(value_type):
+                    values = _read_chars(var)
+                    mask = values == ""
+                elif name == "PLATFORM_NUMBER":
+                    values = _read_chars(var)
+                    mask = ~np.char.isdigit(values)
+                    values = np.where(mask, "0", values).astype(np.int64)
+                else:
+                    values, mask = _read_numeric(var)
+
+            if mask is not None and not mask.any():
+                mask = None
+
+            # flatten N_PROF x N_LEVELS; profile variables are converted once
+            # per profile and repeated on levels by arrow
+            if values.ndim == 1 and values.shape[0] == nprof:
+                array = pa.array(values, mask=mask, type=value_type).cast(field.type).take(prof_index)
+            else:
+                values = values.reshape(-1)
+                mask = None if mask is None else mask.reshape(-1)
+                array = pa.array(values, mask=mask, type=value_type).cast(field.type)
+
+            arrays.append( array )
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+#------------------------------------------------------------------------------#
+## Measurement variables
+def measurement_vars(names):
+    """Level measurements among the variables names: values of the
+    parameters, their adjusted values and errors and their dPRES, leaving out
+    the profile variables, the QC flags and the data modes"""
+
+    return [n for n in names if n not in PROFILE_VARS and "_QC" not in n and "_DATA_MODE" not in n]
+
+#------------------------------------------------------------------------------#
+## Rows of the padding levels
+def padding_rows(n_prof, n_levels, padded):
+    """Rows to drop as padding: levels with all measurements null, except the
+    first level of profiles that have no measurement at all, which is kept so
+    that every profile keeps its time and position
+
+    Arguments:
+    n_prof   -- array with the N_PROF of each row
+    n_levels -- array with the N_LEVELS of each row
+    padded   -- boolean array, True for the rows with all measurements null
+
+    Returns:
+    drop -- boolean array, True for the rows to drop
+    """
+
+    n_prof = np.asarray(n_prof, dtype=np.int64)
+    padded = np.asarray(padded, dtype=bool)
+    if len(n_prof) == 0:
+        return padded
+
+    measured = np.bincount(n_prof, weights=~padded, minlength=n_prof.max() + 1) > 0
+
+    return padded & ( measured[n_prof] | (np.asarray(n_levels) != 0) )
+
+#------------------------------------------------------------------------------#
+## Drop padding levels from a table
+def drop_padding(table):
+    """Drop the padding levels of a profile file table (see padding_rows)
+
+    Arguments:
+    table -- pyarrow table of a profile file, as read by read_argo_arrow
+
+    Returns:
+    table   -- table without the padding levels
+    dropped -- number of rows dropped
+    """
+
+    padded = np.ones(table.num_rows, dtype=bool)
+    for name in measurement_vars(table.schema.names):
+        padded &= table[name].is_null().to_numpy(zero_copy_only=False)
+
+    drop = padding_rows(table["N_PROF"].to_numpy(), table["N_LEVELS"].to_numpy(), padded)
+    dropped = int(drop.sum())
+    if dropped > 0:
+        table = table.filter( pa.array(~drop) )
+
+    return table, dropped
+
+#------------------------------------------------------------------------------#
+## Arguments of the parquet writers
+def writer_kwargs(schema, write_profile=None):
+    """Arguments of the parquet writers: the per-column encodings that
+    generateSchema stores in the metadata of the compact schemas, on top of
+    the settings of a write profile of params.params["write_profiles"];
+    columns with an encoding are not dictionary encoded
+
+    Arguments:
+    schema        -- pyarrow schema of the database, or of a parquet fragment
+    write_profile -- name of the write profile (default: None, the pyarrow
+                     defaults)
+
+    Returns:
+    kwargs -- dict of arguments to pyarrow.parquet.ParquetWriter, empty if the
+              schema has no encodings and no profile is given
+    """
+
+    kwargs = {}
+    if write_profile is not None:
+        if write_profile not in params.params["write_profiles"]:
+            raise ValueError("write_profile must be one of " + ", ".join(params.params["write_profiles"]) + " or None.")
+        for key, value in params.params["write_profiles"][write_profile].items():
+            if isinstance(value, dict):
+                value = _per_column(schema, value)
+            kwargs[key] = value
+
+    metadata = schema.metadata or {}
+    if b"column_encoding" in metadata:
+        column_encoding = json.loads(metadata[b"column_encoding"])
+        # the schema may hold only some of the columns, e.g. a normalized table
+        column_encoding = {k: v for k, v in column_encoding.items() if k in schema.names}
+        kwargs["use_dictionary"] = [n for n in schema.names if n not in column_encoding]
+        kwargs["column_encoding"] = column_encoding
+
+    return kwargs
+
+#------------------------------------------------------------------------------#
+## Per-column writer setting
+def _per_column(schema, setting):
+    """Resolve a writer setting keyed by column name, arrow type name or
+    "default" into the setting of each column of schema"""
+
+    resolved = {}
+    for field in schema:
+        if field.name in setting:
+            resolved[field.name] = setting[field.name]
+        elif str(field.type) in setting:
+            resolved[field.name] = setting[str(field.type)]
+        elif "default" in setting:
+            resolved[field.name] = setting["default"]
+
+    return resolved
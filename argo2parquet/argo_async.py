@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+## @file argo_async.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Mon 11 Nov 2024
+
+##########################################################################
+#
+# Asynchronous downloader of GDAC files: a single aiohttp session keeps a
+# pool of keep-alive connections to the GDAC host, a semaphore bounds the
+# number of concurrent downloads, and each file is streamed to a temporary
+# file in the destination folder that is renamed atomically once complete,
+# so that an interrupted download never leaves a truncated profile file.
+# When checking modification times, the local mtime is sent as
+# If-Modified-Since so that unchanged files cost a single 304 response
+# instead of a HEAD request followed by a GET.
+
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timezone
+from email.utils import format_datetime
+import aiohttp
+##########################################################################
+
+CHUNK_SIZE = 1 << 20
+
+#------------------------------------------------------------------------------#
+## Download one file
+async def fetch_file(session, semaphore, url, localfile, overwrite=False, checktime=True, verbose=True, retries=3):
+    """Download url to localfile through a temporary file and atomic rename
+
+    Arguments:
+    session   -- aiohttp.ClientSession
+    semaphore -- asyncio.Semaphore bounding the concurrent downloads
+    url       -- URL of the file
+    localfile -- destination path
+    (other arguments as in download_files_async)
+
+    Returns:
+    downloaded -- True if the file was downloaded, False if it was not
+                  modified, already present, not found or failed
+    """
+
+    headers = {}
+    if os.path.exists(localfile):
+        if checktime:
+            mtime = datetime.fromtimestamp(os.path.getmtime(localfile), tz=timezone.utc)
+            headers["If-Modified-Since"] = format_datetime(mtime, usegmt=True)
+        elif not overwrite:
+            if verbose: print('>>> File ' + localfile + ' already exists. Leaving current version.')
+            return False
+
+    async with semaphore:
+        for attempt in range(retries):
+            tmpname = None
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        if verbose: print('>>> File at requested URL (' + url + ') is not newer than file on disk and is not downloaded.')
+                        return False
+                    if response.status == 404:
+                        if verbose: print('>>> File at requested URL (' + url + ') returned 404 error during download.')
+                        return False
+                    response.raise_for_status()
+
+                    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(localfile), prefix=".", suffix=".part")
+                    with os.fdopen(fd, "wb") as out_file:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            out_file.write(chunk)
+
+                os.replace(tmpname, localfile)
+                if verbose: print('>>> Successfully downloaded ' + localfile + '.')
+                return True
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if tmpname is not None and os.path.exists(tmpname):
+                    os.remove(tmpname)
+                if isinstance(e, aiohttp.ClientResponseError) and e.status < 500:
+                    print("Request failed:", e)
+                    return False
+                print("Error connecting (attempt " + str(attempt+1) + " of " + str(retries) + "):", e)
+                await asyncio.sleep(2**attempt)
+
+    if verbose: print('>>> An error occurred while trying to download ' + localfile + ' from ' + url + '.')
+    return False
+
+#------------------------------------------------------------------------------#
+## Download one file and hand it over
+async def fetch_and_hand_over(session, semaphore, slots, on_done, url, localfile, overwrite=False, checktime=True, verbose=True):
+    """Download url to localfile (see fetch_file), then call on_done in a
+    thread; the slot is held until on_done returns, so that a blocking on_done
+    stops new downloads instead of the event loop
+
+    Arguments:
+    slots   -- asyncio.Semaphore bounding the files being downloaded or handed
+               over
+    on_done -- function called with (localfile, downloaded)
+    (other arguments as in fetch_file)
+    """
+
+    async with slots:
+        downloaded = await fetch_file(session, semaphore, url, localfile, overwrite, checktime, verbose)
+        await asyncio.to_thread(on_done, localfile, downloaded)
+
+    return downloaded
+
+#------------------------------------------------------------------------------#
+## Download files concurrently
+async def fetch_files(urls, localfiles, concurrency=36, overwrite=False, checktime=True, verbose=True, on_done=None):
+    """Download all files with one pooled session (see download_files_async)"""
+
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency, ssl=False, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=300)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        if on_done is None:
+            tasks = [
+                fetch_file(session, semaphore, url, localfile, overwrite, checktime, verbose)
+                for url, localfile in zip(urls, localfiles)
+            ]
+        else:
+            slots = asyncio.Semaphore(concurrency)
+            tasks = [
+                fetch_and_hand_over(session, semaphore, slots, on_done, url, localfile, overwrite, checktime, verbose)
+                for url, localfile in zip(urls, localfiles)
+            ]
+        return await asyncio.gather(*tasks)
+
+#------------------------------------------------------------------------------#
+## Download files concurrently (blocking)
+def download_files_async(urls, localfiles, concurrency=36, overwrite=False, checktime=True, verbose=True, on_done=None):
+    """Download files concurrently over keep-alive connections
+
+    Arguments:
+    urls        -- list of URLs of the files
+    localfiles  -- list of destination paths (their folders must exist)
+    concurrency -- maximum number of concurrent downloads and open connections
+    overwrite   -- False to leave existing files in place, or True to
+                   overwrite them (neglected if checktime is true)
+    checktime   -- download existing files only if the server has a newer
+                   version (If-Modified-Since)
+    verbose     -- True to announce progress
+    on_done     -- function called with (localfile, downloaded) as each file
+                   completes, e.g. to hand it over to a converter; while it
+                   blocks, its download slot stays taken
+
+    Returns:
+    downloaded -- list of booleans, True for the files that were downloaded
+    """
+
+    if len(urls) == 0:
+        return []
+
+    return asyncio.run( fetch_files(urls, localfiles, concurrency, overwrite, checktime, verbose, on_done) )
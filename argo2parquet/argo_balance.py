@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+## @file argo_balance.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Fri 08 Nov 2024
+
+##########################################################################
+#
+# Size-aware planning of the conversion: the files are packed into chunks and
+# tasks of similar size in bytes with the largest-first (LPT) greedy heuristic,
+# so that a few very large floats do not stall a chunk while the other workers
+# are idle
+
+import heapq
+import os
+import numpy as np
+##########################################################################
+
+# the read time of a file is about a fixed cost plus a cost per byte: with
+# the arrow reader, the fixed cost is close to the one of reading 2 MB
+FILE_OVERHEAD = 2*1024**2
+
+#------------------------------------------------------------------------------#
+## Size of the files on disk
+def file_sizes(flist):
+    """Size in bytes of each file, 0 for the files missing on disk"""
+
+    sizes = np.zeros(len(flist), dtype=np.int64)
+    for k, f in enumerate(flist):
+        try:
+            sizes[k] = os.path.getsize(f)
+        except OSError:
+            pass
+
+    return sizes
+
+#------------------------------------------------------------------------------#
+## Estimated cost of reading the files
+def file_costs(flist, overhead=None):
+    """Estimated cost of reading each file, in bytes: its size plus a fixed
+    overhead per file (default: FILE_OVERHEAD)"""
+
+    if overhead is None:
+        overhead = FILE_OVERHEAD
+
+    return file_sizes(flist) + overhead
+
+#------------------------------------------------------------------------------#
+## Largest-first bin packing
+def lpt_bins(sizes, nbins):
+    """Pack items into bins of similar total size: items are taken largest
+    first and each is assigned to the bin with the smallest total so far,
+    which takes O(n log n) with a heap
+
+    Arguments:
+    sizes -- array of item sizes
+    nbins -- number of bins
+
+    Returns:
+    bins -- list of nbins lists of item indices, each in increasing order;
+            every item is assigned to exactly one bin, and bins are empty only
+            if there are fewer items than bins
+    """
+
+    sizes = np.asarray(sizes)
+    nbins = max(int(nbins), 1)
+
+    heap = [(0, b) for b in range(nbins)]
+    bins = [[] for _ in range(nbins)]
+    for k in np.argsort(-sizes, kind="stable"):
+        load, b = heapq.heappop(heap)
+        bins[b].append(int(k))
+        heapq.heappush(heap, (load + sizes[k], b))
+
+    return [sorted(b) for b in bins]
+
+#------------------------------------------------------------------------------#
+## Imbalance of a set of loads
+def imbalance(loads, largest=0):
+    """Ratio between the largest load and its lower bound, i.e. the mean load
+    or the largest item if bigger (1 is a perfect balance)
+
+    Arguments:
+    loads   -- array with the total size of each bin
+    largest -- size of the largest item packed into the bins
+    """
+
+    loads = np.asarray(loads, dtype=float)
+    if len(loads) == 0 or loads.sum() == 0:
+        return 1.0
+
+    return float( loads.max()/max(loads.mean(), largest) )
+
+#------------------------------------------------------------------------------#
+## Plan chunks and tasks balanced by bytes
+def plan_chunks(sizes, nchunks, ntasks, tasks_per_worker=4):
+    """Split the files into chunks of similar size in bytes, and each chunk into
+    tasks: files larger than the target task size get a task of their own,
+    the smaller files are packed together into tasks of about that size
+
+    Arguments:
+    sizes            -- array of file sizes in bytes
+    nchunks          -- number of chunks (converted one after the other)
+    ntasks           -- number of workers running the tasks of a chunk
+    tasks_per_worker -- tasks per worker in a chunk, so that the scheduler can
+                        fill the workers that finish early
+
+    Returns:
+    plan -- list of chunks, each a list of tasks, each a list of file indices;
+            tasks are ordered largest first, so that the largest files start
+            first
+    """
+
+    sizes = np.asarray(sizes)
+    plan = []
+    for chunk in lpt_bins(sizes, nchunks):
+        if len(chunk) == 0:
+            continue
+        chunk = np.asarray(chunk)
+        target = sizes[chunk].sum()/max(ntasks*tasks_per_worker, 1)
+
+        big = chunk[ sizes[chunk] >= target ]
+        small = chunk[ sizes[chunk] < target ]
+
+        tasks = [[int(k)] for k in big]
+        if len(small) > 0:
+            nsmall = max( int(np.ceil(sizes[small].sum()/max(target, 1))), 1 )
+            nsmall = min(nsmall, len(small))
+            tasks += [ [int(small[k]) for k in b] for b in lpt_bins(sizes[small], nsmall) ]
+
+        tasks.sort(key=lambda t: -sizes[t].sum())
+        plan.append(tasks)
+
+    return plan
+
+#------------------------------------------------------------------------------#
+## Plan chunks of a fixed number of files
+def plan_fixed(nfiles, chunk):
+    """Split the files into chunks of chunk files in list order, one task per
+    file, as done without size balancing
+
+    Returns:
+    plan -- list of chunks, each a list of tasks, each a list of file indices
+    """
+
+    return [ [[k] for k in range(start, min(start + chunk, nfiles))] for start in range(0, nfiles, chunk) ]
+
+#------------------------------------------------------------------------------#
+## Wall time of a list of tasks on a set of workers
+def makespan(durations, nworkers):
+    """Wall time to run tasks in the given order on nworkers workers, each task
+    going to the first worker that becomes free, as the dask scheduler does"""
+
+    finish = [0.0]*max(int(nworkers), 1)
+    for d in durations:
+        heapq.heappush(finish, heapq.heappop(finish) + d)
+
+    return max(finish)
+
+#------------------------------------------------------------------------------#
+## Per-chunk wall time skew of a plan
+def plan_skew(plan, durations, nworkers):
+    """Estimate the wall time of each chunk of a plan from the read time of its
+    files, and how far it is from a perfect spread over the workers
+
+    Arguments:
+    plan      -- list of chunks of tasks of file indices (see plan_chunks)
+    durations -- array with the time taken to read each file
+    nworkers  -- number of workers running the tasks of a chunk
+
+    Returns:
+    wall -- array with the estimated wall time of each chunk
+    skew -- array with the ratio between the wall time of each chunk and the
+            ideal one (total read time of the chunk over nworkers)
+    """
+
+    durations = np.asarray(durations, dtype=float)
+    wall = np.zeros(len(plan))
+    skew = np.ones(len(plan))
+    for j, tasks in enumerate(plan):
+        task_durations = [ durations[t].sum() for t in tasks ]
+        wall[j] = makespan(task_durations, nworkers)
+        ideal = sum(task_durations)/max(int(nworkers), 1)
+        if ideal > 0:
+            skew[j] = wall[j]/ideal
+
+    return wall, skew
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+## @file argo_bloom.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Membership index of the row groups of a parquet database: one bloom filter
+# per row group for each of PLATFORM_NUMBER and CYCLE_NUMBER, stored next to
+# the catalog in metadata/Argo<DB>_bloom.npz, so that point lookups skip the
+# row groups whose min/max statistics overlap the float but that do not hold
+# it. pyarrow does not write the bloom filters of the parquet format, hence
+# the sidecar file.
+
+import os
+from pathlib import Path
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import argo2parquet.argo_manifest as am
+##########################################################################
+
+# columns indexed
+BLOOM_VARS = ["PLATFORM_NUMBER", "CYCLE_NUMBER"]
+
+# bits of each filter and hashes per value: about 0.2% false positives for
+# 500 distinct values in a row group, 15% for 2000
+BLOOM_BITS = 8192
+BLOOM_HASHES = 4
+
+#------------------------------------------------------------------------------#
+## Path to the membership index of a database
+def bloom_fname(out_dir, db_type):
+    """Path to the membership index of a database
+
+    Arguments:
+    out_dir -- folder of the parquet database
+    db_type -- 'PHY' or 'BGC'
+    """
+
+    return os.path.join(out_dir, "metadata", "Argo" + db_type.upper() + "_bloom.npz")
+
+#------------------------------------------------------------------------------#
+## Bit positions of values
+def bloom_positions(values):
+    """Positions of the bits set by each value in a filter
+
+    Arguments:
+    values -- integer array
+
+    Returns:
+    positions -- int64 array of shape (len(values), BLOOM_HASHES)
+    """
+
+    values = np.asarray(values, dtype=np.int64).astype(np.uint64)
+    seeds = np.arange(1, BLOOM_HASHES + 1, dtype=np.uint64)*np.uint64(0x9E3779B97F4A7C15)
+
+    # splitmix64 finalizer of value + seed
+    with np.errstate(over="ignore"):
+        h = values[:, None] + seeds[None, :]
+        h = (h ^ (h >> np.uint64(30)))*np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27)))*np.uint64(0x94D049BB133111EB)
+        h = h ^ (h >> np.uint64(31))
+
+    return (h % np.uint64(BLOOM_BITS)).astype(np.int64)
+
+#------------------------------------------------------------------------------#
+## Filter of a set of values
+def bloom_bits(values):
+    """Bloom filter of a set of values
+
+    Arguments:
+    values -- integer array
+
+    Returns:
+    bits -- packed uint8 array of BLOOM_BITS/8 bytes
+    """
+
+    bits = np.zeros(BLOOM_BITS, dtype=bool)
+    bits[ bloom_positions(np.unique(values)).reshape(-1) ] = True
+
+    return np.packbits(bits)
+
+#------------------------------------------------------------------------------#
+## Membership test
+def might_contain(bits, values):
+    """Row groups whose filter may contain any of the values
+
+    Arguments:
+    bits   -- packed uint8 array of shape (row groups, BLOOM_BITS/8)
+    values -- integer array
+
+    Returns:
+    contain -- bool array, one per row group; False means that none of the
+               values is in the row group
+    """
+
+    positions = bloom_positions(np.atleast_1d(values))
+
+    # bits are packed big-endian, as by numpy.packbits
+    masks = (128 >> (positions & 7)).astype(np.uint8)
+    hits = (bits[:, positions >> 3] & masks) != 0
+
+    return hits.all(axis=2).any(axis=1)
+
+#------------------------------------------------------------------------------#
+## Membership index of a fragment
+def index_fragment(out_dir, fragment):
+    """Filters of the row groups of a parquet fragment
+
+    Arguments:
+    out_dir  -- folder of the parquet database
+    fragment -- path to the fragment
+
+    Returns:
+    index -- dict of arrays, one entry per row group: fragment (path
+             relative to out_dir), row_group, its mtime, and the filters of
+             each of BLOOM_VARS
+    """
+
+    pqfile = pq.ParquetFile(fragment)
+    nrg = pqfile.metadata.num_row_groups
+
+    index = {
+        "fragment": np.full(nrg, os.path.relpath(fragment, out_dir)),
+        "row_group": np.arange(nrg, dtype=np.int64),
+        "mtime": np.full(nrg, os.path.getmtime(fragment)),
+    }
+    for name in BLOOM_VARS:
+        index[name] = np.zeros((nrg, BLOOM_BITS//8), dtype=np.uint8)
+
+    for row_group in range(nrg):
+        table = pqfile.read_row_group(row_group, columns=BLOOM_VARS)
+        for name in BLOOM_VARS:
+            values = pc.drop_null(table[name].cast(pa.int64())).to_numpy()
+            index[name][row_group] = bloom_bits(values)
+
+    pqfile.close()
+
+    return index
+
+#------------------------------------------------------------------------------#
+## Empty membership index
+def empty_index():
+    """Membership index without row groups"""
+
+    index = {
+        "fragment": np.array([], dtype=str),
+        "row_group": np.array([], dtype=np.int64),
+        "mtime": np.array([], dtype=np.float64),
+    }
+    for name in BLOOM_VARS:
+        index[name] = np.zeros((0, BLOOM_BITS//8), dtype=np.uint8)
+
+    return index
+
+#------------------------------------------------------------------------------#
+## Build the membership index of a database
+def build_index(out_dir, db_type, previous=None):
+    """Build the membership index of the fragments of a database; the filters
+    of previous are kept for the fragments that did not change since they
+    were indexed
+
+    Arguments:
+    out_dir  -- folder of the parquet database
+    db_type  -- 'PHY' or 'BGC'
+    previous -- previous index of the database (default: None)
+
+    Returns:
+    index    -- dict of arrays (see index_fragment), in the order of the
+                fragments
+    nindexed -- number of fragments read
+    """
+
+    unchanged = {}
+    if previous is not None and len(previous["fragment"]) > 0:
+        unchanged = dict(zip(previous["fragment"], previous["mtime"]))
+
+    fnames = []
+    parts = []
+    reused = []
+    nindexed = 0
+    for fragment in am.list_fragments(out_dir, db_type):
+        fname = os.path.relpath(fragment, out_dir)
+        fnames.append(fname)
+        if unchanged.get(fname) == os.path.getmtime(fragment):
+            reused.append(fname)
+        else:
+            parts.append( index_fragment(out_dir, fragment) )
+            nindexed += 1
+
+    # the filters of the unchanged fragments are selected at once
+    if len(reused) > 0:
+        keep = np.isin(previous["fragment"], reused)
+        parts.append( {k: v[keep] for k, v in previous.items()} )
+
+    if len(parts) == 0:
+        return empty_index(), nindexed
+
+    index = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+    # back to the order of the fragments
+    position = {fname: k for k, fname in enumerate(fnames)}
+    order = np.argsort([position[f] for f in index["fragment"]], kind="stable")
+
+    return {k: v[order] for k, v in index.items()}, nindexed
+
+#------------------------------------------------------------------------------#
+## Load the membership index of a database
+def load_index(out_dir, db_type):
+    """Read the stored membership index of a database, returns None if not
+    present"""
+
+    fname = bloom_fname(out_dir, db_type)
+    if not os.path.isfile(fname):
+        return None
+
+    with np.load(fname) as npz:
+        return {k: npz[k] for k in npz.files}
+
+#------------------------------------------------------------------------------#
+## Update and store the membership index of a database
+def update_index(out_dir, db_type):
+    """Bring the stored membership index of a database up to date with its
+    fragments (see build_index) and store it to
+    <out_dir>/metadata/Argo<DB>_bloom.npz
+
+    Arguments:
+    out_dir -- folder of the parquet database
+    db_type -- 'PHY' or 'BGC'
+
+    Returns:
+    index -- the membership index of the database
+    """
+
+    fname = bloom_fname(out_dir, db_type)
+    index, nindexed = build_index(out_dir, db_type, previous=load_index(out_dir, db_type))
+
+    Path(fname).parent.mkdir(parents = True, exist_ok = True)
+    np.savez(fname, **index)
+    print("Membership index of " + str(len(index["fragment"])) + " row groups stored to " + fname + " (" + str(nindexed) + " fragments indexed).")
+
+    return index
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+## @file argo_catalog.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Catalog of a parquet database: for each (PLATFORM_NUMBER, CYCLE_NUMBER),
+# the fragment, row group and row range that hold its rows, with its time
+# range and bounding box, so that single floats or cycles are read without
+# scanning the database (see argoReader)
+
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import argo2parquet.argo_manifest as am
+##########################################################################
+
+# columns read from the fragments to build the catalog
+CATALOG_VARS = ["PLATFORM_NUMBER", "CYCLE_NUMBER", "JULD", "LATITUDE", "LONGITUDE"]
+
+#------------------------------------------------------------------------------#
+## Path to the catalog of a database
+def catalog_fname(out_dir, db_type):
+    """Path to the catalog of a database
+
+    Arguments:
+    out_dir -- folder of the parquet database
+    db_type -- 'PHY' or 'BGC'
+    """
+
+    return os.path.join(out_dir, "metadata", "Argo" + db_type.upper() + "_catalog.parquet")
+
+#------------------------------------------------------------------------------#
+## Catalog entries of a fragment
+def index_fragment(out_dir, fragment):
+    """Catalog entries of the cycles stored in a parquet fragment
+
+    Arguments:
+    out_dir  -- folder of the parquet database
+    fragment -- path to the fragment
+
+    Returns:
+    catalog -- dataframe with one row per cycle and row group of the
+               fragment: PLATFORM_NUMBER, CYCLE_NUMBER, file (path relative
+               to out_dir), row_group, row_start and row_stop (range of rows
+               in the row group that holds all the rows of the cycle), rows,
+               juld_min, juld_max, lat_min, lat_max, lon_min, lon_max, and
+               mtime of the fragment
+    """
+
+    pqfile = pq.ParquetFile(fragment)
+    mtime = os.path.getmtime(fragment)
+
+    entries = []
+    for row_group in range(pqfile.metadata.num_row_groups):
+        table = pqfile.read_row_group(row_group, columns=CATALOG_VARS)
+        df = pd.DataFrame({
+            "PLATFORM_NUMBER": table["PLATFORM_NUMBER"].cast(pa.int64()).to_numpy(zero_copy_only=False),
+            "CYCLE_NUMBER": pc.fill_null(table["CYCLE_NUMBER"].cast(pa.int64()), -1).to_numpy(),
+            "row": np.arange(table.num_rows),
+            "JULD": table["JULD"].cast(pa.timestamp("ns")).to_numpy(),
+            "LATITUDE": pc.fill_null(table["LATITUDE"].cast(pa.float64()), np.nan).to_numpy(),
+            "LONGITUDE": pc.fill_null(table["LONGITUDE"].cast(pa.float64()), np.nan).to_numpy(),
+        })
+        if len(df) == 0:
+            continue
+
+        entry = df.groupby(["PLATFORM_NUMBER", "CYCLE_NUMBER"], sort=False).agg(
+            row_start=("row", "min"),
+            row_stop=("row", "max"),
+            rows=("row", "size"),
+            juld_min=("JULD", "min"),
+            juld_max=("JULD", "max"),
+            lat_min=("LATITUDE", "min"),
+            lat_max=("LATITUDE", "max"),
+            lon_min=("LONGITUDE", "min"),
+            lon_max=("LONGITUDE", "max"),
+        ).reset_index()
+        entry["row_stop"] += 1
+        entry["row_group"] = row_group
+        entries.append(entry)
+
+    pqfile.close()
+
+    if len(entries) == 0:
+        return empty_catalog()
+
+    catalog = pd.concat(entries, ignore_index=True)
+    catalog["file"] = os.path.relpath(fragment, out_dir)
+    catalog["mtime"] = mtime
+
+    return catalog[empty_catalog().columns]
+
+#------------------------------------------------------------------------------#
+## Empty catalog
+def empty_catalog():
+    """Catalog without entries, with the columns and dtypes of index_fragment"""
+
+    return pd.DataFrame({
+        "PLATFORM_NUMBER": pd.Series(dtype="int64"),
+        "CYCLE_NUMBER": pd.Series(dtype="int64"),
+        "file": pd.Series(dtype=str),
+        "row_group": pd.Series(dtype="int64"),
+        "row_start": pd.Series(dtype="int64"),
+        "row_stop": pd.Series(dtype="int64"),
+        "rows": pd.Series(dtype="int64"),
+        "juld_min": pd.Series(dtype="datetime64[ns]"),
+        "juld_max": pd.Series(dtype="datetime64[ns]"),
+        "lat_min": pd.Series(dtype="float64"),
+        "lat_max": pd.Series(dtype="float64"),
+        "lon_min": pd.Series(dtype="float64"),
+        "lon_max": pd.Series(dtype="float64"),
+        "mtime": pd.Series(dtype="float64"),
+    })
+
+#------------------------------------------------------------------------------#
+## Build the catalog of a database
+def build_catalog(out_dir, db_type, previous=None):
+    """Build the catalog of the fragments of a database; the entries of
+    previous are kept for the fragments that did not change since they were
+    indexed, so that after an incremental conversion only the new and
+    rewritten fragments are read
+
+    Arguments:
+    out_dir  -- folder of the parquet database
+    db_type  -- 'PHY' or 'BGC'
+    previous -- previous catalog of the database (default: None)
+
+    Returns:
+    catalog -- dataframe sorted by PLATFORM_NUMBER and CYCLE_NUMBER (see
+               index_fragment); CYCLE_NUMBER is -1 where missing
+    nindexed -- number of fragments read
+    """
+
+    fragments = am.list_fragments(out_dir, db_type)
+
+    unchanged = {}
+    if previous is not None and len(previous) > 0:
+        unchanged = previous.groupby("file")["mtime"].first().to_dict()
+
+    entries = []
+    reused = []
+    nindexed = 0
+    for fragment in fragments:
+        fname = os.path.relpath(fragment, out_dir)
+        if unchanged.get(fname) == os.path.getmtime(fragment):
+            reused.append(fname)
+        else:
+            entries.append( index_fragment(out_dir, fragment) )
+            nindexed += 1
+
+    # the entries of the unchanged fragments are selected at once
+    if len(reused) > 0:
+        entries.append( previous.loc[ previous["file"].isin(reused) ] )
+
+    if len(entries) == 0:
+        return empty_catalog(), nindexed
+
+    catalog = pd.concat(entries, ignore_index=True)
+    catalog = catalog.sort_values(["PLATFORM_NUMBER", "CYCLE_NUMBER", "file", "row_group"], kind="stable").reset_index(drop=True)
+
+    return catalog, nindexed
+
+#------------------------------------------------------------------------------#
+## Load the catalog of a database
+def load_catalog(out_dir, db_type):
+    """Read the stored catalog of a database, returns None if not present"""
+
+    fname = catalog_fname(out_dir, db_type)
+    if not os.path.isfile(fname):
+        return None
+
+    return pd.read_parquet(fname)
+
+#------------------------------------------------------------------------------#
+## Update and store the catalog of a database
+def update_catalog(out_dir, db_type):
+    """Bring the stored catalog of a database up to date with its fragments
+    (see build_catalog) and store it to
+    <out_dir>/metadata/Argo<DB>_catalog.parquet
+
+    Arguments:
+    out_dir -- folder of the parquet database
+    db_type -- 'PHY' or 'BGC'
+
+    Returns:
+    catalog -- the catalog of the database
+    """
+
+    fname = catalog_fname(out_dir, db_type)
+    catalog, nindexed = build_catalog(out_dir, db_type, previous=load_catalog(out_dir, db_type))
+
+    Path(fname).parent.mkdir(parents = True, exist_ok = True)
+    catalog.to_parquet(fname, index=False)
+    print("Catalog of " + str(len(catalog)) + " cycles of " + str(catalog["PLATFORM_NUMBER"].nunique()) + " floats stored to " + fname + " (" + str(nindexed) + " fragments indexed).")
+
+    return catalog
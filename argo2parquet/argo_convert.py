@@ -13,76 +13,271 @@ import dask
 from dask.distributed import Client
 from argo2parquet.daskTools import daskTools
 from argo2parquet.generateSchema import generateSchema
+import argo2parquet.argo_bloom as ab
+import argo2parquet.argo_catalog as ac
+import argo2parquet.argo_manifest as am
+import argo2parquet.argo_normalize as an
+import argo2parquet.argo_resources as ar
+import argo2parquet.argo_summary as asm
+from dask.utils import format_bytes
 import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 ##########################################################################
 
-def argo_convert( flists, metadata, db_names, outdir_parquet, schema_path):
+def argo_convert( flists, metadata, db_names, outdir_parquet, schema_path, incremental=False, retry_failed=False, reader=None, engine=None, row_group_size=None, layout=None, tile_size=None, cluster=None, time_bucket=None, balance=None, n_workers=None, threads_per_worker=None, memory_limit=None, shared_cluster=False, drop_padding=False, compact_schema=False, write_profile=None, summaries=False, normalized=False):
 
-    flist_phy = flists[0]
-    flist_bgc = flists[1]
+    converter_kwargs = {
+        "reader": reader,
+        "engine": engine,
+        "row_group_size": row_group_size,
+        "layout": layout,
+        "tile_size": tile_size,
+        "cluster": cluster,
+        "time_bucket": time_bucket,
+        "balance": balance,
+        "drop_padding": drop_padding,
+        "write_profile": write_profile,
+    }
 
-    metadata_phy = metadata[0]
-    metadata_bgc = metadata[1]
+    if shared_cluster:
+        argo_convert_shared(flists, metadata, db_names, outdir_parquet, schema_path, incremental, retry_failed, converter_kwargs, n_workers, threads_per_worker, memory_limit, compact_schema, summaries, normalized)
+        return
 
     for k in range(len(db_names)):
 
         start_time = time.time()
 
         db_name = db_names[k]
-        print("Converting " + db_name + " database...")
-        genSchema = generateSchema(outdir=schema_path, db=db_name)
-        schema_fname = genSchema.schema_fname
-        print("Schema file for " + db_name + " database: " + schema_fname)
-
-        if db_name=="phy":
-            flist = flist_phy
-            metadata = metadata_phy
-            nw = 18
-            tw = 1
-            memlim = "5.5GB"
-        elif db_name=="bgc":
-            flist = flist_bgc
-            metadata = metadata_bgc
-            nw = 9
-            tw = 1
-            memlim = "11GB"
-
-        print("(nw, tw)")
-        print( (nw, tw) )
-
-        # convert metadata
-        if len(metadata) > 0:
-            metadata_dir = outdir_parquet + "metadata/"
-            Path(metadata_dir).mkdir(parents = True, exist_ok = True)
-            parquet_filename = metadata_dir + "Argo" + db_name.upper() + "_metadata.parquet"
-            metadata.to_parquet(parquet_filename)
-            print("Metadata stored to " + str(parquet_filename) + ".")
-
-            client = Client(
+        flist, db_metadata = select_database(flists, metadata, db_name)
+        outdir_db = outdir_parquet + db_name + "/"
+        daskConverter = setup_database(db_name, flist, outdir_db, schema_path, converter_kwargs, compact_schema)
+
+        # cluster sized on the host and on the memory the files take once read
+        expansion, largest = ar.expansion_factor(flist, daskConverter.memory_footprint)
+        nw, tw, memlim = ar.plan_resources(
+            expansion,
+            largest,
+            engine = daskConverter.engine,
+            n_workers = n_workers,
+            threads_per_worker = threads_per_worker,
+            memory_limit = memory_limit,
+        )
+        print("Cores: " + str(ar.available_cores()) + ", memory: " + format_bytes(ar.available_memory()) + ", in-memory expansion of the files: " + "{:.1f}".format(expansion) + ", largest file: " + format_bytes(largest))
+        print("(nw, tw, memlim)")
+        print( (nw, tw, memlim) )
+
+        client = Client(
             n_workers=nw,
             threads_per_worker=tw,
             processes=True,
             memory_limit=memlim,
         )
 
-        chunksize = 1000
-
-        daskConverter = daskTools(
-            db_type = db_name.upper(),
-            out_dir = outdir_parquet,
-            flist = flist,
-            schema_path = schema_fname,
-            chunk = chunksize,
-        )
-
-        daskConverter.convert_to_parquet()
+        convert_database(daskConverter, db_name, flist, db_metadata, outdir_db, incremental, retry_failed, summaries, normalized)
 
         client.shutdown()
 
         elapsed_time = time.time() - start_time
         print("Time to convert " + db_name + " database: " + str(elapsed_time))
 
+#------------------------------------------------------------------------------#
+## Convert databases at the same time on one cluster
+def argo_convert_shared( flists, metadata, db_names, outdir_parquet, schema_path, incremental, retry_failed, converter_kwargs, n_workers=None, threads_per_worker=None, memory_limit=None, compact_schema=False, summaries=False, normalized=False):
+    """Convert the databases at the same time on a single dask cluster: each
+    database is written to its own folder <outdir_parquet>/<db_name>/, and its
+    tasks take the MEMORY resource that they may need, so that light PHY tasks
+    fill the workers while memory-heavy BGC tasks run
+
+    Arguments:
+    see argo_convert
+    """
+
+    start_time = time.time()
+
+    converters = {}
+    memory_tasks = {}
+    for db_name in db_names:
+        flist, db_metadata = select_database(flists, metadata, db_name)
+        outdir_db = outdir_parquet + db_name + "/"
+        converters[db_name] = setup_database(db_name, flist, outdir_db, schema_path, converter_kwargs, compact_schema)
+
+        expansion, largest = ar.expansion_factor(flist, converters[db_name].memory_footprint)
+        memory_tasks[db_name] = ar.task_memory(expansion, largest, converters[db_name].engine)
+        print(db_name + ": in-memory expansion of the files: " + "{:.1f}".format(expansion) + ", largest file: " + format_bytes(largest) + ", memory per task: " + format_bytes(memory_tasks[db_name]))
+
+    nw, tw, memlim, worker_resources, task_resources = ar.plan_shared_resources(
+        memory_tasks,
+        n_workers = n_workers,
+        threads_per_worker = threads_per_worker,
+        memory_limit = memory_limit,
+    )
+    print("Cores: " + str(ar.available_cores()) + ", memory: " + format_bytes(ar.available_memory()))
+    print("(nw, tw, memlim, resources)")
+    print( (nw, tw, memlim, worker_resources) )
+
+    client = Client(
+        n_workers=nw,
+        threads_per_worker=tw,
+        processes=True,
+        memory_limit=memlim,
+        resources=worker_resources,
+    )
+
+    # each database is driven by its own thread, the tasks of both are
+    # scheduled on the same workers
+    with ThreadPoolExecutor(max_workers=len(db_names)) as pool:
+        futures = {}
+        for db_name in db_names:
+            converters[db_name].resources = task_resources[db_name]
+            flist, db_metadata = select_database(flists, metadata, db_name)
+            futures[db_name] = pool.submit(
+                convert_database, converters[db_name], db_name, flist, db_metadata, outdir_parquet + db_name + "/", incremental, retry_failed, summaries, normalized
+            )
+
+        for db_name, future in futures.items():
+            future.result()
+            print("Time to convert " + db_name + " database: " + str(time.time() - start_time))
+
+    client.shutdown()
+
+    elapsed_time = time.time() - start_time
+    print("Time to convert " + ", ".join(db_names) + " databases: " + str(elapsed_time))
+
+#------------------------------------------------------------------------------#
+## Files and metadata of a database
+def select_database(flists, metadata, db_name):
+    """Files and GDAC index subset of the database db_name ('phy' or 'bgc')"""
+
+    if db_name=="phy":
+        return flists[0], metadata[0]
+    elif db_name=="bgc":
+        return flists[1], metadata[1]
+
+#------------------------------------------------------------------------------#
+## Set up the conversion of a database
+def setup_database(db_name, flist, outdir_parquet, schema_path, converter_kwargs, compact_schema=False):
+    """Generate the schema and create the converter of a database
+
+    Arguments:
+    db_name          -- 'phy' or 'bgc'
+    flist            -- list of paths to the files to convert
+    outdir_parquet   -- folder of the parquet database
+    schema_path      -- folder of the schema files
+    converter_kwargs -- further arguments to daskTools
+    compact_schema   -- if True, convert to the compact schema (see
+                        generateSchema)
+
+    Returns:
+    daskConverter -- daskTools object of the database
+    """
+
+    print("Converting " + db_name + " database...")
+    genSchema = generateSchema(outdir=schema_path, db=db_name, compact=compact_schema)
+    schema_fname = genSchema.schema_fname
+    print("Schema file for " + db_name + " database: " + schema_fname)
+
+    chunksize = 1000
+
+    daskConverter = daskTools(
+        db_type = db_name.upper(),
+        out_dir = outdir_parquet,
+        flist = flist,
+        schema_path = schema_fname,
+        chunk = chunksize,
+        **converter_kwargs
+    )
+
+    return daskConverter
+
+#------------------------------------------------------------------------------#
+## Store the GDAC index subset of a database
+def store_metadata(db_name, metadata, outdir_parquet):
+    """Store the GDAC index subset of a database to
+    <outdir_parquet>/metadata/Argo<DB>_metadata.parquet"""
+
+    if len(metadata) > 0:
+        metadata_dir = outdir_parquet + "metadata/"
+        Path(metadata_dir).mkdir(parents = True, exist_ok = True)
+        parquet_filename = metadata_dir + "Argo" + db_name.upper() + "_metadata.parquet"
+        metadata.to_parquet(parquet_filename)
+        print("Metadata stored to " + str(parquet_filename) + ".")
+
+#------------------------------------------------------------------------------#
+## Convert a database
+def convert_database(daskConverter, db_name, flist, metadata, outdir_parquet, incremental=False, retry_failed=False, summaries=False, normalized=False):
+    """Convert a database on the current dask cluster, as a whole or only its
+    changed or failed files, and store its manifests
+
+    Arguments:
+    daskConverter  -- daskTools object of the database (see setup_database)
+    db_name        -- 'phy' or 'bgc'
+    flist          -- list of paths to the files to convert
+    metadata       -- GDAC index subset of the database
+    outdir_parquet -- folder of the parquet database
+    incremental    -- if True, convert only the files changed since the
+                      previous conversion
+    retry_failed   -- if True, convert only the files that failed in the
+                      previous conversion
+    summaries      -- if True, update the gridded summaries of the database
+                      (see argo_summary)
+    normalized     -- if True, update the normalized profile and levels
+                      tables of the database (see argo_normalize)
+    """
+
+    manifest = am.build_manifest(flist, metadata)
+    manifest_fname = am.manifest_fname(outdir_parquet, db_name)
+    status_fname = am.status_fname(outdir_parquet, db_name)
+    previous = None
+    previous_status = None
+    if incremental or retry_failed:
+        previous = am.load_manifest(manifest_fname)
+        previous_status = am.load_manifest(status_fname)
+        if previous is None:
+            print("No conversion manifest found at " + manifest_fname + ", converting the whole database.")
+
+    if previous is None:
+        daskConverter.convert_to_parquet()
+    elif retry_failed:
+        flist_failed = am.failed_status_files(previous_status, flist)
+        print("Retrying " + str(len(flist_failed)) + " files that failed in the previous conversion.")
+        daskConverter.update_parquet(flist_failed, sorted(set(am.file_wmoid(f) for f in flist_failed)))
+        # the other files keep their previous state, so that later
+        # incremental runs still pick their changes up
+        manifest = pd.concat([
+            previous.loc[ ~previous["file"].isin(flist_failed) ],
+            manifest.loc[ manifest["file"].isin(flist_failed) ]
+        ], ignore_index=True)
+    else:
+        flist_changed, wmoids_removed = am.changed_files(manifest, previous)
+        print(str(len(flist_changed)) + " of " + str(len(flist)) + " files changed since the previous conversion.")
+        daskConverter.update_parquet(flist_changed, wmoids_removed)
+
+    # stored after the conversion, since overwriting the database with the
+    # "dask" engine also removes its metadata folder
+    store_metadata(db_name, metadata, outdir_parquet)
+
+    status = am.merge_status(previous_status if previous is not None else None, daskConverter.status_table(), flist)
+    am.save_status(status, status_fname)
+    daskConverter.failed_files()
+
+    # failed files are left out of the manifest, so that the next
+    # incremental conversion tries them again
+    manifest = manifest.loc[ ~manifest["file"].isin(am.failed_status_files(status)) ]
+    am.save_manifest(manifest, manifest_fname)
+
+    ac.update_catalog(outdir_parquet, daskConverter.db_type)
+    ab.update_index(outdir_parquet, daskConverter.db_type)
+    if summaries:
+        asm.update_summary(outdir_parquet, daskConverter.db_type)
+    if normalized:
+        an.update_normalized(outdir_parquet, daskConverter.db_type, daskConverter.write_profile)
+
+    daskConverter.pruning_report()
+    daskConverter.balance_report()
+    daskConverter.padding_report()
+
 ##########################################################################
 
 if __name__ == "__main__":
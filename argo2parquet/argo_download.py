@@ -17,10 +17,15 @@ import copy
 import time
 ##########################################################################
 
-def argo_download(gdac_path, outdir_nc, db_names, dryrun_flag):
+def argo_download(gdac_path, outdir_nc, db_names, dryrun_flag, download_mode=None):
+
+    if download_mode is None:
+        download_mode = "process"
 
     if dryrun_flag:
         nproc = 1
+    elif download_mode == "async":
+        nproc = 64
     else:
         nproc = 36
 
@@ -45,7 +50,8 @@ def argo_download(gdac_path, outdir_nc, db_names, dryrun_flag):
             overwrite_profiles=True,
             NPROC=nproc,
             verbose=True,
-            checktime=True
+            checktime=True,
+            download_mode=download_mode
         )
 
         if db_name=="phy":
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+## @file argo_layout.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Fri 08 Nov 2024
+
+##########################################################################
+#
+# Spatio-temporal layout of the parquet databases: rows are written into hive
+# partitions YEAR=<year>/LAT_TILE=<lat>/LON_TILE=<lon>/, where LAT_TILE and
+# LON_TILE are the south-west corner of a tile_size x tile_size degrees tile,
+# so that regional and time-window reads only open the files of the tiles and
+# years they overlap. Profiles with missing JULD or position go to YEAR=0 or
+# LAT_TILE=LON_TILE=999, which no range filter selects.
+#
+# Within files, rows can be clustered by time bucket, Z-order position and
+# pressure, so that the row group min/max statistics are tight.
+
+import os
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+##########################################################################
+
+PARTITION_KEYS = ["YEAR", "LAT_TILE", "LON_TILE"]
+MISSING_YEAR = 0
+MISSING_TILE = 999
+CLUSTER_KEYS = ["time", "space", "pres"]
+
+#------------------------------------------------------------------------------#
+## Partition keys of the rows
+def partition_keys(juld, latitude, longitude, tile_size=10):
+    """Compute the partition keys of each row
+
+    Arguments:
+    juld      -- datetime64 array
+    latitude  -- float array (NaN where missing)
+    longitude -- float array (NaN where missing)
+    tile_size -- size in degrees of the lat/lon tiles
+
+    Returns:
+    keys -- dict with an int32 array for each of PARTITION_KEYS
+    """
+
+    juld = np.asarray(juld, dtype="datetime64[ns]")
+    latitude = np.asarray(latitude, dtype="float64")
+    longitude = np.asarray(longitude, dtype="float64")
+
+    year = juld.astype("datetime64[Y]").astype("int64") + 1970
+    year = np.where(np.isnat(juld), MISSING_YEAR, year)
+
+    missing = np.isnan(latitude) | np.isnan(longitude)
+    lon = np.where(missing, 0, longitude)
+    # 180 goes to the last tile, as 90 for the latitude, so that the
+    # partition filters of a LONGITUDE range reaching 180 keep it
+    lon = np.where(lon == 180.0, 180.0 - 1e-9, (lon + 180.0) % 360.0 - 180.0)
+    lat_tile = np.floor( np.clip(np.where(missing, 0, latitude), -90, 90 - 1e-9)/tile_size )*tile_size
+    lon_tile = np.floor( lon/tile_size )*tile_size
+
+    keys = {
+        "YEAR": year.astype("int32"),
+        "LAT_TILE": np.where(missing, MISSING_TILE, lat_tile).astype("int32"),
+        "LON_TILE": np.where(missing, MISSING_TILE, lon_tile).astype("int32"),
+    }
+
+    return keys
+
+#------------------------------------------------------------------------------#
+## Add partition keys to a dataframe
+def add_partition_keys(df, tile_size=10):
+    """Add the PARTITION_KEYS columns to a dataframe with JULD, LATITUDE and
+    LONGITUDE columns"""
+
+    keys = partition_keys(
+        df["JULD"].to_numpy(dtype="datetime64[ns]"),
+        df["LATITUDE"].to_numpy(dtype="float64", na_value=np.nan),
+        df["LONGITUDE"].to_numpy(dtype="float64", na_value=np.nan),
+        tile_size
+    )
+
+    return df.assign(**keys)
+
+#------------------------------------------------------------------------------#
+## Schema with the partition keys
+def partitioned_schema(schema):
+    """Database schema with the PARTITION_KEYS fields appended, to be passed to
+    pyarrow/dask readers so that the partition keys can be filtered on"""
+
+    for key in PARTITION_KEYS:
+        if key not in schema.names:
+            schema = schema.append( pa.field(key, pa.int32()) )
+
+    return schema
+
+#------------------------------------------------------------------------------#
+## Hive directory of a partition
+def partition_dir(year, lat_tile, lon_tile):
+    """Relative hive directory of a partition"""
+
+    return os.path.join( *[k + "=" + str(v) for k, v in zip(PARTITION_KEYS, [year, lat_tile, lon_tile])] )
+
+#------------------------------------------------------------------------------#
+## Split an arrow table into its partitions
+def split_table(table, tile_size=10):
+    """Split a table into the rows of each partition
+
+    Arguments:
+    table     -- pyarrow table with JULD, LATITUDE and LONGITUDE columns
+    tile_size -- size in degrees of the lat/lon tiles
+
+    Returns:
+    parts -- list of (partition directory, table) pairs
+    """
+
+    if table.num_rows == 0:
+        return []
+
+    keys = partition_keys(
+        table["JULD"].cast(pa.timestamp("ns")).to_numpy(),
+        pc.fill_null(table["LATITUDE"].cast(pa.float64()), np.nan).to_numpy(),
+        pc.fill_null(table["LONGITUDE"].cast(pa.float64()), np.nan).to_numpy(),
+        tile_size
+    )
+    stacked = np.stack([keys[k] for k in PARTITION_KEYS], axis=1)
+    uniques, inverse = np.unique(stacked, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    # rows are stably sorted by partition, so that each one is a slice
+    order = np.argsort(inverse, kind="stable")
+    table = table.take( pa.array(order) )
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(uniques)))])
+
+    parts = []
+    for p in range(len(uniques)):
+        parts.append( (partition_dir(*uniques[p]), table.slice(bounds[p], bounds[p+1] - bounds[p])) )
+
+    return parts
+
+#------------------------------------------------------------------------------#
+## Translate value filters into partition filters
+def partition_filters(filters, tile_size=10):
+    """Add to a list of filters on LATITUDE, LONGITUDE and JULD the equivalent
+    filters on the partition keys, so that pyarrow and dask skip the partitions
+    outside the requested region and time window without opening their files
+
+    Arguments:
+    filters   -- list of (column, op, value) tuples, combined with AND, as
+                 used by pyarrow.parquet.ParquetDataset and dask.read_parquet
+    tile_size -- size in degrees of the lat/lon tiles of the database
+
+    Returns:
+    filters -- the input filters followed by the partition key filters
+    """
+
+    key_filters = []
+    for column, op, value in filters:
+        if op not in [">", ">=", "<", "<=", "=", "=="]:
+            continue
+
+        if column == "JULD":
+            if isinstance(value, (datetime, date, pd.Timestamp, np.datetime64)):
+                key, bound = "YEAR", pd.Timestamp(value).year
+            else:
+                continue
+        elif column == "LATITUDE":
+            key, bound = "LAT_TILE", int( np.floor( np.clip(value, -90, 90 - 1e-9)/tile_size )*tile_size )
+        elif column == "LONGITUDE":
+            # a longitude range does not map to a tile range across the
+            # antimeridian, so only bounds within [-180,180) are translated
+            if value < -180 or value >= 180:
+                continue
+            key, bound = "LON_TILE", int( np.floor( value/tile_size )*tile_size )
+        else:
+            continue
+
+        # the tile of the bound is always kept, as it may hold rows on the
+        # right side of the bound
+        if op in [">", ">="]:
+            key_filters.append( (key, ">=", bound) )
+        elif op in ["<", "<="]:
+            key_filters.append( (key, "<=", bound) )
+        else:
+            key_filters.append( (key, "==", bound) )
+
+    return list(filters) + key_filters
+
+#------------------------------------------------------------------------------#
+## Morton code of positions
+def morton_key(latitude, longitude, bits=16):
+    """Interleave the bits of the quantized latitude and longitude (Z-order
+    curve), so that positions close in space have close keys
+
+    Arguments:
+    latitude  -- float array
+    longitude -- float array
+    bits      -- bits used to quantize each coordinate (at most 32)
+
+    Returns:
+    key -- uint64 array, 2^64-1 where the position is missing
+    """
+
+    latitude = np.asarray(latitude, dtype="float64")
+    longitude = np.asarray(longitude, dtype="float64")
+    missing = np.isnan(latitude) | np.isnan(longitude)
+
+    scale = 2**bits - 1
+    lat = np.clip( (np.where(missing, 0, latitude) + 90.0)/180.0, 0, 1 )
+    lon = ( (np.where(missing, 0, longitude) + 180.0) % 360.0 )/360.0
+    lat = np.round(lat*scale).astype("uint64")
+    lon = np.round(lon*scale).astype("uint64")
+
+    key = np.zeros(lat.shape, dtype="uint64")
+    for b in range(bits):
+        key |= ((lon >> np.uint64(b)) & np.uint64(1)) << np.uint64(2*b + 1)
+        key |= ((lat >> np.uint64(b)) & np.uint64(1)) << np.uint64(2*b)
+    key[missing] = np.iinfo("uint64").max
+
+    return key
+
+#------------------------------------------------------------------------------#
+## Clustering order of the rows of a table
+def cluster_indices(table, time_bucket="M", cluster_by=None):
+    """Order of the rows that clusters them by time bucket, by position along a
+    Z-order curve and by pressure, so that the row groups written from the
+    sorted rows have tight JULD, LATITUDE/LONGITUDE and PRES min/max statistics
+
+    Arguments:
+    table       -- pyarrow table with JULD, LATITUDE, LONGITUDE and PRES
+    time_bucket -- numpy datetime unit of the time buckets ('Y', 'M', 'W', 'D')
+    cluster_by  -- sort keys in order of priority, among CLUSTER_KEYS
+                   (default: time, space, pres)
+
+    Returns:
+    indices -- pyarrow array of row indices, missing values last
+    """
+
+    if cluster_by is None:
+        cluster_by = CLUSTER_KEYS
+
+    juld = table["JULD"].cast(pa.timestamp("ns")).to_numpy()
+    bucket = juld.astype("datetime64[" + time_bucket + "]").astype("int64")
+    bucket = np.where(np.isnat(juld), np.iinfo("int64").max, bucket)
+    space = morton_key(
+        pc.fill_null(table["LATITUDE"].cast(pa.float64()), np.nan).to_numpy(),
+        pc.fill_null(table["LONGITUDE"].cast(pa.float64()), np.nan).to_numpy(),
+    )
+
+    keys = pa.table({"time": bucket, "space": space, "pres": table["PRES"]})
+    return pc.sort_indices(keys, sort_keys=[(k,"ascending") for k in cluster_by], null_placement="at_end")
+
+#------------------------------------------------------------------------------#
+## Cluster the rows of a table
+def cluster_table(table, time_bucket="M", cluster_by=None):
+    """Sort the rows of a table with cluster_indices()"""
+
+    if table.num_rows == 0:
+        return table
+
+    return table.take( cluster_indices(table, time_bucket, cluster_by) )
+
+#------------------------------------------------------------------------------#
+## Cluster the rows of a dataframe
+def cluster_df(df, time_bucket="M", cluster_by=None):
+    """Sort the rows of a dataframe with cluster_indices()"""
+
+    if len(df) == 0:
+        return df
+
+    table = pa.Table.from_pandas(df[["JULD","LATITUDE","LONGITUDE","PRES"]], preserve_index=False)
+    return df.iloc[ cluster_indices(table, time_bucket, cluster_by).to_numpy() ]
+
+#------------------------------------------------------------------------------#
+## Filters of the example notebooks
+REFERENCE_FILTERS = {
+    "region": [("LATITUDE",">",34), ("LATITUDE","<",80), ("LONGITUDE",">",-78), ("LONGITUDE","<",-50)],
+    "time": [("JULD",">=",datetime(2023,1,1)), ("JULD","<=",datetime(2023,12,31))],
+    "pres": [("PRES_ADJUSTED",">=",100), ("PRES_ADJUSTED","<=",300)],
+    "region+time+pres": [("LATITUDE",">",34), ("LATITUDE","<",80), ("LONGITUDE",">",-78), ("LONGITUDE","<",-50),
+                         ("JULD",">=",datetime(2023,1,1)), ("JULD","<=",datetime(2023,12,31)),
+                         ("PRES_ADJUSTED",">=",100), ("PRES_ADJUSTED","<=",300)],
+}
+
+#------------------------------------------------------------------------------#
+## Row groups selected by a filter
+def row_group_pruning(dataset, filters):
+    """Count the row groups that a reader has to scan for a filter, using the
+    partition keys and the min/max statistics of the row groups
+
+    Arguments:
+    dataset -- pyarrow.dataset.Dataset of the parquet database
+    filters -- list of (column, op, value) tuples, combined with AND
+
+    Returns:
+    selected -- number of row groups whose statistics may match the filter
+    total    -- number of row groups in the database
+    """
+
+    expression = pq.filters_to_expression(filters)
+
+    total = 0
+    for fragment in dataset.get_fragments():
+        total += fragment.metadata.num_row_groups
+
+    selected = 0
+    for fragment in dataset.get_fragments(filter=expression):
+        selected += len( fragment.split_by_row_group(filter=expression, schema=dataset.schema) )
+
+    return selected, total
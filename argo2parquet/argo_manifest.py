@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+
+## @file argo_manifest.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Tue 05 Nov 2024
+
+##########################################################################
+#
+# Conversion manifest used to convert incrementally only the floats whose
+# profile files changed since the last conversion
+
+import glob
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import argo2parquet.argo_arrow as aa
+##########################################################################
+
+#------------------------------------------------------------------------------#
+## Path to the manifest of a database
+def manifest_fname(outdir_parquet, db_name):
+    """Path to the conversion manifest of a database
+
+    Arguments:
+    outdir_parquet -- root folder of the parquet database
+    db_name        -- 'phy' or 'bgc'
+    """
+
+    return outdir_parquet + "metadata/Argo" + db_name.upper() + "_manifest.parquet"
+
+#------------------------------------------------------------------------------#
+## WMO identifier from profile file name
+def file_wmoid(fname):
+    """WMO identifier of the float from the name of its <WMOID>_prof.nc or
+    <WMOID>_Sprof.nc file"""
+
+    return int( os.path.basename(fname).split("_")[0] )
+
+#------------------------------------------------------------------------------#
+## Build manifest of the source files
+def build_manifest(flist, metadata=None):
+    """Record the state of the source files to be converted
+
+    Arguments:
+    flist    -- list of paths to the profile files
+    metadata -- dataframe with the GDAC index subset (as returned by argo_gdac),
+                used for the date_update of each float
+
+    Returns:
+    manifest -- dataframe with one row per file: file, wmoid, mtime, size and
+                date_update (latest update in the GDAC index for the float);
+                files missing on disk have NaN mtime and size -1
+    """
+
+    mtimes = []
+    sizes = []
+    for f in flist:
+        try:
+            st = os.stat(f)
+            mtimes.append(st.st_mtime)
+            sizes.append(st.st_size)
+        except OSError:
+            mtimes.append(np.nan)
+            sizes.append(-1)
+
+    manifest = pd.DataFrame({
+        "file": pd.Series(flist, dtype=str),
+        "wmoid": pd.Series([file_wmoid(f) for f in flist], dtype="int64"),
+        "mtime": pd.Series(mtimes, dtype="float64"),
+        "size": pd.Series(sizes, dtype="int64"),
+    })
+
+    if isinstance(metadata, pd.DataFrame) and len(metadata) > 0:
+        date_update = metadata.groupby("wmoid")["date_update"].max()
+        manifest["date_update"] = manifest["wmoid"].map(date_update)
+    else:
+        manifest["date_update"] = pd.NaT
+    manifest["date_update"] = pd.to_datetime(manifest["date_update"])
+
+    return manifest
+
+#------------------------------------------------------------------------------#
+## Read manifest from disk
+def load_manifest(fname):
+    """Read a conversion manifest, returns None if not present"""
+
+    if not os.path.isfile(fname):
+        return None
+
+    return pd.read_parquet(fname)
+
+#------------------------------------------------------------------------------#
+## Store manifest to disk
+def save_manifest(manifest, fname):
+    """Store a conversion manifest"""
+
+    Path(fname).parent.mkdir(parents = True, exist_ok = True)
+    manifest.to_parquet(fname, index=False)
+    print("Conversion manifest stored to " + str(fname) + ".")
+
+#------------------------------------------------------------------------------#
+## Compare manifests
+def changed_files(manifest, previous):
+    """Compare the current state of the source files with the one recorded at
+    the previous conversion
+
+    Arguments:
+    manifest -- manifest of the files to be converted now
+    previous -- manifest stored at the previous conversion
+
+    Returns:
+    flist_changed  -- files that are new or whose mtime, size or date_update
+                      changed, and that must be (re-)converted
+    wmoids_removed -- floats whose rows must be removed from the database, i.e.
+                      floats of changed files and floats no longer in the list
+    """
+
+    merged = manifest.merge(previous, on="file", how="left", suffixes=("", "_prev"), indicator=True)
+
+    same_date = (merged["date_update"] == merged["date_update_prev"]) | (merged["date_update"].isna() & merged["date_update_prev"].isna())
+    changed = (
+        (merged["_merge"] == "left_only")
+        | (merged["mtime"] != merged["mtime_prev"])
+        | (merged["size"] != merged["size_prev"])
+        | ~same_date
+    )
+
+    flist_changed = merged.loc[changed, "file"].tolist()
+
+    gone = ~previous["file"].isin(manifest["file"])
+    wmoids_removed = set( merged.loc[changed & (merged["_merge"] == "both"), "wmoid"] )
+    wmoids_removed |= set( previous.loc[gone, "wmoid"] )
+
+    return flist_changed, sorted(int(w) for w in wmoids_removed)
+
+#------------------------------------------------------------------------------#
+## List data fragments of a database
+def list_fragments(out_dir, db_type):
+    """List the parquet fragments written for a database, leaving out the
+    manifests stored in the metadata folder and the normalized tables (see
+    argo_normalize.py)
+
+    Arguments:
+    out_dir -- folder of the parquet database
+    db_type -- 'PHY' or 'BGC'
+    """
+
+    fragments = glob.glob(os.path.join(out_dir, "**", "Argo" + db_type + "_*.parquet"), recursive=True)
+    metadata_dir = os.path.join(out_dir, "metadata", "")
+    normalized_dir = os.path.join(out_dir, "normalized", "")
+
+    return sorted( f for f in fragments if not f.startswith(metadata_dir) and not f.startswith(normalized_dir) )
+
+#------------------------------------------------------------------------------#
+## Drop floats from the database fragments
+def drop_floats(out_dir, db_type, wmoids, write_profile=None):
+    """Remove the rows of the given floats from the parquet fragments that hold
+    them, leaving all the other fragments untouched
+
+    Arguments:
+    out_dir -- folder of the parquet database
+    db_type -- 'PHY' or 'BGC'
+    wmoids  -- list of WMO identifiers to remove
+    write_profile -- write profile of the rewritten fragments (see
+                     argo_arrow.writer_kwargs)
+
+    Returns:
+    touched -- list of fragments that were rewritten or deleted
+    """
+
+    touched = []
+    if len(wmoids) == 0:
+        return touched
+
+    wmoids = pa.array(wmoids, type=pa.int64())
+    for fragment in list_fragments(out_dir, db_type):
+        platforms = pq.read_table(fragment, columns=["PLATFORM_NUMBER"])["PLATFORM_NUMBER"]
+        drop = pc.is_in(platforms.cast(pa.int64()), value_set=wmoids)
+        if not pc.any(drop).as_py():
+            continue
+
+        touched.append(fragment)
+        pqfile = pq.ParquetFile(fragment)
+        row_group_size = max(pqfile.metadata.row_group(0).num_rows, 1)
+        table = pqfile.read()
+        pqfile.close()
+        table = table.filter( pc.invert(drop) )
+        if table.num_rows == 0:
+            os.remove(fragment)
+        else:
+            pq.write_table(table, fragment, row_group_size=row_group_size, **aa.writer_kwargs(table.schema, write_profile))
+
+    print("Removed " + str(len(wmoids)) + " floats from " + str(len(touched)) + " fragments.")
+
+    return touched
+
+#------------------------------------------------------------------------------#
+## Rebuild _metadata file
+def write_metadata_file(out_dir, db_type, schema):
+    """Rebuild the _metadata and _common_metadata files of a database from the
+    footers of its fragments, after some of them were rewritten or deleted
+
+    Arguments:
+    out_dir -- folder of the parquet database
+    db_type -- 'PHY' or 'BGC'
+    schema  -- pyarrow schema of the database, used if no fragment is left
+    """
+
+    fragments = list_fragments(out_dir, db_type)
+    if len(fragments) > 0:
+        # keeps the pandas metadata that dask relies on when appending
+        schema = pq.read_schema(fragments[0])
+
+    metadata_collector = []
+    for fragment in fragments:
+        md = pq.read_metadata(fragment)
+        md.set_file_path( os.path.relpath(fragment, out_dir) )
+        metadata_collector.append(md)
+
+    pq.write_metadata(schema, os.path.join(out_dir, "_common_metadata"))
+    pq.write_metadata(schema, os.path.join(out_dir, "_metadata"), metadata_collector=metadata_collector)
+
+#------------------------------------------------------------------------------#
+## Path to the read status manifest of a database
+def status_fname(outdir_parquet, db_name):
+    """Path to the manifest with the read status of each converted file
+
+    Arguments:
+    outdir_parquet -- root folder of the parquet database
+    db_name        -- 'phy' or 'bgc'
+    """
+
+    return outdir_parquet + "metadata/Argo" + db_name.upper() + "_status.parquet"
+
+#------------------------------------------------------------------------------#
+## Read statuses as dataframe
+def status_frame(status):
+    """Build the status manifest from a list of read statuses
+
+    Arguments:
+    status -- list of dicts as returned by daskTools.read_status
+
+    Returns:
+    status -- dataframe with one row per file: file, wmoid, status ('ok' or
+              'failed'), error (exception class), message, rows, dropped
+              (padding rows), bytes and duration (s)
+    """
+
+    columns = {
+        "file": str, "wmoid": "int64", "status": str, "error": str, "message": str,
+        "rows": "int64", "dropped": "int64", "bytes": "int64", "duration": "float64",
+    }
+    frame = pd.DataFrame(status, columns=list(columns))
+    frame["dropped"] = frame["dropped"].fillna(0)
+
+    return frame.astype(columns)
+
+#------------------------------------------------------------------------------#
+## Merge read statuses
+def merge_status(previous, status, flist):
+    """Update the status manifest of a database after a partial conversion
+
+    Arguments:
+    previous -- status manifest of the previous conversion, or None
+    status   -- status manifest of the files converted now
+    flist    -- list of the files currently in the database
+
+    Returns:
+    status -- status manifest with the rows of the files converted now, the
+              rows of the other files in flist from previous, and no row for
+              the files that are no longer in flist
+    """
+
+    if previous is not None:
+        if "dropped" not in previous.columns:
+            # manifests stored before padding rows could be dropped
+            previous = previous.assign(dropped=0)
+        previous = previous.loc[ ~previous["file"].isin(status["file"]) ]
+        if len(previous) > 0:
+            status = pd.concat([previous, status], ignore_index=True)
+
+    status = status.loc[ status["file"].isin(flist) ]
+
+    return status.sort_values("file").reset_index(drop=True)
+
+#------------------------------------------------------------------------------#
+## Files that failed on read
+def failed_status_files(status, flist=None):
+    """List the files that failed on read according to a status manifest
+
+    Arguments:
+    status -- status manifest, or None
+    flist  -- if given, only the failed files that are in this list are
+              returned, in its order
+
+    Returns:
+    failed -- list of paths to the failed files
+    """
+
+    if status is None:
+        return []
+
+    failed = status.loc[ status["status"] != "ok", "file" ].tolist()
+    if flist is not None:
+        failed_set = set(failed)
+        failed = [f for f in flist if f in failed_set]
+
+    return failed
+
+#------------------------------------------------------------------------------#
+## Store read statuses
+def save_status(status, fname):
+    """Store a status manifest and report the files that failed"""
+
+    Path(fname).parent.mkdir(parents = True, exist_ok = True)
+    status.to_parquet(fname, index=False)
+
+    failed = status["status"] != "ok"
+    print("Status manifest stored to " + str(fname) + " (" + str(failed.sum()) + " of " + str(len(status)) + " files failed).")
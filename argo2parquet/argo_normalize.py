@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+## @file argo_normalize.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Normalized copy of a parquet database: a profile table with one row per
+# (PLATFORM_NUMBER, N_PROF) and the columns that are constant over a profile,
+# and a levels table with the other columns, keyed by PROFILE_ID. Each
+# fragment of the database is split into <out_dir>/normalized/profiles/ and
+# <out_dir>/normalized/levels/ under the same relative path, so that the
+# catalog of the database also locates the normalized rows, and only the
+# fragments that changed are split again.
+
+import glob
+import os
+from pathlib import Path
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import argo2parquet.argo_arrow as aa
+import argo2parquet.argo_manifest as am
+##########################################################################
+
+# columns of the profile table, when present in the database; the
+# <PARAM>_DATA_MODE columns of BGC are added too
+PROFILE_VARS = ["PLATFORM_NUMBER", "CYCLE_NUMBER", "N_PROF", "DIRECTION", "DATA_MODE", "LATITUDE", "LONGITUDE", "POSITION_QC", "JULD", "JULD_QC"]
+
+# PROFILE_ID = PLATFORM_NUMBER*PROFILE_ID_STRIDE + N_PROF
+PROFILE_ID_STRIDE = 100000
+
+#------------------------------------------------------------------------------#
+## Folder of the normalized tables
+def normalized_dir(out_dir, table=None):
+    """Folder of the normalized tables of a database, or of one of them
+
+    Arguments:
+    out_dir -- folder of the parquet database
+    table   -- "profiles" or "levels" (default: None, the parent folder)
+    """
+
+    if table is None:
+        return os.path.join(out_dir, "normalized", "")
+
+    return os.path.join(out_dir, "normalized", table, "")
+
+#------------------------------------------------------------------------------#
+## Normalized file of a fragment
+def normalized_fname(out_dir, fragment, table):
+    """Path of the profiles or levels of a fragment of the database
+
+    Arguments:
+    out_dir  -- folder of the parquet database
+    fragment -- path to the fragment
+    table    -- "profiles" or "levels"
+    """
+
+    return os.path.join(normalized_dir(out_dir, table), os.path.relpath(fragment, out_dir))
+
+#------------------------------------------------------------------------------#
+## Columns of the profile table
+def profile_vars(schema):
+    """Columns of a schema that go to the profile table"""
+
+    return [name for name in schema.names if name in PROFILE_VARS or name.endswith("_DATA_MODE")]
+
+#------------------------------------------------------------------------------#
+## Profile identifiers
+def profile_ids(table):
+    """PROFILE_ID of the rows of a table, from PLATFORM_NUMBER and N_PROF"""
+
+    platform = table["PLATFORM_NUMBER"].cast(pa.int64())
+    nprof = table["N_PROF"].cast(pa.int64())
+
+    return pc.add(pc.multiply(platform, PROFILE_ID_STRIDE), nprof)
+
+#------------------------------------------------------------------------------#
+## Split a table
+def split_table(table):
+    """Split the rows of a table of the database into its profiles and levels
+
+    Arguments:
+    table -- pyarrow table with the columns of the database
+
+    Returns:
+    profiles -- table with PROFILE_ID and the columns of profile_vars, one
+                row per profile, in the order of their first level
+    levels   -- table with PROFILE_ID and the other columns, one row per
+                level
+    """
+
+    ids = profile_ids(table)
+    pvars = profile_vars(table.schema)
+
+    _, first = np.unique(ids.to_numpy(), return_index=True)
+    profiles = table.select(pvars).take(np.sort(first))
+    profiles = profiles.add_column(0, "PROFILE_ID", ids.take(np.sort(first)))
+
+    levels = table.drop_columns(pvars).add_column(0, "PROFILE_ID", ids)
+
+    return profiles, levels
+
+#------------------------------------------------------------------------------#
+## Schema of a normalized table
+def split_schema(schema, table):
+    """Schema of the profiles or levels of a database schema, keeping the
+    encodings of the columns (see argo_arrow.writer_kwargs)
+
+    Arguments:
+    schema -- pyarrow schema of the database
+    table  -- "profiles" or "levels"
+    """
+
+    pvars = profile_vars(schema)
+    if table == "profiles":
+        fields = [schema.field(name) for name in pvars]
+    else:
+        fields = [field for field in schema if field.name not in pvars]
+
+    metadata = {k: v for k, v in (schema.metadata or {}).items() if k == b"column_encoding"}
+
+    return pa.schema([pa.field("PROFILE_ID", pa.int64())] + fields, metadata=metadata or None)
+
+#------------------------------------------------------------------------------#
+## Normalize a fragment
+def normalize_fragment(out_dir, fragment, write_profile=None):
+    """Split a fragment of the database into its profiles and levels, one row
+    group at a time; a profile whose levels span row groups of the fragment
+    is stored once
+
+    Arguments:
+    out_dir       -- folder of the parquet database
+    fragment      -- path to the fragment
+    write_profile -- write profile of the normalized files (see
+                     argo_arrow.writer_kwargs)
+
+    Returns:
+    fnames -- paths to the profiles and levels files
+    """
+
+    pqfile = pq.ParquetFile(fragment)
+    schema = pqfile.schema_arrow
+
+    fnames = {}
+    schemas = {}
+    for table in ["profiles", "levels"]:
+        fnames[table] = normalized_fname(out_dir, fragment, table)
+        schemas[table] = split_schema(schema, table)
+        Path(fnames[table]).parent.mkdir(parents = True, exist_ok = True)
+
+    levels_writer = pq.ParquetWriter(fnames["levels"], schemas["levels"], **aa.writer_kwargs(schemas["levels"], write_profile))
+    profiles = []
+    for row_group in range(pqfile.metadata.num_row_groups):
+        table = pqfile.read_row_group(row_group)
+        table_profiles, table_levels = split_table(table)
+        profiles.append( table_profiles.cast(schemas["profiles"]) )
+        levels_writer.write_table( table_levels.cast(schemas["levels"]) )
+    levels_writer.close()
+    pqfile.close()
+
+    profiles = pa.concat_tables(profiles) if len(profiles) > 0 else schemas["profiles"].empty_table()
+    _, first = np.unique(profiles["PROFILE_ID"].to_numpy(), return_index=True)
+    profiles = profiles.take(np.sort(first))
+    pq.write_table(profiles, fnames["profiles"], **aa.writer_kwargs(schemas["profiles"], write_profile))
+
+    return fnames["profiles"], fnames["levels"]
+
+#------------------------------------------------------------------------------#
+## Update the normalized tables of a database
+def update_normalized(out_dir, db_type, write_profile=None):
+    """Split the fragments of a database that are new or changed since they
+    were last split (see normalize_fragment), and remove the normalized files
+    of the fragments that no longer exist
+
+    Arguments:
+    out_dir       -- folder of the parquet database
+    db_type       -- 'PHY' or 'BGC'
+    write_profile -- write profile of the normalized files
+
+    Returns:
+    nnormalized -- number of fragments split
+    """
+
+    fragments = am.list_fragments(out_dir, db_type)
+
+    nnormalized = 0
+    expected = set()
+    for fragment in fragments:
+        fnames = [normalized_fname(out_dir, fragment, table) for table in ["profiles", "levels"]]
+        expected.update(os.path.normpath(f) for f in fnames)
+        if all(os.path.isfile(f) and os.path.getmtime(f) >= os.path.getmtime(fragment) for f in fnames):
+            continue
+        normalize_fragment(out_dir, fragment, write_profile)
+        nnormalized += 1
+
+    removed = 0
+    for fname in glob.glob(os.path.join(normalized_dir(out_dir), "**", "Argo" + db_type + "_*.parquet"), recursive=True):
+        if os.path.normpath(fname) not in expected:
+            os.remove(fname)
+            removed += 1
+
+    size = sum(os.path.getsize(f) for f in fragments)
+    normalized_size = sum(os.path.getsize(f) for f in expected)
+    print("Normalized tables stored to " + normalized_dir(out_dir) + " (" + str(nnormalized) + " fragments split, " + str(removed) + " files removed): " + "{:.1f}".format(normalized_size/1e6) + " MB against " + "{:.1f}".format(size/1e6) + " MB.")
+
+    return nnormalized
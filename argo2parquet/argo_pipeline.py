@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+## @file argo_pipeline.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Pipelined download and conversion: a downloader thread syncs the profile
+# files with the GDAC and hands each file over to the converter as soon as it
+# is settled on disk, and the converter appends the files to the parquet
+# database in batches while the next ones are downloaded, so that the whole
+# run takes about as long as the slower of the two stages instead of their
+# sum. The handover queue is bounded: when the converter falls behind, the
+# downloader blocks until a batch is converted (backpressure), so that the
+# files downloaded and not yet converted stay within queue_size. Files of
+# floats unchanged since the last download do not take a place in the queue.
+
+import argo2parquet.argo_tools as at
+import argo2parquet.argo_bloom as ab
+import argo2parquet.argo_catalog as ac
+import argo2parquet.argo_manifest as am
+import argo2parquet.argo_normalize as an
+import argo2parquet.argo_resources as ar
+import argo2parquet.argo_summary as asm
+from argo2parquet.argo_convert import setup_database, store_metadata
+from dask.distributed import Client
+from dask.utils import format_bytes
+from datetime import datetime
+import pandas as pd
+import queue
+import threading
+import time
+##########################################################################
+
+# files converted at a time
+BATCH_SIZE = 500
+
+# files downloaded and not yet converted before the downloader blocks
+QUEUE_SIZE = 1000
+
+class fileQueue:
+
+#------------------------------------------------------------------------------#
+## Constructor
+    def __init__(self, maxsize=None):
+        """Queue of the files handed over from the downloader to the
+        converter, holding at most maxsize downloaded files
+
+        Arguments:
+        maxsize -- number of downloaded files waiting or being converted
+                   before put blocks (default: QUEUE_SIZE)
+        """
+
+        if maxsize is None:
+            maxsize = QUEUE_SIZE
+        if maxsize < 1:
+            raise ValueError("The queue must hold at least one file.")
+
+        self.maxsize = maxsize
+        self.files = queue.Queue()
+        self.slots = threading.Semaphore(maxsize)
+        self.blocked_time = 0
+        self.idle_time = 0
+        self.cancelled = False
+
+#------------------------------------------------------------------------------#
+## Hand a file over
+    def put(self, fname, fetched):
+        """Hand a file over to the converter (see on_file in argo_gdac):
+        fetched files take a slot, and block while none is free
+
+        Arguments:
+        fname   -- path to the file
+        fetched -- True if the file was (tried to be) downloaded in this run,
+                   False if it was already up to date
+        """
+
+        if fetched:
+            start_time = time.time()
+            self.slots.acquire()
+            self.blocked_time += time.time() - start_time
+
+        if self.cancelled:
+            raise RuntimeError("The conversion stopped, downloads cancelled.")
+
+        self.files.put( (fname, fetched) )
+
+#------------------------------------------------------------------------------#
+## Mark the end of the downloads
+    def close(self):
+        """Tell the converter that no more files will be handed over"""
+
+        self.files.put(None)
+
+#------------------------------------------------------------------------------#
+## Stop the downloads
+    def cancel(self):
+        """Unblock the downloader and make it stop at the next file, when the
+        converter fails"""
+
+        self.cancelled = True
+        for _ in range(self.maxsize):
+            self.slots.release()
+
+#------------------------------------------------------------------------------#
+## Take a batch of files
+    def take(self, batch_size):
+        """Wait for the next batch of files
+
+        Arguments:
+        batch_size -- number of files of a batch
+
+        Returns:
+        batch    -- list of (fname, fetched), with batch_size items unless
+                    the downloads are over
+        finished -- True if the downloads are over
+        """
+
+        # the fetched files of a batch must all fit in the queue
+        batch_size = min(batch_size, self.maxsize)
+
+        batch = []
+        start_time = time.time()
+        while len(batch) < batch_size:
+            item = self.files.get()
+            if item is None:
+                self.idle_time += time.time() - start_time
+                return batch, True
+            batch.append(item)
+        self.idle_time += time.time() - start_time
+
+        return batch, False
+
+#------------------------------------------------------------------------------#
+## Release the slots of a converted batch
+    def release(self, batch):
+        """Free the slots of the fetched files of a converted batch"""
+
+        for _, fetched in batch:
+            if fetched:
+                self.slots.release()
+
+#------------------------------------------------------------------------------#
+## Download and convert databases
+def argo_pipeline(gdac_path, outdir_nc, db_names, outdir_parquet, schema_path, incremental=False, download_mode=None, nproc=None, dac_url_root=None, batch_size=None, queue_size=None, converter_kwargs=None, n_workers=None, threads_per_worker=None, memory_limit=None, compact_schema=False, summaries=False, normalized=False):
+    """Download and convert the databases one after the other, each with
+    its download and conversion overlapped (see pipeline_database); each
+    database is written to its own folder <outdir_parquet>/<db_name>/
+
+    Arguments:
+    gdac_path        -- folder of the GDAC index files
+    outdir_nc        -- root folder of the profile files
+    db_names         -- list of databases, 'phy' and/or 'bgc'
+    outdir_parquet   -- folder of the parquet databases
+    schema_path      -- folder of the schema files
+    incremental      -- if True, convert only the files changed since the
+                        previous conversion
+    download_mode    -- 'process' (default) or 'async' (see argo_gdac)
+    nproc            -- processes or concurrent downloads (default: 36 for
+                        'process', 64 for 'async')
+    dac_url_root     -- root URL of the dac/ folder of the GDAC
+    batch_size       -- files converted at a time (default: BATCH_SIZE)
+    queue_size       -- files downloaded and not yet converted before the
+                        downloader blocks (default: QUEUE_SIZE)
+    converter_kwargs -- further arguments to daskTools
+    n_workers, threads_per_worker, memory_limit -- see argo_resources.plan_resources
+    compact_schema   -- if True, convert to the compact schema (see
+                        generateSchema)
+    summaries        -- if True, update the gridded summaries of the
+                        databases (see argo_summary)
+    normalized       -- if True, update the normalized profile and levels
+                        tables of the databases (see argo_normalize)
+
+    Returns:
+    flists   -- list of paths to the files of each database
+    metadata -- GDAC index subset of each database
+    """
+
+    if download_mode is None:
+        download_mode = "process"
+    if nproc is None:
+        nproc = 64 if download_mode == "async" else 36
+    if converter_kwargs is None:
+        converter_kwargs = {}
+
+    flists = []
+    metadata = []
+    for db_name in db_names:
+        start_time = time.time()
+        flist, db_metadata = pipeline_database(
+            gdac_path, outdir_nc, db_name, outdir_parquet + db_name + "/", schema_path, incremental, download_mode, nproc, dac_url_root,
+            batch_size, queue_size, converter_kwargs, n_workers, threads_per_worker, memory_limit, compact_schema, summaries, normalized
+        )
+        flists.append(flist)
+        metadata.append(db_metadata)
+        print("Time to download and convert " + db_name + " database: " + str(time.time() - start_time))
+
+    return flists, metadata
+
+#------------------------------------------------------------------------------#
+## Download and convert a database
+def pipeline_database(gdac_path, outdir_nc, db_name, outdir_parquet, schema_path, incremental, download_mode, nproc, dac_url_root, batch_size, queue_size, converter_kwargs, n_workers=None, threads_per_worker=None, memory_limit=None, compact_schema=False, summaries=False, normalized=False):
+    """Download a database in a background thread and convert its files in
+    batches as they are handed over through a fileQueue; the batches are
+    appended to the parquet database, and the manifests are stored at the end
+
+    Arguments:
+    outdir_parquet -- folder of the parquet database
+    (other arguments as in argo_pipeline)
+
+    Returns:
+    flist    -- list of paths to the files of the database
+    metadata -- GDAC index subset of the database
+    """
+
+    if batch_size is None:
+        batch_size = BATCH_SIZE
+
+    # the list of files comes from the (cached) index, before any download
+    _, metadata, flist = at.argo_gdac(
+        gdac_path=gdac_path, dataset=db_name, save_to=outdir_nc, skip_downloads=False, dryrun=True,
+        overwrite_profiles=True, verbose=False, checktime=True, dac_url_root=dac_url_root
+    )
+
+    daskConverter = setup_database(db_name, flist, outdir_parquet, schema_path, converter_kwargs, compact_schema)
+
+    # the cluster is sized on the files already on disk, or on a large file
+    # when none has been downloaded yet
+    expansion, largest = ar.expansion_factor(flist, daskConverter.memory_footprint)
+    if largest == 0:
+        expansion, largest = ar.EXPANSION_DEFAULT, ar.LARGEST_DEFAULT
+        print("No files of the " + db_name + " database on disk yet, sizing the cluster for files of " + format_bytes(largest) + ".")
+    nw, tw, memlim = ar.plan_resources(
+        expansion,
+        largest,
+        engine = daskConverter.engine,
+        n_workers = n_workers,
+        threads_per_worker = threads_per_worker,
+        memory_limit = memory_limit,
+    )
+    print("Cores: " + str(ar.available_cores()) + ", memory: " + format_bytes(ar.available_memory()) + ", in-memory expansion of the files: " + "{:.1f}".format(expansion) + ", largest file: " + format_bytes(largest))
+    print("(nw, tw, memlim)")
+    print( (nw, tw, memlim) )
+
+    client = Client(
+        n_workers=nw,
+        threads_per_worker=tw,
+        processes=True,
+        memory_limit=memlim,
+    )
+
+    manifest_fname = am.manifest_fname(outdir_parquet, db_name)
+    status_fname = am.status_fname(outdir_parquet, db_name)
+    previous = None
+    previous_status = None
+    if incremental:
+        previous = am.load_manifest(manifest_fname)
+        previous_status = am.load_manifest(status_fname)
+        if previous is None:
+            print("No conversion manifest found at " + manifest_fname + ", converting the whole database.")
+
+    if previous is None:
+        # the first batch overwrites the database, the next ones are appended
+        append = False
+    else:
+        # floats no longer in the index
+        gone = ~previous["file"].isin(flist)
+        touched = am.drop_floats(outdir_parquet, daskConverter.db_type, sorted(set(int(w) for w in previous.loc[gone, "wmoid"])), daskConverter.write_profile)
+        if len(touched) > 0:
+            am.write_metadata_file(outdir_parquet, daskConverter.db_type, daskConverter.schema)
+        append = True
+
+    files = fileQueue(queue_size)
+    errors = []
+
+    def download():
+        try:
+            at.argo_gdac(
+                gdac_path=gdac_path, dataset=db_name, save_to=outdir_nc, skip_downloads=False, dryrun=False,
+                overwrite_profiles=True, NPROC=nproc, verbose=False, checktime=True, dac_url_root=dac_url_root,
+                download_mode=download_mode, on_file=files.put
+            )
+        except Exception as e:
+            errors.append(e)
+        finally:
+            files.close()
+
+    downloader = threading.Thread(target=download, daemon=True)
+    downloader.start()
+
+    latest = metadata.groupby("wmoid")["date_update"].max().reset_index() if len(metadata) > 0 else None
+    run_tag = datetime.now().strftime("%Y%m%d%H%M%S")
+    manifests = []
+    status = []
+    nconverted = 0
+    finished = False
+    k = 0
+    try:
+        while not finished:
+            batch, finished = files.take(batch_size)
+            if len(batch) == 0:
+                continue
+
+            batch_flist = [fname for fname, _ in batch]
+            batch_manifest = am.build_manifest(batch_flist, latest)
+            manifests.append(batch_manifest)
+
+            if previous is None:
+                flist_changed = batch_flist
+                wmoids_removed = []
+            else:
+                flist_changed, wmoids_removed = am.changed_files(batch_manifest, previous.loc[ previous["file"].isin(batch_flist) ])
+
+            touched = am.drop_floats(outdir_parquet, daskConverter.db_type, wmoids_removed, daskConverter.write_profile)
+            if len(touched) > 0:
+                am.write_metadata_file(outdir_parquet, daskConverter.db_type, daskConverter.schema)
+
+            if len(flist_changed) > 0:
+                print("Batch " + str(k) + ": converting " + str(len(flist_changed)) + " of " + str(len(batch)) + " files.")
+                daskConverter.convert_to_parquet(flist=flist_changed, append=append, name_tag=run_tag + "b" + str(k))
+                append = True
+                status += daskConverter.status
+                nconverted += len(flist_changed)
+
+            files.release(batch)
+            k += 1
+    except BaseException:
+        files.cancel()
+        raise
+    finally:
+        downloader.join()
+        client.shutdown()
+
+    if len(errors) > 0:
+        raise errors[0]
+
+    print(str(nconverted) + " of " + str(len(flist)) + " files converted in " + str(k) + " batches; the downloader waited " + "{:.1f}".format(files.blocked_time) + " s for the converter, the converter waited " + "{:.1f}".format(files.idle_time) + " s for the downloader.")
+
+    store_metadata(db_name, metadata, outdir_parquet)
+
+    daskConverter.status = status
+    status = am.merge_status(previous_status if previous is not None else None, daskConverter.status_table(), flist)
+    am.save_status(status, status_fname)
+    daskConverter.failed_files()
+
+    # failed files are left out of the manifest, so that the next
+    # incremental conversion tries them again
+    manifest = pd.concat(manifests, ignore_index=True) if len(manifests) > 0 else am.build_manifest([], None)
+    manifest = manifest.loc[ ~manifest["file"].isin(am.failed_status_files(status)) ]
+    am.save_manifest(manifest, manifest_fname)
+
+    ac.update_catalog(outdir_parquet, daskConverter.db_type)
+    ab.update_index(outdir_parquet, daskConverter.db_type)
+    if summaries:
+        asm.update_summary(outdir_parquet, daskConverter.db_type)
+    if normalized:
+        an.update_normalized(outdir_parquet, daskConverter.db_type, daskConverter.write_profile)
+
+    daskConverter.pruning_report()
+    daskConverter.padding_report()
+
+    return flist, metadata
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+## @file argo_resources.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Sizing of the dask cluster used for the conversion from the resources of
+# the host (honouring the limits of the cgroup the job runs in, as set by
+# SLURM or docker) and from the memory that the files take once read, so
+# that the same job runs on a laptop and on a large node without editing
+# the number of workers and their memory limit
+
+import os
+import numpy as np
+import psutil
+from dask.utils import format_bytes, parse_bytes
+##########################################################################
+
+# fraction of the available memory given to the workers, the rest is left
+# to the scheduler, the main process and the page cache
+MEMORY_FRACTION = 0.85
+
+# copies of a file that a task holds at the same time while converting it
+# (the file read, the concatenated partition and the buffers of the writer)
+MEMORY_SAFETY = 3
+
+# size of the partitions of the "dask" engine (see daskTools.convert_to_parquet)
+PARTITION_SIZE = parse_bytes("300MB")
+
+# least memory of a task, also used when there are no files on disk to size it
+# (an empty list, or a mirror not yet downloaded)
+TASK_MEMORY_MIN = parse_bytes("100MB")
+
+# largest file and in-memory expansion assumed when there are no files on disk
+# to sample, e.g. before downloading a new mirror (BGC Sprof files take up to
+# a few hundred MB)
+LARGEST_DEFAULT = parse_bytes("200MB")
+EXPANSION_DEFAULT = 10
+
+#------------------------------------------------------------------------------#
+## Read a cgroup file
+def _read_cgroup(path):
+    """Content of a cgroup file, or None if it does not exist"""
+
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+#------------------------------------------------------------------------------#
+## Cores available to the process
+def available_cores(cgroup_root="/sys/fs/cgroup"):
+    """Number of cores the process can use: the CPUs it is pinned to, further
+    limited by the CPU quota of its cgroup (v2 cpu.max or v1 cfs quota)
+
+    Arguments:
+    cgroup_root -- mount point of the cgroup file system
+    """
+
+    try:
+        ncores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        ncores = os.cpu_count()
+
+    quota = None
+    cpu_max = _read_cgroup(os.path.join(cgroup_root, "cpu.max"))
+    if cpu_max is not None:
+        q, period = cpu_max.split()
+        if q != "max":
+            quota = int(q)/int(period)
+    else:
+        q = _read_cgroup(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us"))
+        period = _read_cgroup(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us"))
+        if q is not None and period is not None and int(q) > 0:
+            quota = int(q)/int(period)
+
+    if quota is not None:
+        ncores = min(ncores, max(int(quota), 1))
+
+    return ncores
+
+#------------------------------------------------------------------------------#
+## Memory available to the process
+def available_memory(cgroup_root="/sys/fs/cgroup"):
+    """Memory in bytes the process can use: the available memory of the host,
+    further limited by the memory limit of its cgroup (v2 memory.max or v1
+    memory.limit_in_bytes) minus what the cgroup already uses
+
+    Arguments:
+    cgroup_root -- mount point of the cgroup file system
+    """
+
+    memory = psutil.virtual_memory().available
+
+    for limit_file, usage_file in [("memory.max", "memory.current"), ("memory/memory.limit_in_bytes", "memory/memory.usage_in_bytes")]:
+        limit = _read_cgroup(os.path.join(cgroup_root, limit_file))
+        if limit is None:
+            continue
+        if limit != "max" and int(limit) < psutil.virtual_memory().total:
+            usage = _read_cgroup(os.path.join(cgroup_root, usage_file))
+            usage = 0 if usage is None else int(usage)
+            memory = min(memory, int(limit) - usage)
+        break
+
+    return max(memory, 0)
+
+#------------------------------------------------------------------------------#
+## In-memory expansion of the files
+def expansion_factor(flist, footprint, nsample=None):
+    """Ratio between the memory that files take once read and their size on
+    disk, sampled on a few files spread over the size range, the largest
+    included
+
+    Arguments:
+    flist     -- list of paths to the files to convert
+    footprint -- function returning the memory in bytes that a file takes
+                 once read (e.g. daskTools.memory_footprint)
+    nsample   -- number of files sampled (default: 5)
+
+    Returns:
+    expansion -- largest ratio among the sampled files (1 if none could be
+                 read)
+    largest   -- size in bytes of the largest file
+    """
+
+    if nsample is None:
+        nsample = 5
+
+    sizes = np.array([ os.path.getsize(f) if os.path.isfile(f) else 0 for f in flist ], dtype=np.int64)
+    if len(sizes) == 0 or sizes.max() == 0:
+        return 1.0, 0
+
+    order = np.argsort(sizes)
+    order = order[ sizes[order] > 0 ]
+    sample = order[ np.unique( np.linspace(0, len(order) - 1, min(nsample, len(order))).round().astype(int) ) ]
+
+    ratios = []
+    for k in sample:
+        try:
+            ratios.append( footprint(flist[k])/sizes[k] )
+        except Exception as e:
+            print("Could not sample " + str(flist[k]) + ": " + str(e))
+
+    expansion = max(ratios) if len(ratios) > 0 else 1.0
+
+    return max(expansion, 1.0), int(sizes.max())
+
+#------------------------------------------------------------------------------#
+## Memory needed by a task
+def task_memory(expansion, largest, engine="dask"):
+    """Memory in bytes that a conversion task may need: MEMORY_SAFETY copies of
+    the largest file expanded in memory, or of a partition for the "dask"
+    engine if larger, and at least TASK_MEMORY_MIN
+
+    Arguments:
+    expansion -- in-memory expansion factor (see expansion_factor)
+    largest   -- size in bytes of the largest file
+    engine    -- "dask" or "stream"
+    """
+
+    memory = largest*expansion
+    if engine == "dask":
+        memory = max(memory, PARTITION_SIZE)
+
+    return max(memory*MEMORY_SAFETY, TASK_MEMORY_MIN)
+
+#------------------------------------------------------------------------------#
+## Choose workers, threads and memory limit
+def plan_resources(expansion, largest, engine="dask", ncores=None, memory=None, n_workers=None, threads_per_worker=None, memory_limit=None):
+    """Choose the size of the dask cluster: each worker runs one task at a
+    time per thread, and each task must fit the largest file expanded in
+    memory, so the memory sets how many workers can run and the cores cap it
+
+    Arguments:
+    expansion          -- in-memory expansion factor (see expansion_factor)
+    largest            -- size in bytes of the largest file
+    engine             -- "dask" or "stream": the "dask" engine also holds
+                          partitions of PARTITION_SIZE
+    ncores             -- cores available (default: available_cores())
+    memory             -- memory in bytes available (default:
+                          available_memory())
+    n_workers          -- number of workers, overrides the planned one
+    threads_per_worker -- threads per worker, overrides the planned one (1:
+                          reading and flattening the files holds the GIL)
+    memory_limit       -- memory limit per worker (bytes or string such as
+                          "5.5GB"), overrides the planned one
+
+    Returns:
+    n_workers          -- number of workers
+    threads_per_worker -- threads per worker
+    memory_limit       -- memory limit per worker, as a string for
+                          dask.distributed.Client
+    """
+
+    if ncores is None:
+        ncores = available_cores()
+    if memory is None:
+        memory = available_memory()
+    memory = memory*MEMORY_FRACTION
+
+    memory_task = task_memory(expansion, largest, engine)
+
+    if threads_per_worker is None:
+        threads_per_worker = 1
+
+    if n_workers is None:
+        if memory_limit is not None:
+            n_workers = int( memory // parse_bytes(str(memory_limit)) )
+        else:
+            n_workers = int( memory // (memory_task*threads_per_worker) )
+        n_workers = max( min(n_workers, ncores // threads_per_worker), 1 )
+        if memory < memory_task*threads_per_worker:
+            print("Warning: the largest file may need " + format_bytes(memory_task) + " to be converted, more than the " + format_bytes(memory) + " available.")
+
+    if memory_limit is None:
+        memory_limit = format_bytes( int(memory // n_workers) )
+    elif not isinstance(memory_limit, str):
+        memory_limit = format_bytes( int(memory_limit) )
+
+    return n_workers, threads_per_worker, memory_limit
+
+#------------------------------------------------------------------------------#
+## Choose a cluster shared by several databases
+def plan_shared_resources(memory_tasks, ncores=None, memory=None, n_workers=None, threads_per_worker=None, memory_limit=None):
+    """Choose the size of a dask cluster that converts several databases at
+    the same time: each worker has a few threads and a MEMORY resource equal
+    to its memory limit (in MiB), and the tasks of each database take as much
+    MEMORY as they may need, so that a worker runs either one memory-heavy
+    BGC task or several light PHY tasks at a time
+
+    Arguments:
+    memory_tasks       -- dict with the memory in bytes needed by a task of
+                          each database (see task_memory)
+    ncores             -- cores available (default: available_cores())
+    memory             -- memory in bytes available (default:
+                          available_memory())
+    n_workers          -- number of workers (default: ncores over
+                          threads_per_worker)
+    threads_per_worker -- threads per worker (default: 4, or ncores if fewer)
+    memory_limit       -- memory limit per worker (bytes or string such as
+                          "5.5GB"; default: available memory split among the
+                          workers)
+
+    Returns:
+    n_workers          -- number of workers
+    threads_per_worker -- threads per worker
+    memory_limit       -- memory limit per worker, as a string
+    worker_resources   -- resources of each worker
+    task_resources     -- dict with the resources of a task of each database
+    """
+
+    if ncores is None:
+        ncores = available_cores()
+    if memory is None:
+        memory = available_memory()
+    memory = memory*MEMORY_FRACTION
+
+    if threads_per_worker is None:
+        threads_per_worker = max( min(4, ncores), 1 )
+    if n_workers is None:
+        n_workers = max( ncores // threads_per_worker, 1 )
+    if memory_limit is None:
+        memory_limit = int(memory // n_workers)
+    else:
+        memory_limit = parse_bytes(str(memory_limit))
+
+    worker_memory = max( int(memory_limit // 2**20), 1 )
+    worker_resources = {"MEMORY": worker_memory}
+
+    task_resources = {}
+    for db_name, memory_task in memory_tasks.items():
+        need = int(np.ceil(memory_task/2**20))
+        if need > worker_memory:
+            print("Warning: a " + db_name + " task may need " + format_bytes(memory_task) + ", more than the " + format_bytes(memory_limit) + " of a worker.")
+        # a task that needs more than a worker has must still be schedulable
+        task_resources[db_name] = {"MEMORY": max( min(need, worker_memory), 1 )}
+
+    return n_workers, threads_per_worker, format_bytes(memory_limit), worker_resources, task_resources
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+## @file argo_state.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Tue 12 Nov 2024
+
+##########################################################################
+#
+# Download state of the local mirror: for each float, the latest date_update
+# of its profiles in the GDAC index when its profile file was last downloaded
+# (or found up to date). Comparing it with the latest date_update in the
+# current index tells which floats changed without any request to the GDAC.
+
+import os
+from pathlib import Path
+from dateutil import tz
+import numpy as np
+import pandas as pd
+##########################################################################
+
+#------------------------------------------------------------------------------#
+## Path to the download state of a dataset
+def state_fname(gdac_path, dataset):
+    """Path to the download state of a dataset
+
+    Arguments:
+    gdac_path -- folder of the GDAC index files
+    dataset   -- 'phy' or 'bgc'
+    """
+
+    return os.path.join(gdac_path, "Argo" + dataset.upper() + "_download_state.parquet")
+
+#------------------------------------------------------------------------------#
+## Latest update of each float in the index
+def latest_updates(gdac_index_subset):
+    """Latest date_update of the profiles of each float, in one groupby
+
+    Returns:
+    latest -- series of date_update indexed by filepath_main
+    """
+
+    return gdac_index_subset.groupby("filepath_main")["date_update"].max()
+
+#------------------------------------------------------------------------------#
+## Local files newer than the latest updates
+def newer_than_index(local_fnames, latest):
+    """Compare the modification times of the local files with the latest
+    updates of their floats in the index, with one os.stat per file and a
+    vectorized comparison
+
+    Arguments:
+    local_fnames -- list of paths to the local *_prof/*_Sprof files
+    latest       -- array-like of the latest date_update of each file's float
+
+    Returns:
+    exists -- boolean array, True where the local file exists
+    newer  -- boolean array, True where the local file exists and was modified
+              after the latest update of its float
+    """
+
+    mtimes = np.full(len(local_fnames), np.nan)
+    for k, fname in enumerate(local_fnames):
+        try:
+            mtimes[k] = os.stat(fname).st_mtime
+        except OSError:
+            pass
+    exists = ~np.isnan(mtimes)
+
+    # index dates are naive, compared with the local time of the files as
+    # datetime.fromtimestamp() does
+    local_mtimes = pd.to_datetime(mtimes, unit="s", utc=True).tz_convert(tz.tzlocal()).tz_localize(None)
+    newer = exists & np.asarray(pd.Series(latest).to_numpy() < local_mtimes.to_numpy())
+
+    return exists, newer
+
+#------------------------------------------------------------------------------#
+## Read download state
+def load_state(fname):
+    """Read a download state, returns None if not present
+
+    Returns:
+    state -- series of date_update indexed by filepath_main
+    """
+
+    if not os.path.isfile(fname):
+        return None
+
+    return pd.read_parquet(fname).set_index("filepath_main")["date_update"]
+
+#------------------------------------------------------------------------------#
+## Store download state
+def save_state(state, fname):
+    """Store a download state"""
+
+    Path(fname).parent.mkdir(parents = True, exist_ok = True)
+    state.rename("date_update").rename_axis("filepath_main").reset_index().to_parquet(fname, index=False)
+    print("Download state stored to " + str(fname) + ".")
+
+#------------------------------------------------------------------------------#
+## Floats unchanged since the last download
+def up_to_date(latest, state):
+    """Compare the latest updates in the index with the download state
+
+    Arguments:
+    latest -- series of date_update indexed by filepath_main (latest_updates())
+    state  -- download state (load_state()), or None
+
+    Returns:
+    unchanged -- boolean series indexed as latest, True for the floats whose
+                 profiles were not updated since their file was downloaded
+    known     -- boolean series indexed as latest, True for the floats present
+                 in the download state
+    """
+
+    if state is None:
+        false = pd.Series(False, index=latest.index)
+        return false, false
+
+    previous = state.reindex(latest.index)
+    known = previous.notna()
+    unchanged = known & (latest <= previous)
+
+    return unchanged, known
+
+#------------------------------------------------------------------------------#
+## Update download state
+def update_state(state, latest, synced):
+    """Record the floats whose local file is now in sync with the index
+
+    Arguments:
+    state  -- previous download state, or None
+    latest -- series of date_update indexed by filepath_main
+    synced -- list of filepath_main of the floats downloaded or found up to
+              date; the floats that failed keep their previous state, so that
+              they are downloaded again at the next sync
+
+    Returns:
+    state -- updated download state
+    """
+
+    synced = latest.loc[synced]
+    if state is None or len(state) == 0:
+        return synced.sort_index()
+
+    state = state.loc[ ~state.index.isin(synced.index) ]
+    return pd.concat([s for s in [state, synced] if len(s) > 0] or [synced]).sort_index()
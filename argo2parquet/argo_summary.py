@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+## @file argo_summary.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Gridded summaries of a parquet database: count, sum, sum of squares, min and
+# max of each <PARAM>_ADJUSTED variable per latitude/longitude cell, month and
+# pressure bin. The statistics are mergeable: a partial summary is computed
+# for each fragment and stored with its mtime, incremental runs only summarize
+# the new and rewritten fragments, and the partials are merged into the
+# summary of the database. Means and standard deviations of any coarser
+# grouping are derived from the merged sums (see merge_summaries and
+# summary_stats).
+
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import argo2parquet.argo_manifest as am
+from argo2parquet.params import params
+##########################################################################
+
+# keys of the summary grid: lower edges of the cells, of the pressure bins, and
+# first day of the month
+SUMMARY_KEYS = ["lat_cell", "lon_cell", "month", "pres_bin"]
+
+# statistics of each variable, and how they merge
+SUMMARY_STATS = {"count": "sum", "sum": "sum", "sumsq": "sum", "min": "min", "max": "max"}
+
+#------------------------------------------------------------------------------#
+## Paths to the summaries of a database
+def summary_fname(out_dir, db_type, partials=False):
+    """Path to the summary of a database, or to its per-fragment partials
+
+    Arguments:
+    out_dir  -- folder of the parquet database
+    db_type  -- 'PHY' or 'BGC'
+    partials -- if True, path to the partial summaries of the fragments
+    """
+
+    suffix = "_summary_partials.parquet" if partials else "_summary.parquet"
+
+    return os.path.join(out_dir, "metadata", "Argo" + db_type.upper() + suffix)
+
+#------------------------------------------------------------------------------#
+## Grid of the summaries
+def summary_grid(cell=None, pres_bins=None):
+    """Grid of the summaries, from params.params["summary_grid"] unless
+    given
+
+    Arguments:
+    cell      -- size in degrees of the latitude/longitude cells
+    pres_bins -- increasing lower edges in dbar of the pressure bins
+
+    Returns:
+    grid -- dict with cell and pres_bins
+    """
+
+    grid = dict(params["summary_grid"])
+    if cell is not None:
+        grid["cell"] = cell
+    if pres_bins is not None:
+        grid["pres_bins"] = pres_bins
+
+    grid["cell"] = float(grid["cell"])
+    grid["pres_bins"] = [float(p) for p in grid["pres_bins"]]
+    if grid["cell"] <= 0 or 180 % grid["cell"] != 0:
+        raise ValueError("cell must divide 180 degrees.")
+    if len(grid["pres_bins"]) == 0 or np.any(np.diff(grid["pres_bins"]) <= 0):
+        raise ValueError("pres_bins must be increasing.")
+
+    return grid
+
+#------------------------------------------------------------------------------#
+## Summarized variables
+def summary_vars(schema):
+    """The <PARAM>_ADJUSTED variables of a schema"""
+
+    return [name for name in schema.names if name.endswith("_ADJUSTED")]
+
+#------------------------------------------------------------------------------#
+## Summary of a table
+def summarize_table(table, variables, grid):
+    """Gridded statistics of the variables of a table; the rows without
+    position, time or PRES_ADJUSTED are left out
+
+    Arguments:
+    table     -- pyarrow table with LATITUDE, LONGITUDE, JULD, PRES_ADJUSTED
+                 and the variables
+    variables -- list of columns to summarize
+    grid      -- dict with cell and pres_bins (see summary_grid)
+
+    Returns:
+    summary -- dataframe with SUMMARY_KEYS and <var>_<stat> for each variable
+               and statistic of SUMMARY_STATS
+    """
+
+    df = table.select(list(dict.fromkeys(["LATITUDE", "LONGITUDE", "JULD", "PRES_ADJUSTED"] + variables))).to_pandas()
+    df = df.dropna(subset=["LATITUDE", "LONGITUDE", "JULD", "PRES_ADJUSTED"])
+
+    cell = grid["cell"]
+    pres_bins = np.asarray(grid["pres_bins"])
+    longitude = (df["LONGITUDE"].to_numpy(dtype=np.float64) + 180) % 360 - 180
+    pres_index = np.searchsorted(pres_bins, df["PRES_ADJUSTED"].to_numpy(dtype=np.float64), side="right") - 1
+
+    data = {
+        "lat_cell": np.minimum(np.floor(df["LATITUDE"].to_numpy(dtype=np.float64)/cell)*cell, 90 - cell),
+        "lon_cell": np.floor(longitude/cell)*cell,
+        "month": df["JULD"].to_numpy().astype("datetime64[M]").astype("datetime64[ns]"),
+        "pres_bin": pres_bins[np.clip(pres_index, 0, len(pres_bins) - 1)],
+    }
+    aggregations = {}
+    for name in variables:
+        values = df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+        data[name] = values
+        data[name + "_sq"] = values**2
+        aggregations[name + "_count"] = (name, "count")
+        aggregations[name + "_sum"] = (name, "sum")
+        aggregations[name + "_sumsq"] = (name + "_sq", "sum")
+        aggregations[name + "_min"] = (name, "min")
+        aggregations[name + "_max"] = (name, "max")
+
+    summary = pd.DataFrame(data).groupby(SUMMARY_KEYS, sort=False).agg(**aggregations).reset_index()
+
+    # cells where none of the variables was measured
+    counts = summary[[name + "_count" for name in variables]].sum(axis=1)
+
+    return summary.loc[ counts > 0 ].reset_index(drop=True)
+
+#------------------------------------------------------------------------------#
+## Merge summaries
+def merge_summaries(summaries, by=None):
+    """Merge summaries of the same grid, e.g. the partials of the fragments,
+    or roll a summary up to coarser groups
+
+    Arguments:
+    summaries -- list of summary dataframes (see summarize_table)
+    by        -- columns to group by (default: SUMMARY_KEYS); the other
+                 keys are merged, e.g. by=["lat_cell", "lon_cell"] for a map
+
+    Returns:
+    summary -- merged summary dataframe
+    """
+
+    if by is None:
+        by = SUMMARY_KEYS
+
+    if len(summaries) == 0:
+        return pd.DataFrame(columns=by)
+
+    # empty summaries only give their columns
+    df = pd.concat([s for s in summaries if len(s) > 0] or summaries[:1], ignore_index=True)
+    aggregations = {}
+    for column in df.columns:
+        stat = column.rsplit("_", 1)[-1]
+        if column not in SUMMARY_KEYS and stat in SUMMARY_STATS:
+            aggregations[column] = SUMMARY_STATS[stat]
+
+    # summaries without variables only give their cells
+    if len(aggregations) == 0:
+        return df[by].dropna().drop_duplicates().sort_values(by).reset_index(drop=True)
+
+    summary = df.groupby(by, sort=True).agg(aggregations).reset_index()
+    for column in aggregations:
+        if column.endswith("_count"):
+            summary[column] = summary[column].astype("int64")
+
+    return summary
+
+#------------------------------------------------------------------------------#
+## Means and standard deviations of a summary
+def summary_stats(summary, variables=None):
+    """Add the mean and standard deviation of variables to a summary
+
+    Arguments:
+    summary   -- summary dataframe (see merge_summaries)
+    variables -- list of variables (default: all the variables of summary)
+
+    Returns:
+    summary -- copy of summary with <var>_mean and <var>_std
+    """
+
+    if variables is None:
+        variables = [c[:-len("_count")] for c in summary.columns if c.endswith("_count")]
+
+    summary = summary.copy()
+    for name in variables:
+        count = summary[name + "_count"].where(summary[name + "_count"] > 0)
+        mean = summary[name + "_sum"]/count
+        summary[name + "_mean"] = mean
+        summary[name + "_std"] = np.sqrt(np.maximum(summary[name + "_sumsq"]/count - mean**2, 0))
+
+    return summary
+
+#------------------------------------------------------------------------------#
+## Partial summary of a fragment
+def summarize_fragment(out_dir, fragment, grid):
+    """Partial summary of a parquet fragment, merged over its row groups
+
+    Arguments:
+    out_dir  -- folder of the parquet database
+    fragment -- path to the fragment
+    grid     -- dict with cell and pres_bins (see summary_grid)
+
+    Returns:
+    summary -- summary dataframe, with the fragment (path relative to
+               out_dir) and its mtime
+    """
+
+    pqfile = pq.ParquetFile(fragment)
+    variables = summary_vars(pqfile.schema_arrow)
+    columns = list(dict.fromkeys(["LATITUDE", "LONGITUDE", "JULD", "PRES_ADJUSTED"] + variables))
+
+    partials = []
+    for row_group in range(pqfile.metadata.num_row_groups):
+        partials.append( summarize_table(pqfile.read_row_group(row_group, columns=columns), variables, grid) )
+    pqfile.close()
+
+    summary = merge_summaries(partials)
+    # a fragment without any value to summarize (e.g. only real-time floats,
+    # whose adjusted values are null) keeps a row without cell, so that it is
+    # not read again; merge_summaries drops it
+    if len(summary) == 0:
+        summary = summary.reindex([0])
+    summary.insert(0, "fragment", os.path.relpath(fragment, out_dir))
+    summary.insert(1, "mtime", os.path.getmtime(fragment))
+
+    return summary
+
+#------------------------------------------------------------------------------#
+## Build the partial summaries of a database
+def build_partials(out_dir, db_type, grid, previous=None):
+    """Partial summaries of the fragments of a database; the partials of
+    previous are kept for the fragments that did not change since they were
+    summarized, if previous has the same grid
+
+    Arguments:
+    out_dir  -- folder of the parquet database
+    db_type  -- 'PHY' or 'BGC'
+    grid     -- dict with cell and pres_bins (see summary_grid)
+    previous -- previous partials of the database (default: None)
+
+    Returns:
+    partials    -- dataframe with the partial summaries of all the fragments
+    nsummarized -- number of fragments read
+    """
+
+    unchanged = {}
+    if previous is not None and previous.attrs.get("grid") == grid and len(previous) > 0:
+        unchanged = previous.groupby("fragment")["mtime"].first().to_dict()
+
+    parts = []
+    reused = []
+    nsummarized = 0
+    for fragment in am.list_fragments(out_dir, db_type):
+        fname = os.path.relpath(fragment, out_dir)
+        if unchanged.get(fname) == os.path.getmtime(fragment):
+            reused.append(fname)
+        else:
+            parts.append( summarize_fragment(out_dir, fragment, grid) )
+            nsummarized += 1
+
+    # the partials of the unchanged fragments are selected at once
+    if len(reused) > 0:
+        parts.append( previous.loc[ previous["fragment"].isin(reused) ] )
+
+    parts = [p for p in parts if len(p) > 0]
+    partials = pd.concat(parts, ignore_index=True) if len(parts) > 0 else pd.DataFrame(columns=["fragment", "mtime"] + SUMMARY_KEYS)
+    partials.attrs["grid"] = grid
+
+    return partials, nsummarized
+
+#------------------------------------------------------------------------------#
+## Load a summary
+def load_summary(out_dir, db_type, partials=False):
+    """Read the stored summary of a database, or its partials; returns None
+    if not present
+
+    Returns:
+    summary -- summary dataframe, with its grid in summary.attrs["grid"]
+    """
+
+    fname = summary_fname(out_dir, db_type, partials)
+    if not os.path.isfile(fname):
+        return None
+
+    table = pq.read_table(fname)
+    summary = table.to_pandas()
+    summary.attrs["grid"] = json.loads(table.schema.metadata[b"summary_grid"])
+
+    return summary
+
+#------------------------------------------------------------------------------#
+## Store a summary
+def save_summary(summary, fname):
+    """Store a summary dataframe and its grid to fname"""
+
+    table = pa.Table.from_pandas(summary, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"summary_grid"] = json.dumps(summary.attrs["grid"]).encode()
+
+    Path(fname).parent.mkdir(parents = True, exist_ok = True)
+    pq.write_table(table.replace_schema_metadata(metadata), fname)
+
+#------------------------------------------------------------------------------#
+## Update and store the summaries of a database
+def update_summary(out_dir, db_type, cell=None, pres_bins=None):
+    """Bring the partial summaries of a database up to date with its
+    fragments (see build_partials), merge them and store both to
+    <out_dir>/metadata/Argo<DB>_summary_partials.parquet and
+    <out_dir>/metadata/Argo<DB>_summary.parquet
+
+    Arguments:
+    out_dir   -- folder of the parquet database
+    db_type   -- 'PHY' or 'BGC'
+    cell, pres_bins -- grid of the summaries (see summary_grid)
+
+    Returns:
+    summary -- the merged summary of the database
+    """
+
+    grid = summary_grid(cell, pres_bins)
+    partials, nsummarized = build_partials(out_dir, db_type, grid, previous=load_summary(out_dir, db_type, partials=True))
+    save_summary(partials, summary_fname(out_dir, db_type, partials=True))
+
+    summary = merge_summaries([partials.drop(columns=["fragment", "mtime"])])
+    summary.attrs["grid"] = grid
+    fname = summary_fname(out_dir, db_type)
+    save_summary(summary, fname)
+    print("Summary of " + str(len(summary)) + " grid cells stored to " + fname + " (" + str(nsummarized) + " fragments summarized).")
+
+    return summary
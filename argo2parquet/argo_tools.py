@@ -13,6 +13,12 @@ import pandas as pd
 from scipy import interpolate
 import xarray as xr
 import multiprocessing
+import json
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.feather as pa_feather
+import argo2parquet.argo_state as argo_state
 
 import sys
 import itertools
@@ -30,10 +36,11 @@ else:
                 yield chunk
 
 root = '.'
+GDAC_FILE_REGEXP = r'^(?P<filepath_main>[a-z]*/[0-9]*/)profiles/(?P<filename>[A-Z]*(?P<wmoid>[0-9]*)_(?P<cycle>[0-9]*)[A-Z]*\.nc)$'
 ##########################################################################
 
 # Function to download and parse GDAC synthetic profile index file
-def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start_date=None,end_date=None,sensors=None,floats=None,overwrite_profiles=False,skip_downloads=True,download_individual_profs=False,save_to=None,verbose=True,dryrun=False,dac_url_root=None,checktime=True, NPROC=1):
+def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start_date=None,end_date=None,sensors=None,floats=None,overwrite_profiles=False,skip_downloads=True,download_individual_profs=False,save_to=None,verbose=True,dryrun=False,dac_url_root=None,checktime=True, NPROC=1, download_mode='process', on_file=None):
     """Downloads GDAC Sprof index file, then selects float profiles based on criteria.
       Either returns information on profiles and floats (if skip_downloads=True) or downloads them (if False).
 
@@ -64,9 +71,23 @@ def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start
           dryrun: If True, returns list of filenames that would be downloaded, without
                   downloading them (note that it requires skip_downloads=False)
           checktime: download files from repository only if they are newer than files
-                    on disk (overwrite flag is neglected if true)
+                    on disk (overwrite flag is neglected if true); for the
+                    *_prof/*_Sprof files, the latest date_update of each float
+                    in the index is compared with the download state stored in
+                    gdac_path (see argo_state.py), and unchanged floats are
+                    skipped without any request to the repository
           dac_url_root: root directory to download/copy data from
-          NPROC: number of processors to use to donwload argo files
+          NPROC: number of processors to use to donwload argo files, or number of
+                 concurrent downloads if download_mode is 'async'
+          download_mode: 'process' to download with a pool of NPROC processes, or
+                         'async' to download with asyncio over a pool of
+                         keep-alive connections (see argo_async.py)
+          on_file: None, or function called with (local_fname, fetched) for
+                   each *_prof/*_Sprof file once it is settled: with
+                   fetched=False right away for the floats unchanged since the
+                   last download, with fetched=True as the download of each
+                   other file completes (or fails); while it blocks, no new
+                   download is started (see argo_pipeline.py)
 
     returns:
           wmoids: array containing the WMO identifiers of the floats of the downloaded profiles
@@ -76,6 +97,9 @@ def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start
 
     print("gdac_path in at:")
     print(gdac_path)
+    if download_mode not in ['process', 'async']:
+        raise ValueError('download_mode must be set to process or async.')
+
     if dataset=="bgc":
         gdac_name = 'argo_synthetic-profile_index.txt'
     elif dataset=="phy":
@@ -95,13 +119,7 @@ def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start
 
   # Load index file into Pandas DataFrame
     gdac_file = gdac_path+gdac_name
-    gdac_index = pd.read_csv(
-        gdac_file,
-        delimiter=',',
-        header=8,
-        parse_dates=['date','date_update'],
-        date_format='%Y%m%d%H%M%S'
-    )
+    gdac_index = load_gdac_index(gdac_file)
 
   # Establish time and space criteria
     if lat_range is None:  lat_range = [-90.0,90.0]
@@ -112,19 +130,6 @@ def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start
     if start_date is None: start_date = datetime(1900,1,1)
     if end_date is None:   end_date = datetime(2200,1,1)
 
-    # file name convention
-    # [institution ('aoml', 'coriolis', etc)] / [wmo_id] / profiles / [real time ('R') or delayed ('D') mode + wmo_id + cycle number + eventual descending profile ('D')] + .nc
-    float_wmoid_regexp = r'[a-z]*/[0-9]*/profiles/[A-Z]*([0-9]*)_[0-9]*[A-Z]*.nc'
-    gdac_index['wmoid'] = gdac_index['file'].str.extract(float_wmoid_regexp).astype(int)
-    filepath_main_regexp = '([a-z]*/[0-9]*/)profiles/[A-Z]*[0-9]*_[0-9]*[A-Z]*.nc'
-    gdac_index['filepath_main'] = gdac_index['file'].str.extract(filepath_main_regexp)
-    filepath_regexp = '([a-z]*/[0-9]*/profiles/)[A-Z]*[0-9]*_[0-9]*[A-Z]*.nc'
-    gdac_index['filepath'] = gdac_index['file'].str.extract(filepath_regexp)
-    filename_regexp = '[a-z]*/[0-9]*/profiles/([A-Z]*[0-9]*_[0-9]*[A-Z]*.nc)'
-    gdac_index['filename'] = gdac_index['file'].str.extract(filename_regexp)
-    cycle_regexp = '[a-z]*/[0-9]*/profiles/[A-Z]*[0-9]*_([0-9]*)[A-Z]*.nc'
-    gdac_index['cycle'] = gdac_index['file'].str.extract(cycle_regexp).astype(int)
-
     # Subset profiles based on time and space criteria
     gdac_index_subset = gdac_index.loc[np.logical_and.reduce([gdac_index['latitude'] >= lat_range[0],
                                                               gdac_index['latitude'] <= lat_range[1],
@@ -175,36 +180,79 @@ def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start
             urls = []
             localpaths = []
             local_fnames = []
-            all_local_fnames = []
             downloaded_paths = []
+            synced_filepaths = []
+            download_filepaths = []
             if dataset=='bgc':
                 prof_ext = '_Sprof.nc'
             elif dataset=='phy':
                 prof_ext = '_prof.nc'
-                
-            for f_idx, wmoid_filepath in enumerate(wmoid_filepaths):
-                filename = str(wmoids[f_idx]) + prof_ext
+
+            filenames = [str(wmoid) + prof_ext for wmoid in wmoids]
+            all_local_fnames = [str(Path(save_to,wmoid_filepath)) + '/' + filename for wmoid_filepath, filename in zip(wmoid_filepaths, filenames)]
+
+            skip = np.zeros(len(wmoid_filepaths), dtype=bool)
+            if checktime:
+                # latest is indexed by filepath_main, sorted as wmoid_filepaths
+                latest = argo_state.latest_updates(gdac_index_subset)
+                download_state_fname = argo_state.state_fname(gdac_path, dataset)
+                download_state = argo_state.load_state(download_state_fname)
+                unchanged, known = argo_state.up_to_date(latest, download_state)
+                # floats not in the download state yet are checked against
+                # the modification time of the local file
+                exists, newer = argo_state.newer_than_index(all_local_fnames, latest)
+                skip = exists & ( unchanged.to_numpy() | (~known.to_numpy() & newer) )
+                synced_filepaths = list( wmoid_filepaths[skip] )
+
+            for f_idx in np.flatnonzero(~skip):
+                wmoid_filepath = wmoid_filepaths[f_idx]
+                filename = filenames[f_idx]
                 localpath = Path(save_to,wmoid_filepath)
                 localpath.mkdir(parents= True, exist_ok= True)
                 localpath = str(localpath) + '/'
-                local_filename = localpath + filename
-                all_local_fnames.append(local_filename)
-                if checktime:
-                    if more_recent(local_filename, wmoids[f_idx], gdac_index_subset):
-                        if verbose:
-                            #print('No profile newer than those already on disk found for WMOID ' + str(wmoids[f_idx]) )
-                            continue
+                local_filename = all_local_fnames[f_idx]
                 downloaded_filenames.append( filename )
                 urls.append( dac_url_root + wmoid_filepath )
                 localpaths.append( localpath )
                 local_fnames.append(local_filename)
+                download_filepaths.append(wmoid_filepath)
+
+            if checktime:
+                print(str(len(synced_filepaths)) + ' floats unchanged since the last download, ' + str(len(download_filepaths)) + ' to download.')
+                # the index already tells which files changed: they are
+                # downloaded without comparing modification times again
+                overwrite_profiles = True
+                checktime_files = False
+            else:
+                checktime_files = checktime
 
             if not dryrun: # it still returns the filename that would be downloaded
 
-                if NPROC == 1:
-                    for url_path, filename, localpath  in zip(urls, downloaded_filenames, localpaths):
-                        args = (url_path,filename,localpath,overwrite_profiles,verbose,checktime,None)
-                        download_file(args)
+                if on_file is not None:
+                    for local_fname, skipped in zip(all_local_fnames, skip):
+                        if skipped:
+                            on_file(local_fname, False)
+
+                if download_mode == 'async':
+                    from argo2parquet.argo_async import download_files_async
+                    print('nb_to_download: ' + str(len(downloaded_filenames)) )
+                    success = download_files_async(
+                        [url_path + filename for url_path, filename in zip(urls, downloaded_filenames)],
+                        local_fnames,
+                        concurrency=NPROC,
+                        overwrite=overwrite_profiles,
+                        checktime=checktime_files,
+                        verbose=verbose,
+                        on_done=None if on_file is None else (lambda local_fname, downloaded: on_file(local_fname, True))
+                    )
+
+                elif NPROC == 1:
+                    success = []
+                    for url_path, filename, localpath, local_fname in zip(urls, downloaded_filenames, localpaths, local_fnames):
+                        args = (url_path,filename,localpath,overwrite_profiles,verbose,checktime_files,None)
+                        success.append( download_file(args) )
+                        if on_file is not None:
+                            on_file(local_fname, True)
 
                 else:
                     nb_to_download = len(downloaded_filenames)
@@ -213,23 +261,50 @@ def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start
                         print('Limiting to 100 processors.')
                         NPROC = 100
                     if NPROC > nb_to_download:
-                        NPROC = nb_to_download
+                        NPROC = max(nb_to_download, 1)
                         print('More processors than files requested, limiting NPROC to number of files.')
 
 
                     print('nb_to_download: ' + str(nb_to_download) )
 
-                    CHUNK_SZ = int(np.ceil(nb_to_download/NPROC))
-                    chunks_fname = list(batched(downloaded_filenames,CHUNK_SZ))
-                    chunks_url = list(batched(urls,CHUNK_SZ))
-                    chunks_saveto = list(batched(localpaths,CHUNK_SZ))
-
-                    args_download = [ (rank, overwrite_profiles, verbose, checktime, chunk_url, chunk_fname, chunk_saveto) for rank, (chunk_url, chunk_fname, chunk_saveto) in enumerate(zip(chunks_url, chunks_fname, chunks_saveto)) ]
+                    success = []
+                    if on_file is not None:
+                        # files are downloaded in windows of a few per process
+                        # and handed over in order as they complete: the next
+                        # window starts once the previous one is handed over,
+                        # so that a blocking on_file stops the downloads
+                        args_download = [ (url_path, filename, localpath, overwrite_profiles, verbose, checktime_files, None) for url_path, filename, localpath in zip(urls, downloaded_filenames, localpaths) ]
+
+                        if nb_to_download > 0:
+                            pool_obj = multiprocessing.Pool(processes=NPROC)
+                            for window in batched(range(nb_to_download), 4*NPROC):
+                                for f_idx, ok in zip(window, pool_obj.imap(download_file, [args_download[f] for f in window])):
+                                    success.append(ok)
+                                    on_file(local_fnames[f_idx], True)
+                            pool_obj.close()
+                            pool_obj.join()
+
+                    else:
+                        CHUNK_SZ = int(np.ceil(nb_to_download/NPROC))
+                        chunks_fname = list(batched(downloaded_filenames,CHUNK_SZ))
+                        chunks_url = list(batched(urls,CHUNK_SZ))
+                        chunks_saveto = list(batched(localpaths,CHUNK_SZ))
+
+                        args_download = [ (rank, overwrite_profiles, verbose, checktime_files, chunk_url, chunk_fname, chunk_saveto) for rank, (chunk_url, chunk_fname, chunk_saveto) in enumerate(zip(chunks_url, chunks_fname, chunks_saveto)) ]
+
+                        if nb_to_download > 0:
+                            pool_obj = multiprocessing.Pool(processes=NPROC)
+                            success = list(itertools.chain.from_iterable( pool_obj.starmap(download_file_mp, args_download) ))
+                            pool_obj.close()
+                            pool_obj.join()
 
-                    pool_obj = multiprocessing.Pool(processes=NPROC)
-                    pool_obj.starmap(download_file_mp, args_download)
-                    pool_obj.close()
-                    pool_obj.join()
+                if checktime:
+                    synced_filepaths += [fp for fp, ok in zip(download_filepaths, success) if ok]
+                    download_state = argo_state.update_state(download_state, latest, synced_filepaths)
+                    argo_state.save_state(download_state, download_state_fname)
+                    nb_failed = len(download_filepaths) - sum(success)
+                    if nb_failed > 0:
+                        print(str(nb_failed) + ' files could not be downloaded, they will be tried again at the next sync.')
 
 
         if (not dryrun) and verbose: print("All requested files have been downloaded.")
@@ -239,6 +314,83 @@ def argo_gdac(gdac_path='./', dataset="bgc", lat_range=None,lon_range=None,start
     else:
         return wmoids, gdac_index_subset
 
+#------------------------------------------------------------------------------#
+# Parse GDAC index file
+def parse_gdac_index(gdac_file):
+    """Read a GDAC profile index file into an arrow table, extracting the path
+    fields from the file names in a single regex pass
+
+    Arguments:
+    gdac_file -- path to ar_index_global_prof.txt or
+                 argo_synthetic-profile_index.txt
+
+    returns arrow table with the columns of the index file, date and
+    date_update as timestamps, followed by wmoid, filepath_main, filepath,
+    filename and cycle
+    """
+
+    table = pa_csv.read_csv(
+        gdac_file,
+        read_options=pa_csv.ReadOptions(skip_rows=8),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={'date': pa.timestamp('ns'), 'date_update': pa.timestamp('ns')},
+            timestamp_parsers=['%Y%m%d%H%M%S'],
+        ),
+    )
+
+    # file name convention
+    # [institution ('aoml', 'coriolis', etc)] / [wmo_id] / profiles / [real time ('R') or delayed ('D') mode + wmo_id + cycle number + eventual descending profile ('D')] + .nc
+    fields = pc.extract_regex(table['file'], GDAC_FILE_REGEXP)
+    filepath_main = pc.struct_field(fields, 'filepath_main')
+
+    table = table.append_column('wmoid', pc.struct_field(fields, 'wmoid').cast(pa.int64()))
+    table = table.append_column('filepath_main', filepath_main)
+    table = table.append_column('filepath', pc.binary_join_element_wise(filepath_main, 'profiles/', ''))
+    table = table.append_column('filename', pc.struct_field(fields, 'filename'))
+    table = table.append_column('cycle', pc.struct_field(fields, 'cycle').cast(pa.int64()))
+
+    return table
+
+#------------------------------------------------------------------------------#
+# Load GDAC index file through a cached snapshot
+def load_gdac_index(gdac_file, cache=True):
+    """Load a GDAC profile index file into a dataframe (see parse_gdac_index)
+
+    Arguments:
+    gdac_file -- path to the index text file
+    cache     -- if True, the parsed index is stored next to the text file as a
+                 feather snapshot (<gdac_file>.feather) keyed on the
+                 modification time and size of the text file, and read from
+                 there as long as the text file does not change
+
+    returns dataframe with the index, with pyarrow-backed string columns
+    """
+
+    st = os.stat(gdac_file)
+    key = json.dumps({'mtime_ns': st.st_mtime_ns, 'size': st.st_size}).encode()
+    snapshot = gdac_file + '.feather'
+
+    table = None
+    if cache and os.path.isfile(snapshot):
+        try:
+            table = pa_feather.read_table(snapshot, memory_map=True)
+            if (table.schema.metadata or {}).get(b'argo2parquet_source') != key:
+                table = None
+        except Exception as e:
+            print('Could not read index snapshot ' + snapshot + ':', e)
+            table = None
+
+    if table is None:
+        table = parse_gdac_index(gdac_file)
+        if cache:
+            table = table.replace_schema_metadata({b'argo2parquet_source': key})
+            tmpname = snapshot + '.part'
+            pa_feather.write_feather(table, tmpname)
+            os.replace(tmpname, snapshot)
+
+    # string columns stay in arrow memory instead of becoming python objects
+    return table.to_pandas(split_blocks=True, self_destruct=True, types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+
 #------------------------------------------------------------------------------#
 # download all individual profiles in df
 def download_profiles(df,gdac_root='https://www.usgodae.org/ftp/outgoing/argo/',local_root='./gdac',overwrite=False,verbose=True,checktime=True):
@@ -307,6 +459,9 @@ def download_file_mp( rank, overwrite_profiles, verbose, checktime, chunk_url, c
     chunk_fname: thread chunk of file names for downloaded files
     chunk_saveto: thread chunk of destination paths for downloaded files
     (other arguments as in argo_gdac function)
+
+    returns list of booleans, True for the files in sync with the GDAC (see
+    download_file)
     """
 
     if rank is not None:
@@ -315,10 +470,13 @@ def download_file_mp( rank, overwrite_profiles, verbose, checktime, chunk_url, c
         rank_str = ''
 
     nb_downloads = len(chunk_fname)
+    success = []
     for f_idx, (url_path, filename, save_to) in enumerate(zip(chunk_url,chunk_fname,chunk_saveto)):
         print(rank_str + '>>> (' + str(round(f_idx*100/nb_downloads)) + '%) File ' + str(f_idx) + ' of ' + str(nb_downloads) + '...')
         args = [url_path, filename, save_to, overwrite_profiles, verbose, checktime, rank]
-        download_file(args)
+        success.append( download_file(args) )
+
+    return success
 
 #------------------------------------------------------------------------------#
 # Function to download a single file
@@ -338,6 +496,10 @@ def download_file(args):
                    (overwrite flag is neglected)
         verbose: True to announce progress
                  or False to stay silent
+
+    returns True if the file on disk is in sync with the URL (downloaded, or
+    not newer than the file on disk), False if it was left in place or an
+    error occurred
     """
 
     url_path,filename,save_to,overwrite,verbose,checktime,rank = args
@@ -363,11 +525,11 @@ def download_file(args):
                 current_file_time = current_file_time.replace(tzinfo=tz).astimezone(tz)
                 if not new_file_time > current_file_time:
                     if verbose: print(rank_str + '>>> File ' + filename + ' at requested URL (' + str(url_path) + ') is not newer than file on disk and is not downloaded.')
-                    return
+                    return True
 
             elif not overwrite:
                 if verbose: print(rank_str + '>>> File ' + filename + ' already exists. Leaving current version.')
-                return
+                return False
             else:
                 if verbose: print(rank_str + '>>> File ' + filename + ' already exists. Overwriting with new version.')
 
@@ -376,16 +538,21 @@ def download_file(args):
 
         if response.status_code == 404:
             if verbose: print(rank_str + '>>> File ' + filename + ' returned 404 error during download (requested URL: ' + str(url_dl) + ').')
-            return
+            return False
+        if response.status_code != 200:
+            if verbose: print(rank_str + '>>> File ' + filename + ' returned status ' + str(response.status_code) + ' during download (requested URL: ' + str(url_dl) + ').')
+            return False
 
         with open(save_to+filename,'wb') as out_file:
             shutil.copyfileobj(response.raw,out_file)
             del response
         if verbose: print(rank_str + '>>> Successfully downloaded ' + filename + '.')
+        return True
 
     except Exception as e:
         print("The following error occurred:", e)
         if verbose: print(rank_str + '>>> An error occurred while trying to download ' + filename + ' from ' + url_path + '.')
+        return False
 
 #------------------------------------------------------------------------------#
 # Return true if current profile collection on disk is more recent than all
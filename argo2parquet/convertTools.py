@@ -15,8 +15,8 @@ import multiprocessing
 from pathlib import Path
 import gc
 import os
-import warnings
-import argo_tools as at
+import argo2parquet.argo_tools as at
+import argo2parquet.argo_balance as ab
 
 # ignore pandas "educational" performance warnings
 from warnings import simplefilter
@@ -126,6 +126,8 @@ class convertTools():
         if not self.single_process:
             nc_size_per_pqt = 40 # Empirically, 40 MB of average .nc file size gives in-memory sizes between 100-330 MB, which is what Dask recommens
             NPROC, chunks,size_per_proc = self.poolParams(nc_size_per_pqt)
+        else:
+            NPROC, chunks, size_per_proc = 1, [flist], 0
 
         # fixing max nb of processes to prevent bottleneck likely due to I/O on disk queing operations and filling up the memory
         MAXPROC = self.MAXPROC
@@ -151,10 +153,10 @@ class convertTools():
             # multiprocessing across residual processor pool with NPROC<MAXPROC
             if RESPROC > 0:
                 pool_obj = multiprocessing.Pool(processes=RESPROC)
-                failed_files.append( pool_obj.starmap(self.xr2pqt, [(rank, chunk, full_loop+1) for rank, chunk in enumerate(chunks[(i_end+1):])] ) )
+                failed_files.append( pool_obj.starmap(self.xr2pqt, [(rank, chunk, full_loop+1) for rank, chunk in enumerate(chunks[i_end:])] ) )
                 pool_obj.close()
 
-        elif NPROC > 1 and not single_process:
+        elif NPROC > 1 and not self.single_process:
             failed_files = []
             pool_obj = multiprocessing.Pool(processes=NPROC)
             failed_files.append( pool_obj.starmap(self.xr2pqt, [(rank, chunk, 0) for rank, chunk in enumerate(chunks)] ) )
@@ -260,29 +262,40 @@ class convertTools():
 #------------------------------------------------------------------------------#
 ## Set up parameter for parallel processing
     def poolParams(self,nc_size_per_pqt):
+        """Split the files among processes with about nc_size_per_pqt MB of
+        netCDF files each, packing them largest first (see argo_balance.py)
+
+        Arguments:
+        nc_size_per_pqt -- target size in MB of the files of each process
+
+        Returns:
+        NPROC         -- number of processes
+        chunks        -- list of NPROC lists of files, every file being in
+                         exactly one of them
+        size_per_proc -- mean size in MB of the files of each process
+
+        Generates:
+        imbalance -- ratio between the largest size of the files of a process
+                     and its lower bound (see argo_balance.imbalance)
+        """
+
         flist = self.flist
 
-        size_flist = []
+        size_flist = ab.file_sizes(flist)/1024**2 #size in MB
 
         for f in flist:
-            try:
-                f_size = os.path.getsize(f)/1024**2
-                size_flist.append( f_size ) #size in MB
-            except:
-                if not os.path.isfile(f):
-                    gdac_root = 'https://usgodae.org/pub/outgoing/argo/dac/'
-                    fpath = os.path.join( *f.split(os.path.sep)[-3:] )
-                    response = at.get_func( gdac_root + fpath )
-                    if response.status_code == 404:
-                        print('File ' + f + ' returned 404 error from URL ' + str(gdac_root+fpath) + '. Skipping it.')
-                    else:
-                        print('File ' + f + ' likely present at URL ' + str(gdac_root+fpath) + '. You might want to check why it is not in the local drive.')
+            if not os.path.isfile(f):
+                gdac_root = 'https://usgodae.org/pub/outgoing/argo/dac/'
+                fpath = os.path.join( *f.split(os.path.sep)[-3:] )
+                response = at.get_func( gdac_root + fpath )
+                if response.status_code == 404:
+                    print('File ' + f + ' returned 404 error from URL ' + str(gdac_root+fpath) + '.')
                 else:
-                    print('File ' + f + ' seems to exist in the local drive: not sure what is going on here.')
-                continue
+                    print('File ' + f + ' likely present at URL ' + str(gdac_root+fpath) + '. You might want to check why it is not in the local drive.')
 
-        size_tot = sum(size_flist)
+        size_tot = size_flist.sum()
         NPROC = int(np.ceil(size_tot/nc_size_per_pqt))
+        NPROC = max( min(NPROC, len(flist)), 1 )
         size_per_proc = size_tot/NPROC
 
         print('')
@@ -290,47 +303,19 @@ class convertTools():
         print(size_per_proc)
         print('')
 
-        ids_sort = np.argsort(np.array(size_flist))
-
-        chunks_ids = []
-        x = np.copy(ids_sort)
-
-        for j in range(NPROC):
-            chunk_ids = []
-            chunk_size = 0
-            while ((chunk_size<size_per_proc) and (len(x) > 0)):
-                if len(chunk_ids)%2 == 0:
-                    chunk_ids.append(x[-1])
-                    x = x[:-1]
-                else:
-                    chunk_ids.append(x[0])
-                    x = x[1:]
-                chunk_size = sum(np.asarray(size_flist)[chunk_ids])
-            print(chunk_size)
-            chunks_ids.append(chunk_ids)
-
-        if len(x) > 0:
-            warnings.warn(str(len(x)) + " files have not been assigned to a processor.")
+        chunks_ids = [chunk_ids for chunk_ids in ab.lpt_bins(size_flist, NPROC) if len(chunk_ids) > 0]
+        chunks = [ [flist[k] for k in chunk_ids] for chunk_ids in chunks_ids ]
+        sizes_proc = [ size_flist[chunk_ids].sum() for chunk_ids in chunks_ids ]
 
-        print('')
-        chunks=[]
-        skip_proc = 0
-        total_memory = 0
-        for j,chunk_ids in enumerate(chunks_ids):
+        for j, size_proc in enumerate(sizes_proc):
             print('Size in processor ' + str(j) + ' (MB):')
-            size_proc = sum(np.asarray(size_flist)[chunk_ids])
-            total_memory += size_proc
             print(size_proc)
-            if size_proc == 0:
-                skip_proc += 1
-                continue
-            chunk = [flist[k] for k in chunk_ids]
-            chunks.append(chunk)
 
-        NPROC -= skip_proc
+        NPROC = len(chunks)
+        self.imbalance = ab.imbalance(sizes_proc, size_flist.max(initial=0))
 
         print('')
-        print("Using " + str(NPROC) + " processors")
+        print("Using " + str(NPROC) + " processors (imbalance: " + "{:.3f}".format(self.imbalance) + ")")
 
         return NPROC, chunks, size_per_proc
 
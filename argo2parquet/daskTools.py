@@ -10,11 +10,15 @@
 ##########################################################################
 import dask
 import dask.dataframe as dd
+from dask.dataframe.utils import clear_known_categories
 import pyarrow as pa
+import pyarrow.dataset as pds
 import pyarrow.parquet as pq
 import pandas as pd
 import xarray as xr
 import argopy
+from argopy.utils.casting import cast_Argo_variable_type
+import netCDF4
 import numpy as np
 # ignore pandas "educational" performance warnings
 import warnings
@@ -24,6 +28,16 @@ warnings.simplefilter(action="ignore", category=pd.errors.PerformanceWarning)
 from pprint import pprint
 from dask.distributed import print
 import argo2parquet.params as params
+import argo2parquet.argo_manifest as am
+import argo2parquet.argo_arrow as aa
+import argo2parquet.argo_layout as al
+import argo2parquet.argo_balance as ab
+from argo2parquet.streamWriter import streamWriter
+from dask.distributed import default_client
+import os
+from pathlib import Path
+from datetime import datetime
+import time
 ##########################################################################
 
 class daskTools():
@@ -37,7 +51,7 @@ class daskTools():
     # Constructors/Destructors                                           #
     # ------------------------------------------------------------------ #
 
-    def __init__(self, db_type=None, out_dir=None, flist=None, schema_path='../schemas', chunk=None):
+    def __init__(self, db_type=None, out_dir=None, flist=None, schema_path='../schemas', chunk=None, reader=None, engine=None, row_group_size=None, ntasks=None, layout=None, tile_size=None, cluster=None, time_bucket=None, balance=None, resources=None, drop_padding=None, write_profile=None):
         """Constructor
 
         Arguments:
@@ -46,6 +60,38 @@ class daskTools():
         flist       -- list of paths to Argo files to be converted
         schema_path -- path to ArgoPHY_schema.metadata and ArgoBGC_schema.metadata
         chunk       -- number of files processed at a time by dask
+        reader      -- "xarray" (default) to read the files with the argo xarray
+                       engine, "arrow" to read them straight into arrow arrays
+        engine      -- "dask" (default) to write each chunk of files through a
+                       dask dataframe, "stream" to have each task stream the
+                       tables of its files into long-lived parquet writers
+        row_group_size -- number of rows per row group for the "stream" engine
+        ntasks      -- number of streaming tasks for the "stream" engine
+                       (default: number of dask workers, or of CPUs)
+        layout      -- "flat" (default) to write all fragments in out_dir,
+                       "partitioned" to write them in hive partitions by year
+                       and lat/lon tile (see argo_layout.py)
+        tile_size   -- size in degrees of the lat/lon tiles (default: 10)
+        cluster     -- sort keys used to cluster the rows before they are
+                       written, in order of priority among "time" (time
+                       bucket), "space" (Z-order position) and "pres"; if None
+                       (default) rows are written in reading order
+        time_bucket -- numpy datetime unit of the time buckets used to cluster
+                       the rows ('Y', 'M' (default), 'W' or 'D')
+        balance     -- "files" (default) to split the files into chunks of
+                       chunk files and read each file in its own task,
+                       "bytes" to balance chunks and tasks by file size (see
+                       argo_balance.py)
+        resources   -- dask resources taken by each task, e.g. {"MEMORY": 4096},
+                       when the workers of the cluster declare resources (see
+                       argo_resources.plan_shared_resources)
+        drop_padding -- if True, the levels that pad the profiles to the
+                       N_LEVELS of the file (all measurements null) are dropped
+                       as each file is read (see argo_arrow.padding_rows);
+                       default: False
+        write_profile -- name of the write profile of the parquet writers, in
+                       params.params["write_profiles"] (default: None, the
+                       pyarrow defaults)
         """
 
         if db_type is None:
@@ -70,6 +116,67 @@ class daskTools():
         else:
             self.chunk = chunk
 
+        if reader is None:
+            self.reader = "xarray"
+        elif reader not in ["xarray", "arrow"]:
+            raise ValueError("reader can only take values xarray or arrow.")
+        else:
+            self.reader = reader
+
+        if engine is None:
+            self.engine = "dask"
+        elif engine not in ["dask", "stream"]:
+            raise ValueError("engine can only take values dask or stream.")
+        else:
+            self.engine = engine
+
+        self.row_group_size = row_group_size
+        self.ntasks = ntasks
+
+        if layout is None:
+            self.layout = "flat"
+        elif layout not in ["flat", "partitioned"]:
+            raise ValueError("layout can only take values flat or partitioned.")
+        else:
+            self.layout = layout
+
+        if tile_size is None:
+            self.tile_size = 10
+        else:
+            self.tile_size = tile_size
+
+        if cluster is None:
+            self.cluster = None
+        elif not set(cluster) <= set(al.CLUSTER_KEYS):
+            raise ValueError("cluster can only contain values " + ", ".join(al.CLUSTER_KEYS) + ".")
+        else:
+            self.cluster = list(cluster)
+
+        if time_bucket is None:
+            self.time_bucket = "M"
+        elif time_bucket not in ["Y", "M", "W", "D"]:
+            raise ValueError("time_bucket can only take values Y, M, W or D.")
+        else:
+            self.time_bucket = time_bucket
+
+        if balance is None:
+            self.balance = "files"
+        elif balance not in ["files", "bytes"]:
+            raise ValueError("balance can only take values files or bytes.")
+        else:
+            self.balance = balance
+
+        self.resources = resources
+
+        if drop_padding is None:
+            self.drop_padding = False
+        else:
+            self.drop_padding = drop_padding
+
+        if write_profile is not None and write_profile not in params.params["write_profiles"]:
+            raise ValueError("write_profile can only take values " + ", ".join(params.params["write_profiles"]) + " or None.")
+        self.write_profile = write_profile
+
         if schema_path is None:
             self.schema_path = '../schemas/Argo' + self.db_type + '_schema.metadata'
         else:
@@ -80,7 +187,9 @@ class daskTools():
         self.__assign_vars()
         self.VARS = sorted(self.VARS)
 
-        self.failed_reads = [-1] * len(flist)
+        self.status = []
+        self.plan = []
+        self.plan_flist = []
 
         pass
 
@@ -91,15 +200,194 @@ class daskTools():
 #------------------------------------------------------------------------------#
 ## Delayed function to read an Argo profile into a dataframe with a prescribed
 ## schema
-    @dask.delayed(nout=1)
+    @dask.delayed(nout=2)
     def read_argo(self,argo_file):
+        """ Read Argo file into dataframe (delayed)
+
+        Arguments:
+        argo_file -- path to file
+
+        Returns:
+        df     -- dataframe
+        status -- dict with the read status of the file (see read_status)
+        """
+
+        return self.__read_df(argo_file)
+
+#------------------------------------------------------------------------------#
+## Delayed function to read a batch of Argo profiles into one dataframe
+    @dask.delayed(nout=2)
+    def read_argo_files(self,files):
+        """ Read Argo files into a single dataframe (delayed)
+
+        Arguments:
+        files -- list of paths to files
+
+        Returns:
+        df     -- dataframe with the rows of all the files
+        status -- list of dicts with the read status of each file
+        """
+
+        dfs = []
+        status = []
+        for argo_file in files:
+            df, file_status = self.__read_df(argo_file)
+            dfs.append(df)
+            status.append(file_status)
+
+        # empty frames of failed files are left out unless all failed
+        nonempty = [df for df in dfs if len(df) > 0]
+        if len(nonempty) > 0:
+            dfs = nonempty
+
+        df = pd.concat(dfs, ignore_index=True)
+
+        # dictionary columns are categorical in the dask dataframes, as dask
+        # reads them back when it checks the dtypes of an append
+        dictionary = [f.name for f in self.schema if pa.types.is_dictionary(f.type)]
+        if len(dictionary) > 0:
+            df = df.astype({c: "category" for c in dictionary})
+
+        return df, status
+
+#------------------------------------------------------------------------------#
+## Read an Argo profile into an arrow table with the database schema
+    def read_argo_table(self,argo_file):
+        """ Read Argo file into arrow table
+
+        Arguments:
+        argo_file -- path to file
+
+        Returns:
+        table  -- pyarrow table with the database schema (empty if the file
+                  cannot be read)
+        status -- dict with the read status of the file (see read_status)
+        """
+
+        if self.reader == "arrow":
+            start_time = time.time()
+            try:
+                table = aa.read_argo_arrow(argo_file, self.schema)
+                dropped = 0
+                if self.drop_padding:
+                    table, dropped = aa.drop_padding(table)
+                print('Processing    ' + str(argo_file))
+                status = self.read_status(argo_file, start_time, rows=table.num_rows, dropped=dropped)
+            except Exception as e:
+                print("The following exception occurred:", e)
+                print('Failed on ' + str(argo_file))
+                table = self.schema.empty_table()
+                status = self.read_status(argo_file, start_time, error=e)
+
+        else:
+            df, status = self.__read_df(argo_file)
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+
+        return table, status
+
+#------------------------------------------------------------------------------#
+## Memory taken by a file once read
+    def memory_footprint(self, argo_file):
+        """ Memory in bytes that an Argo file takes once read by the conversion
+        engine: arrow table for the "stream" engine, dataframe for the "dask"
+        engine
+
+        Arguments:
+        argo_file -- path to file
+        """
+
+        if self.engine == "stream":
+            table, status = self.read_argo_table(argo_file)
+            nbytes = table.nbytes
+        else:
+            df, status = self.__read_df(argo_file)
+            nbytes = df.memory_usage(deep=True).sum()
+
+        if status["status"] != "ok":
+            raise ValueError(status["message"])
+
+        return int(nbytes)
+
+#------------------------------------------------------------------------------#
+## Read status of a file
+    def read_status(self, argo_file, start_time, rows=0, error=None, dropped=0):
+        """ Structured status of the read of an Argo file
+
+        Arguments:
+        argo_file  -- path to file
+        start_time -- time.time() when the read started
+        rows       -- number of rows read
+        error      -- exception raised by the read, if any
+        dropped    -- number of padding rows dropped
+
+        Returns:
+        status -- dict with file, wmoid, status ('ok' or 'failed'), error
+                  (exception class), message, rows, dropped, bytes (size of
+                  the file) and duration (s)
+        """
+
+        try:
+            nbytes = os.path.getsize(argo_file)
+        except OSError:
+            nbytes = -1
+
+        try:
+            wmoid = am.file_wmoid(argo_file)
+        except ValueError:
+            wmoid = -1
+
+        status = {
+            "file": str(argo_file),
+            "wmoid": wmoid,
+            "status": "ok" if error is None else "failed",
+            "error": "" if error is None else type(error).__name__,
+            "message": "" if error is None else str(error),
+            "rows": rows,
+            "dropped": dropped,
+            "bytes": nbytes,
+            "duration": time.time() - start_time,
+        }
+
+        return status
+
+#------------------------------------------------------------------------------#
+## Open an Argo profile with only the variables to convert
+    def open_argo_dataset(self, argo_file):
+        """ Open an Argo file as the argo xarray engine does (CF decoding and
+        casting of the variables to the Argo types), but only with the
+        variables to convert and the PARAMETER/PARAMETER_DATA_MODE pair: the
+        argo engine ignores drop_variables, and would otherwise decode and cast
+        the HISTORY_*, SCIENTIFIC_CALIB_* and other N_CALIB variables too
+
+        Arguments:
+        argo_file -- path to file
+
+        Returns:
+        ds -- xarray Argo dataset
+        """
+
+        # the header alone gives the variables in the file
+        with aa.NETCDF_LOCK, netCDF4.Dataset(argo_file, "r") as nc:
+            file_vars = list(nc.variables)
+
+        keep = set(self.VARS) | {"PARAMETER", "PARAMETER_DATA_MODE"}
+        drop_vars = [v for v in file_vars if v not in keep]
+
+        ds = xr.open_dataset(argo_file, decode_cf=1, use_cftime=0, mask_and_scale=1, drop_variables=drop_vars)
+
+        return cast_Argo_variable_type(ds)
+
+#------------------------------------------------------------------------------#
+## Read an Argo profile into a dataframe with a prescribed schema
+    def __read_df(self,argo_file):
         """ Read Argo file into dataframe
 
         Arguments:
         argo_file -- path to file
 
         Returns:
-        df -- dataframe
+        df     -- dataframe
+        status -- dict with the read status of the file (see read_status)
 
         Exceptions:
         if the Argo file cannot be read, the file name is printed to screen
@@ -108,26 +396,44 @@ class daskTools():
         """
 
         okflag = -1
+        error = None
+        dropped = 0
+        start_time = time.time()
 
         try:
-            ds = xr.open_dataset(argo_file, engine="argo") #loading into memory the profile
-
-            # updating data modes for BGC argo floats data
-            if 'PARAMETER_DATA_MODE' in list(ds.data_vars):
-                if (ds['PARAMETER'].isel(N_CALIB=0) == ds['PARAMETER']).all():
-                    ds = self.__assign_data_mode(ds)
-                else:
-                    raise ValueError("PARAMETER not independent of N_CALIB.")
-            
-            ds_vars = list(ds.data_vars)
-            invars = list(set(self.VARS) & set(ds_vars))
-            df = ds[invars].to_dataframe()
-            df = df.reset_index() #flatten dataframe
+            if self.reader == "arrow":
+                table = aa.read_argo_arrow(argo_file, self.schema)
+                if self.drop_padding:
+                    table, dropped = aa.drop_padding(table)
+                df = table.to_pandas(types_mapper=self.__pa2pd_mapper)
+
+            else:
+                ds = self.open_argo_dataset(argo_file) #loading into memory the profile
+
+                # updating data modes for BGC argo floats data
+                if 'PARAMETER_DATA_MODE' in list(ds.data_vars):
+                    if (ds['PARAMETER'].isel(N_CALIB=0) == ds['PARAMETER']).all():
+                        ds = self.__assign_data_mode(ds)
+                    else:
+                        raise ValueError("PARAMETER not independent of N_CALIB.")
+
+                ds_vars = list(ds.data_vars)
+                invars = list(set(self.VARS) & set(ds_vars))
+                df = ds[invars].to_dataframe()
+                df = df.reset_index() #flatten dataframe
+
+                if self.drop_padding:
+                    padded = df[ aa.measurement_vars(df.columns) ].isna().all(axis=1).to_numpy()
+                    drop = aa.padding_rows(df["N_PROF"].to_numpy(), df["N_LEVELS"].to_numpy(), padded)
+                    dropped = int(drop.sum())
+                    df = df.loc[~drop].reset_index(drop=True)
+
             okflag = 1
 
         except Exception as e:
             print("The following exception occurred:", e)
             okflag = 0
+            error = e
             # create empty dataframe
             df = pd.DataFrame({c: pd.Series(dtype=t) for c, t in self.pd_dict.items()})
 
@@ -142,13 +448,15 @@ class daskTools():
         df = df.reindex( columns=self.VARS )
 
         # enforcing dtypes otherwise to_parquet() gives error when appending
-        df = df.astype(self.pd_dict)
+        df = df.astype({c: t for c, t in self.pd_dict.items() if df[c].dtype != t})
+
+        status = self.read_status(argo_file, start_time, rows=len(df), error=error, dropped=dropped)
 
-        return df
+        return df, status
 
 #------------------------------------------------------------------------------#
 ## Performs conversion
-    def convert_to_parquet(self, flist=None, out_dir=None, chunk=None):
+    def convert_to_parquet(self, flist=None, out_dir=None, chunk=None, append=False, name_tag=None):
         """Performs conversion by building compute graph and triggering
         operations
 
@@ -156,6 +464,10 @@ class daskTools():
         flist    -- list of paths to files to convert
         out_dir   -- output directory for the parquet database
         chunk    -- number of files processed at a time
+        append   -- if True, append to the existing database instead of
+                    overwriting it on the first chunk
+        name_tag -- tag added to the fragment names, to avoid overwriting
+                    existing fragments when appending
         """
 
         if flist is None:
@@ -165,56 +477,384 @@ class daskTools():
         if chunk is None:
             chunk = self.chunk
 
-        for j in range( int(np.ceil(len(flist)/chunk)) ):
-            initchunk = j*chunk
-            endchunk = (j+1)*chunk
-            if endchunk > len(flist):
-                endchunk = len(flist)
+        self.status = []
 
-            df = [ self.read_argo(file) for file in flist[initchunk:endchunk] ]
+        if self.engine == "stream":
+            self.stream_to_parquet(flist=flist, out_dir=out_dir, append=append, name_tag=name_tag)
+            return
 
-            df = dd.from_delayed(df) # creating unique df from list of df
+        self.plan = self.plan_conversion(flist, chunk)
+        self.plan_flist = flist
+
+        for j, tasks in enumerate(self.plan):
+            reads = [ self.read_argo_files(files) for files in tasks ]
+
+            df = dd.from_delayed([ r[0] for r in reads ], meta=self.__meta()) # creating unique df from list of df
 
             df = df.repartition(partition_size="300MB")
 
-            name_function = lambda x: f"Argo{self.db_type}_dask_{j}_{x}.parquet"
+            schema = self.schema
+            partition_on = None
+            if self.layout == "partitioned":
+                df = df.map_partitions(al.add_partition_keys, self.tile_size)
+                schema = al.partitioned_schema(self.schema)
+                partition_on = al.PARTITION_KEYS
+
+            if self.cluster is not None:
+                df = df.map_partitions(al.cluster_df, self.time_bucket, self.cluster)
+
+            if name_tag is None:
+                name_function = lambda x: f"Argo{self.db_type}_dask_{j}_{x}.parquet"
+            else:
+                name_function = lambda x: f"Argo{self.db_type}_dask_{name_tag}_{j}_{x}.parquet"
 
             # to_parquet() triggers execution of lazy functions
-            append_db = False
+            append_db = append
             if j>0:
                 append_db = True # append to pre-existing partition
             overwrite_db = not append_db
 
-            df.to_parquet(
+            write = df.to_parquet(
                 out_dir,
                 engine="pyarrow",
                 name_function = name_function,
                 append = append_db,
                 write_metadata_file = True,
                 write_index=False,
-                schema = self.schema,
-                overwrite = overwrite_db
+                schema = schema,
+                partition_on = partition_on,
+                overwrite = overwrite_db,
+                compute = False,
+                **aa.writer_kwargs(self.schema, self.write_profile)
             )
 
+            # the read statuses are computed in the same graph as the write, so
+            # that each file is read once
+            _, *status = dask.compute(write, *[ r[1] for r in reads ], **self.__compute_kwargs())
+            for task_status in status:
+                self.status += task_status
+
             print()
 
         print("stored.")
 
 #------------------------------------------------------------------------------#
-## Finalize compute of failed files
+## Performs conversion streaming tables into parquet writers
+    def stream_to_parquet(self, flist=None, out_dir=None, append=False, name_tag=None):
+        """Performs conversion with long-lived parquet writers: the files are
+        split across ntasks dask tasks, and each task reads its files one at a
+        time and streams their tables into a streamWriter, so that the memory
+        of each task is bounded by a few row groups
+
+        Arguments:
+        flist    -- list of paths to files to convert
+        out_dir  -- output directory for the parquet database
+        append   -- if True, keep the existing fragments of the database
+        name_tag -- tag added to the fragment names, to avoid overwriting
+                    existing fragments when appending
+        """
+
+        if flist is None:
+            flist = self.flist
+        if out_dir is None:
+            out_dir = self.out_dir
+
+        Path(out_dir).mkdir(parents = True, exist_ok = True)
+        if not append:
+            for fragment in am.list_fragments(out_dir, self.db_type):
+                os.remove(fragment)
+
+        self.plan = self.plan_conversion(flist)
+        self.plan_flist = flist
+
+        basename = "Argo" + self.db_type + "_stream"
+        if name_tag is not None:
+            basename += "_" + name_tag
+
+        tasks = [
+            dask.delayed(self.stream_files)(files, out_dir, basename + "_" + str(rank))
+            for rank, files in enumerate(self.plan[0])
+        ]
+        for _, status in dask.compute(*tasks, **self.__compute_kwargs()):
+            self.status += status
+
+        am.write_metadata_file(out_dir, self.db_type, self.schema)
+
+        print("stored.")
+
+#------------------------------------------------------------------------------#
+## Stream a list of files into a parquet writer
+    def stream_files(self, files, out_dir, basename):
+        """Read files one at a time and stream them into a streamWriter
+
+        Arguments:
+        files    -- list of paths to files to convert
+        out_dir  -- output directory for the parquet database
+        basename -- base name of the parquet files written by this task
+
+        Returns:
+        written -- list of parquet files written
+        status  -- list of the read statuses of the files
+        """
+
+        status = []
+        sort_by = None
+        if self.cluster is not None:
+            sort_by = lambda table: al.cluster_table(table, self.time_bucket, self.cluster)
+
+        if self.layout == "flat":
+            writer = streamWriter(
+                out_dir,
+                basename,
+                self.schema,
+                row_group_size = self.row_group_size,
+                writer_kwargs = aa.writer_kwargs(self.schema, self.write_profile),
+                sort_by = sort_by
+            )
+            for argo_file in files:
+                table, file_status = self.read_argo_table(argo_file)
+                status.append(file_status)
+                writer.write(table)
+
+            return writer.close(), status
+
+        # one writer per partition, opened the first time a row falls in it
+        writers = {}
+        for argo_file in files:
+            table, file_status = self.read_argo_table(argo_file)
+            status.append(file_status)
+            for subdir, table in al.split_table(table, self.tile_size):
+                if subdir not in writers:
+                    writers[subdir] = streamWriter(
+                        os.path.join(out_dir, subdir),
+                        basename,
+                        self.schema,
+                        row_group_size = self.row_group_size,
+                        writer_kwargs = aa.writer_kwargs(self.schema, self.write_profile),
+                        sort_by = sort_by
+                    )
+                writers[subdir].write(table)
+
+        written = []
+        for writer in writers.values():
+            written += writer.close()
+
+        return written, status
+
+#------------------------------------------------------------------------------#
+## Arguments of dask.compute
+    def __compute_kwargs(self):
+        """Arguments passed to dask.compute: the resources taken by the tasks,
+        if any"""
+
+        if self.resources is None:
+            return {}
+
+        return {"resources": self.resources}
+
+#------------------------------------------------------------------------------#
+## Number of parallel tasks
+    def __task_count(self, nfiles):
+        """Number of tasks run at the same time: ntasks if given, otherwise the
+        number of threads of the dask workers, or of CPUs if there is no dask
+        client"""
+
+        ntasks = self.ntasks
+        if ntasks is None:
+            try:
+                workers = default_client().scheduler_info()["workers"]
+                ntasks = sum( w["nthreads"] for w in workers.values() )
+            except ValueError:
+                ntasks = os.cpu_count()
+
+        return max( min(ntasks, nfiles), 1 )
+
+#------------------------------------------------------------------------------#
+## Split files into chunks and tasks
+    def plan_conversion(self, flist, chunk=None, balance=None):
+        """Split the files into chunks (converted one after the other) and each
+        chunk into tasks (lists of files read by the same task)
+
+        Arguments:
+        flist   -- list of paths to files to convert
+        chunk   -- number of files per chunk with the "dask" engine (the
+                   "stream" engine converts all files in a single chunk)
+        balance -- "files" or "bytes" (default: self.balance)
+
+        Returns:
+        plan -- list of chunks, each a list of tasks, each a list of paths
+        """
+
+        if chunk is None:
+            chunk = self.chunk
+        if balance is None:
+            balance = self.balance
+
+        ntasks = self.__task_count(len(flist))
+
+        if self.engine == "stream":
+            if balance == "bytes":
+                plan = [ ab.lpt_bins(ab.file_costs(flist), ntasks) ]
+            else:
+                plan = [ [list(range(rank, len(flist), ntasks)) for rank in range(ntasks)] ]
+        elif balance == "bytes":
+            nchunks = int(np.ceil(len(flist)/chunk))
+            plan = ab.plan_chunks(ab.file_costs(flist), nchunks, ntasks)
+        else:
+            plan = ab.plan_fixed(len(flist), chunk)
+
+        return [ [[flist[k] for k in task] for task in tasks] for tasks in plan ]
+
+#------------------------------------------------------------------------------#
+## Report wall time skew of the chunks
+    def balance_report(self):
+        """Print the wall time of the chunks of the last conversion estimated
+        from the read time of each file, with the files split in chunks of
+        fixed size and balanced by bytes
+
+        Returns:
+        report -- dict with (estimated wall time, largest chunk skew) for
+                  "files" and "bytes" balance, where the skew is the ratio
+                  between the wall time of a chunk and the one with the read
+                  time evenly spread over the workers
+        """
+
+        flist = self.plan_flist
+        if len(flist) == 0:
+            return {}
+
+        durations = { s["file"]: s["duration"] for s in self.status }
+        durations = np.array([ durations.get(f, 0.0) for f in flist ])
+        index = { f: k for k, f in enumerate(flist) }
+        ntasks = self.__task_count(len(flist))
+
+        report = {}
+        for balance in ["files", "bytes"]:
+            plan = self.plan_conversion(flist, balance=balance)
+            plan = [ [[index[f] for f in files] for files in tasks] for tasks in plan ]
+            wall, skew = ab.plan_skew(plan, durations, ntasks)
+            report[balance] = (float(wall.sum()), float(skew.max()))
+
+        print(
+            "Estimated read wall time: " + "{:.1f}".format(report["files"][0]) + " s with chunks of fixed size (largest chunk skew " + "{:.2f}".format(report["files"][1]) + "), "
+            + "{:.1f}".format(report["bytes"][0]) + " s balanced by bytes (largest chunk skew " + "{:.2f}".format(report["bytes"][1]) + ")."
+        )
+
+        return report
+
+#------------------------------------------------------------------------------#
+## Report row groups pruned by reference filters
+    def pruning_report(self, out_dir=None, filters=None):
+        """Print the fraction of row groups that readers skip thanks to the
+        partition keys and the row group statistics for a set of filters
+
+        Arguments:
+        out_dir -- directory of the parquet database
+        filters -- dict of lists of (column, op, value) tuples (default: the
+                   filters of the example notebooks, argo_layout.REFERENCE_FILTERS)
+
+        Returns:
+        pruning -- dict with (selected, total) row groups for each filter
+        """
+
+        if out_dir is None:
+            out_dir = self.out_dir
+        if filters is None:
+            filters = al.REFERENCE_FILTERS
+
+        fragments = am.list_fragments(out_dir, self.db_type)
+        schema = self.schema
+        if self.layout == "partitioned":
+            schema = al.partitioned_schema(self.schema)
+        dataset = pds.dataset(fragments, schema=schema, format="parquet", partitioning="hive", partition_base_dir=out_dir)
+
+        pruning = {}
+        for name, filt in filters.items():
+            filt = [f for f in filt if f[0] in schema.names]
+            if self.layout == "partitioned":
+                filt = al.partition_filters(filt, self.tile_size)
+            selected, total = al.row_group_pruning(dataset, filt)
+            pruning[name] = (selected, total)
+            if total > 0:
+                print("Filter " + name + ": " + str(total - selected) + " of " + str(total) + " row groups pruned (" + "{:.1%}".format(1 - selected/total) + ").")
+
+        return pruning
+
+#------------------------------------------------------------------------------#
+## Performs incremental conversion
+    def update_parquet(self, flist_changed, wmoids_removed, out_dir=None, chunk=None):
+        """Update an existing database replacing only the data of the floats
+        that changed since the previous conversion
+
+        Arguments:
+        flist_changed  -- list of paths to the new or modified files to convert
+        wmoids_removed -- list of WMO identifiers whose rows are removed from
+                          the database before appending the changed files
+        out_dir        -- output directory for the parquet database
+        chunk          -- number of files processed at a time
+        """
+
+        if out_dir is None:
+            out_dir = self.out_dir
+
+        touched = am.drop_floats(out_dir, self.db_type, wmoids_removed, self.write_profile)
+        if len(touched) > 0:
+            am.write_metadata_file(out_dir, self.db_type, self.schema)
+
+        self.status = []
+        if len(flist_changed) > 0:
+            name_tag = datetime.now().strftime("%Y%m%d%H%M%S")
+            self.convert_to_parquet(
+                flist = flist_changed,
+                out_dir = out_dir,
+                chunk = chunk,
+                append = True,
+                name_tag = name_tag
+            )
+
+#------------------------------------------------------------------------------#
+## Report the padding rows dropped
+    def padding_report(self):
+        """ Report the padding rows dropped in the last conversion
+
+        Returns:
+        dropped -- number of rows dropped
+        rows    -- number of rows written
+        """
+
+        dropped = sum(s["dropped"] for s in self.status)
+        rows = sum(s["rows"] for s in self.status)
+
+        if self.drop_padding and rows + dropped > 0:
+            print("Padding: " + str(dropped) + " of " + str(rows + dropped) + " rows dropped (" + "{:.1%}".format(dropped/(rows + dropped)) + ").")
+
+        return dropped, rows
+
+#------------------------------------------------------------------------------#
+## Read statuses of the last conversion
+    def status_table(self):
+        """ Read statuses of the files of the last conversion as a dataframe,
+        one row per file (see read_status)"""
+
+        return am.status_frame(self.status)
+
+#------------------------------------------------------------------------------#
+## List files that failed
     def failed_files(self):
-        """ Trigger dask compute of failed files"""
+        """ List the files that failed on read in the last conversion
 
-        okflags = dask.compute(*self.failed_reads) #needs unpacked list of delayed objects
+        Returns:
+        failed_list -- list of paths to the files that were not converted
+        """
 
-        # find the files that failed on reads or never communicated if read was
-        # succesfull
-        self.failed_list = [file for idx, file in enumerate(self.flist) if okflags[idx]!=1]
+        self.failed_list = [s["file"] for s in self.status if s["status"] != "ok"]
 
-        failed_percentage = len(self.failed_list)/len(self.flist)*100
+        if len(self.status) > 0:
+            failed_percentage = len(self.failed_list)/len(self.status)*100
+            print("The following files failed on read and were not converted (" + str(failed_percentage) + "%):")
+            pprint(self.failed_list)
 
-        print("The following files failed on read and were not converted (" + str(failed_percentage) + "%):")
-        pprint(self.failed_list)
+        return self.failed_list
 
 #------------------------------------------------------------------------------#
 ## Convert parquet schema to pandas
@@ -233,6 +873,22 @@ class daskTools():
 
         self.pd_dict = pd_dict
 
+#------------------------------------------------------------------------------#
+## Empty dataframe with the columns and dtypes of the converted files
+    def __meta(self):
+        """Metadata of the dask dataframes: the dataframes of read_argo_files,
+        with the categories of the dictionary columns left unknown as they
+        change from file to file"""
+
+        meta = pd.DataFrame({c: pd.Series(dtype=t) for c, t in self.pd_dict.items()})
+        meta = meta.reindex( columns=self.VARS )
+
+        dictionary = [f.name for f in self.schema if pa.types.is_dictionary(f.type)]
+        if len(dictionary) > 0:
+            meta = clear_known_categories(meta.astype({c: "category" for c in dictionary}), cols=dictionary)
+
+        return meta
+
 #------------------------------------------------------------------------------#
 ## Convert pyarrow datatypes to pandas datatype
     def __pa2pd(self,pa_dtype):
@@ -264,9 +920,25 @@ class daskTools():
         elif pa.types.is_string(pa_dtype):
             return pd.StringDtype()
 
+        elif pa.types.is_dictionary(pa_dtype):
+            # dictionary encoded in the parquet files only
+            return self.__pa2pd(pa_dtype.value_type)
+
         else:
             return pa_dtype.to_pandas_dtype()
 
+#------------------------------------------------------------------------------#
+## Map pyarrow datatypes to pandas datatypes when converting arrow tables
+    def __pa2pd_mapper(self,pa_dtype):
+        """types_mapper for pyarrow's to_pandas(), returning the same nullable
+        pandas dtypes as __pa2pd() for integers and strings and None (default
+        conversion) otherwise"""
+
+        if pa.types.is_integer(pa_dtype) or pa.types.is_string(pa_dtype):
+            return self.__pa2pd(pa_dtype)
+
+        return None
+
 #------------------------------------------------------------------------------#
 ## Select PHY or BGC variables
     def __assign_vars(self):
@@ -292,37 +964,19 @@ class daskTools():
         ds    -- xarray Argo dataset with <PARAM>_DATA_MODE variables
         """
 
-        nparam = ds.sizes["N_PARAM"]
-        nprof = ds.sizes["N_PROF"]
         nlevels = ds.sizes["N_LEVELS"]
-        for v in self.VARS:
-            if "_DATA_MODE" in v:
-                ds[v] = xr.DataArray(
-                    np.full( (nprof,nlevels), "", dtype=str ),
-                    dims=["N_PROF","N_LEVELS"]
-                )
-
-        parameter = ds["PARAMETER"].isel(N_CALIB=0)
-        skipped_params = []
-        for p in range(nparam):
-            for j in range(nprof):
-
-                param_name = str(parameter.isel(N_PARAM=p,N_PROF=j).values).strip()
-                if len(param_name) < 1:
-                    continue
-
-                param_data_mode_name = param_name + "_DATA_MODE"
-                if param_data_mode_name not in self.VARS:
-                    if param_data_mode_name not in skipped_params:
-                        skipped_params.append(param_data_mode_name)
-                    continue
-
-                data_mode = str( ds["PARAMETER_DATA_MODE"].isel(N_PARAM=p,N_PROF=j).values ).strip()
-                if len(data_mode) > 1:
-                    raise ValueError("Data mode should be a one-character long string.")
-
-                for k in range(nlevels):
-                    ds[param_data_mode_name][j,k] = data_mode
+
+        data_modes, skipped_params = aa.profile_data_modes(
+            ds["PARAMETER"].isel(N_CALIB=0).transpose("N_PROF","N_PARAM").values,
+            ds["PARAMETER_DATA_MODE"].transpose("N_PROF","N_PARAM").values,
+            [v for v in self.VARS if "_DATA_MODE" in v]
+        )
+
+        for v, data_mode in data_modes.items():
+            ds[v] = xr.DataArray(
+                np.repeat( data_mode[:,np.newaxis], nlevels, axis=1 ),
+                dims=["N_PROF","N_LEVELS"]
+            )
 
         if len(skipped_params)>0:
             print("The following parameters were not found in the target variables to be converted, its <PARAM>_DATA_MODE has not been created: ")
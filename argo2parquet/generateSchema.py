@@ -11,6 +11,7 @@
 import argo2parquet.params as params
 import copy
 from datetime import datetime
+import json
 import numpy as np
 import pandas as pd
 import pathlib
@@ -31,12 +32,20 @@ class generateSchema():
     # Constructors/Destructors                                           #
     # ------------------------------------------------------------------ #
 
-    def __init__(self, outdir=None, db=None):
+    def __init__(self, outdir=None, db=None, compact=None, column_encoding=None):
         """Constructor
 
         Arguments:
-        outdir     -- path to directory to output schema
-        db         -- database name to generate schema for
+        outdir          -- path to directory to output schema
+        db              -- database name to generate schema for
+        compact         -- if True, generate the compact schema: data modes
+                           and directions are dictionary encoded, integers
+                           are as narrow as the Argo format allows and the
+                           columns have the encodings in column_encoding
+                           (default: False)
+        column_encoding -- parquet encodings of the compact schema, by column
+                           name or arrow type name (default:
+                           params["column_encoding"])
         """
 
         if outdir is None:
@@ -54,6 +63,16 @@ class generateSchema():
         else:
             self.db = [db]
 
+        if compact is None:
+            self.compact = False
+        else:
+            self.compact = compact
+
+        if column_encoding is None:
+            self.column_encoding = params.params["column_encoding"].copy()
+        else:
+            self.column_encoding = column_encoding
+
         for db in self.db:
             print("Generating " + db + " schema.")
             self.generate_schema(db)
@@ -91,7 +110,7 @@ class generateSchema():
         for p in params_schema:
 
             if p in ['PLATFORM_NUMBER','N_PROF','N_LEVELS','CYCLE_NUMBER']:
-                f = pa.field( p, pa.int64() )
+                f = pa.field( p, self.__integer_type(p) )
 
             elif  '_QC' in p:
                 f = pa.field( p, pa.uint8() )
@@ -103,7 +122,10 @@ class generateSchema():
                 f = pa.field( p, pa.from_numpy_dtype(np.dtype('datetime64[ns]') ) )
 
             elif (p=='DIRECTION') or ('DATA_MODE' in p):
-                f = pa.field( p, pa.string() )
+                if self.compact:
+                    f = pa.field( p, pa.dictionary(pa.int8(), pa.string()) )
+                else:
+                    f = pa.field( p, pa.string() )
 
             else:
                 f = pa.field( p, pa.float32() )
@@ -111,8 +133,45 @@ class generateSchema():
             fields.append(f)
 
         self.schema = pa.schema( fields )
+        if self.compact:
+            encoding = self.__encoding(self.schema)
+            self.schema = self.schema.with_metadata( {"column_encoding": json.dumps(encoding)} )
         self.schema_name = "Argo" + db + "_schema.metadata"
 
+#------------------------------------------------------------------------------#
+## Integer type of the indices
+    def __integer_type(self,p):
+        """Integer type of PLATFORM_NUMBER, N_PROF, N_LEVELS and CYCLE_NUMBER:
+        int64, or in the compact schema the narrowest type that holds the
+        values the Argo format allows (7-digit WMO numbers, cycle numbers and
+        profiles per file well below 32767)"""
+
+        if not self.compact:
+            return pa.int64()
+
+        if p in ['PLATFORM_NUMBER','N_LEVELS']:
+            return pa.int32()
+        else:
+            return pa.int16()
+
+#------------------------------------------------------------------------------#
+## Per-column encodings
+    def __encoding(self,schema):
+        """Resolve column_encoding into the encoding of each column of schema
+
+        Returns:
+        encoding -- dict column name -> parquet encoding
+        """
+
+        encoding = {}
+        for field in schema:
+            if field.name in self.column_encoding:
+                encoding[field.name] = self.column_encoding[field.name]
+            elif str(field.type) in self.column_encoding:
+                encoding[field.name] = self.column_encoding[str(field.type)]
+
+        return encoding
+
 ##########################################################################
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ import sys
 import argparse
 from argo2parquet.argo_download import argo_download
 from argo2parquet.argo_convert import argo_convert
+from argo2parquet.argo_pipeline import argo_pipeline
 import argopy
 import importlib.metadata
 import time
@@ -44,6 +45,153 @@ def main():
         help=" If true (default), the Argo databases are converted to parquet (see --db option to specify only one of them)"
     )
 
+    parser.add_argument(
+        "-i", "--incremental",
+        type=str,
+        default="false",
+        help=" If true, only the floats whose files changed since the previous conversion (as recorded in the conversion manifest) are converted and replaced in the parquet databases"
+    )
+
+    parser.add_argument(
+        "--reader",
+        type=str,
+        default="xarray",
+        help=" Reader of the netCDF files: 'xarray' (default) uses the argo xarray engine, 'arrow' reads the variables straight into arrow arrays"
+    )
+
+    parser.add_argument(
+        "--retry_failed",
+        type=str,
+        default="false",
+        help=" If true, only the files that failed on read in the previous conversion (as recorded in the status manifest) are converted again"
+    )
+
+    parser.add_argument(
+        "--download_mode",
+        type=str,
+        default="process",
+        help=" Downloader of the profile files: 'process' (default) uses a pool of processes, 'async' uses asyncio with a bounded number of concurrent downloads over a pool of keep-alive connections"
+    )
+
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default="dask",
+        help=" Output engine: 'dask' (default) writes each chunk of files through a dask dataframe, 'stream' has each worker stream the tables of its files into long-lived parquet writers with bounded memory"
+    )
+
+    parser.add_argument(
+        "--row_group_size",
+        type=int,
+        default=None,
+        help=" Number of rows per parquet row group with the 'stream' engine (default: 250000)"
+    )
+
+    parser.add_argument(
+        "--layout",
+        type=str,
+        default="flat",
+        help=" Layout of the parquet databases: 'flat' (default) stores all fragments in the same folder, 'partitioned' stores them in hive partitions YEAR=<year>/LAT_TILE=<lat>/LON_TILE=<lon>/"
+    )
+
+    parser.add_argument(
+        "--tile_size",
+        type=int,
+        default=None,
+        help=" Size in degrees of the lat/lon tiles of the 'partitioned' layout (default: 10)"
+    )
+
+    parser.add_argument(
+        "--cluster",
+        type=str,
+        default="none",
+        help=" Comma-separated sort keys used to cluster the rows before they are written, so that row group statistics are tight, e.g. 'time,space,pres' (time bucket, Z-order position, PRES). If 'none' (default), rows are written in reading order"
+    )
+
+    parser.add_argument(
+        "--time_bucket",
+        type=str,
+        default="M",
+        help=" Time buckets used to cluster the rows: 'Y', 'M' (default), 'W' or 'D'"
+    )
+
+    parser.add_argument(
+        "--balance",
+        type=str,
+        default="files",
+        help=" Split of the files among chunks and dask tasks: 'files' (default) makes chunks of a fixed number of files with one task per file, 'bytes' balances chunks and tasks by file size, giving the largest files a task of their own"
+    )
+
+    parser.add_argument(
+        "--n_workers",
+        type=int,
+        default=None,
+        help=" Number of dask workers (default: as many as the available memory and cores allow, see argo_resources.py)"
+    )
+
+    parser.add_argument(
+        "--threads_per_worker",
+        type=int,
+        default=None,
+        help=" Number of threads per dask worker (default: 1)"
+    )
+
+    parser.add_argument(
+        "--memory_limit",
+        type=str,
+        default=None,
+        help=" Memory limit per dask worker, e.g. '5.5GB' (default: available memory split among the workers)"
+    )
+
+    parser.add_argument(
+        "--shared_cluster",
+        type=str,
+        default="false",
+        help=" If true, the Core and BGC databases are converted at the same time on a single dask cluster"
+    )
+
+    parser.add_argument(
+        "--drop_padding",
+        type=str,
+        default="false",
+        help=" If true, the levels that only pad the profiles to the N_LEVELS of their file (all measurements null) are not converted; profiles without any measurement keep their first level"
+    )
+
+    parser.add_argument(
+        "--compact_schema",
+        type=str,
+        default="false",
+        help=" If true, the databases use the compact schema: data modes and directions are dictionary encoded, PLATFORM_NUMBER and N_LEVELS are int32, N_PROF and CYCLE_NUMBER int16, and the float measurements and N_LEVELS have the parquet encodings in params.params['column_encoding'] (an existing database must be converted again from scratch)"
+    )
+
+    parser.add_argument(
+        "--write_profile",
+        type=str,
+        default="none",
+        help=" Write profile of the parquet files, as defined in params.params['write_profiles']: fast-write (lz4), archive (zstd at a high level, the highest on the float measurements) or query-optimized (zstd at a low level, smaller pages and page indexes); none for the pyarrow defaults (snappy)"
+    )
+
+    parser.add_argument(
+        "--summaries",
+        type=str,
+        default="false",
+        help=" If true, gridded summaries (count, sum, sum of squares, min and max of each <PARAM>_ADJUSTED per latitude/longitude cell, month and pressure bin, on the grid of params.params['summary_grid']) are stored to <db_parquet>/<db>/metadata/ after each conversion; incremental conversions only summarize the new and rewritten fragments"
+    )
+
+    parser.add_argument(
+        "--normalized",
+        type=str,
+        default="false",
+        help=" If true, a normalized copy of each database is stored to <db_parquet>/<db>/normalized/ after each conversion: a profile table with one row per profile (position, time, QC flags, direction and data modes) and a levels table with the other columns, keyed by PROFILE_ID = PLATFORM_NUMBER*100000 + N_PROF; incremental conversions only split the new and rewritten fragments"
+    )
+
+    parser.add_argument(
+        "--pipeline",
+        type=str,
+        default="false",
+        help=" If true, each database is converted while it is downloaded: the files are converted in batches as they are downloaded (requires --download and --convert; not supported with --retry_failed or --shared_cluster)"
+    )
+
     parser.add_argument(
         "--gdac_index",
         type=str,
@@ -81,6 +229,13 @@ def main():
 
     download_dbs = args.download
     convert_dbs = args.convert
+    incremental = args.incremental.lower()=="true"
+    cluster = None
+    if args.cluster.lower() not in ["none", "false"]:
+        cluster = args.cluster.lower().split(",")
+    write_profile = None
+    if args.write_profile.lower() != "none":
+        write_profile = args.write_profile.lower()
     gdac_path = args.gdac_index
     outdir_nc = args.db_nc
     outdir_parquet = args.db_parquet
@@ -90,11 +245,28 @@ def main():
     elif isinstance(db, str):
         db = [db]
 
+    if args.pipeline.lower()=="true" and download_dbs.lower()=="true" and convert_dbs.lower()=="true":
+        if args.retry_failed.lower()=="true":
+            parser.error("--retry_failed is not supported with --pipeline true.")
+        if args.shared_cluster.lower()=="true":
+            parser.error("--shared_cluster is not supported with --pipeline true.")
+        pl_start_time = time.time()
+        print("Updating and converting the Argo databases...")
+        print("Destination folders: " + outdir_nc + ", " + outdir_parquet)
+        converter_kwargs = {"reader": args.reader, "engine": args.engine, "row_group_size": args.row_group_size, "layout": args.layout, "tile_size": args.tile_size, "cluster": cluster, "time_bucket": args.time_bucket, "balance": args.balance, "drop_padding": args.drop_padding.lower()=="true", "write_profile": write_profile}
+        argo_pipeline(gdac_path, outdir_nc, db, outdir_parquet, "./schemas/", incremental=incremental, download_mode=args.download_mode, converter_kwargs=converter_kwargs, n_workers=args.n_workers, threads_per_worker=args.threads_per_worker, memory_limit=args.memory_limit, compact_schema=args.compact_schema.lower()=="true", summaries=args.summaries.lower()=="true", normalized=args.normalized.lower()=="true")
+        pl_elapsed_time = time.time() - pl_start_time
+        print("Download and conversion elapsed time: " + str(pl_elapsed_time))
+
+        elapsed_time = time.time() - start_time
+        print("Total elapsed time: " + str(elapsed_time))
+        return
+
     if download_dbs.lower()=="true":
         dl_start_time = time.time()
         print("Updating the Argo databases...")
         print("Destination folder: " + outdir_nc)
-        flist_phy, flist_bgc, metadata_phy, metadata_bgc = argo_download(gdac_path, outdir_nc, db, False)
+        flist_phy, flist_bgc, metadata_phy, metadata_bgc = argo_download(gdac_path, outdir_nc, db, False, download_mode=args.download_mode)
         dl_elapsed_time = time.time() - dl_start_time
         print("Download elapsed time: " + str(dl_elapsed_time))
 
@@ -116,7 +288,7 @@ def main():
         conv_start_time = time.time()
         print("Converting the databases...")
         print("Destination folder: " + outdir_parquet)
-        argo_convert( [flist_phy, flist_bgc], [metadata_phy, metadata_bgc], db, outdir_parquet, "./schemas/")
+        argo_convert( [flist_phy, flist_bgc], [metadata_phy, metadata_bgc], db, outdir_parquet, "./schemas/", incremental=incremental, retry_failed=args.retry_failed.lower()=="true", reader=args.reader, engine=args.engine, row_group_size=args.row_group_size, layout=args.layout, tile_size=args.tile_size, cluster=cluster, time_bucket=args.time_bucket, balance=args.balance, n_workers=args.n_workers, threads_per_worker=args.threads_per_worker, memory_limit=args.memory_limit, shared_cluster=args.shared_cluster.lower()=="true", drop_padding=args.drop_padding.lower()=="true", compact_schema=args.compact_schema.lower()=="true", write_profile=write_profile, summaries=args.summaries.lower()=="true", normalized=args.normalized.lower()=="true")
         conv_elapsed_time = time.time() - conv_start_time
         print("Conversion elapsed time: " + str(conv_elapsed_time))
 
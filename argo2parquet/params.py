@@ -263,3 +263,45 @@ params["ArgoBGC"] = [
     'DOWNWELLING_PAR_ADJUSTED_ERROR',
     'DOWNWELLING_PAR_DATA_MODE',
 ]
+
+# parquet encodings of the columns of the compact schemas (see
+# generateSchema): keys are column names, or arrow type names that apply to
+# every column of that type; the other columns are dictionary encoded
+params["column_encoding"] = {
+    "float": "BYTE_STREAM_SPLIT",
+    "N_LEVELS": "DELTA_BINARY_PACKED",
+}
+
+# named write profiles (see argo_arrow.writer_kwargs): arguments of the
+# parquet writers, on top of the encodings of the schema; compression and
+# compression_level can be given per column, as a dict keyed by column name or
+# arrow type name, with "default" for the other columns
+params["write_profiles"] = {
+    # cheapest codec, for databases that are rewritten often
+    "fast-write": {
+        "compression": "lz4",
+    },
+    # written once and kept: zstd at a high level on the float measurements,
+    # which are most of the database, and room for larger dictionaries
+    "archive": {
+        "compression": "zstd",
+        "compression_level": {"float": 19, "default": 9},
+        "dictionary_pagesize_limit": 4*1024**2,
+    },
+    # written once and read many times: zstd at a level that decompresses
+    # fast, smaller pages and page indexes for the readers that skip pages
+    "query-optimized": {
+        "compression": "zstd",
+        "compression_level": 3,
+        "data_page_size": 256*1024,
+        "write_page_index": True,
+    },
+}
+
+# grid of the summary tables (see argo_summary.py): size in degrees of the
+# latitude/longitude cells, and lower edges in dbar of the pressure bins, the
+# last bin being open
+params["summary_grid"] = {
+    "cell": 5.0,
+    "pres_bins": [0, 10, 20, 30, 50, 75, 100, 125, 150, 200, 250, 300, 400, 500, 600, 700, 800, 900, 1000, 1200, 1400, 1600, 1800, 2000, 2500, 3000, 4000, 5000],
+}
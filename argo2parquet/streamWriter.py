@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+## @file streamWriter.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Thu 07 Nov 2024
+
+##########################################################################
+import os
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+##########################################################################
+
+class streamWriter():
+
+    """class streamWriter:
+    long-lived parquet writer that receives arrow tables one float at a time
+    and writes them out in row groups of fixed size, so that the memory used
+    is bounded by the row group size and not by the number of files
+    """
+
+    # ------------------------------------------------------------------ #
+    # Constructors/Destructors                                           #
+    # ------------------------------------------------------------------ #
+
+    def __init__(self, out_dir, basename, schema, row_group_size=None, row_groups_per_file=None, writer_kwargs=None, sort_by=None):
+        """Constructor
+
+        Arguments:
+        out_dir             -- destination directory of the parquet files
+        basename            -- file names are <basename>_<part>.parquet
+        schema              -- pyarrow schema of the parquet files
+        row_group_size      -- number of rows per row group
+        row_groups_per_file -- number of row groups after which a new file is
+                               started
+        writer_kwargs       -- further arguments to pyarrow.parquet.ParquetWriter
+        sort_by             -- function that sorts a table; if given, rows are
+                               buffered one file at a time (row_groups_per_file
+                               row groups) and sorted before being written
+        """
+
+        self.out_dir = out_dir
+        self.basename = basename
+        self.schema = schema
+
+        if row_group_size is None:
+            self.row_group_size = 250000
+        else:
+            self.row_group_size = row_group_size
+
+        if row_groups_per_file is None:
+            self.row_groups_per_file = 4
+        else:
+            self.row_groups_per_file = row_groups_per_file
+
+        if writer_kwargs is None:
+            self.writer_kwargs = {}
+        else:
+            self.writer_kwargs = writer_kwargs
+
+        self.sort_by = sort_by
+        if self.sort_by is None:
+            self.window = self.row_group_size
+        else:
+            self.window = self.row_group_size*self.row_groups_per_file
+
+        self.buffer = []
+        self.buffer_rows = 0
+        self.writer = None
+        self.fname = None
+        self.part = 0
+        self.file_row_groups = 0
+        self.files = []
+        self.nrows = 0
+
+        Path(self.out_dir).mkdir(parents = True, exist_ok = True)
+
+        pass
+
+    # ------------------------------------------------------------------ #
+    # Methods                                                            #
+    # ------------------------------------------------------------------ #
+
+#------------------------------------------------------------------------------#
+## Add table to the stream
+    def write(self, table):
+        """Buffer a table and write out all the complete row groups
+
+        Arguments:
+        table -- pyarrow table with the writer schema
+        """
+
+        if table.num_rows == 0:
+            return
+
+        self.buffer.append(table)
+        self.buffer_rows += table.num_rows
+
+        if self.buffer_rows >= self.window:
+            buffered = pa.concat_tables(self.buffer)
+            if self.sort_by is not None:
+                buffered = self.sort_by(buffered)
+            nfull = (buffered.num_rows // self.row_group_size)*self.row_group_size
+            for offset in range(0, nfull, self.row_group_size):
+                self.__write_row_group( buffered.slice(offset, self.row_group_size) )
+
+            rest = buffered.slice(nfull)
+            self.buffer = [rest] if rest.num_rows > 0 else []
+            self.buffer_rows = rest.num_rows
+
+#------------------------------------------------------------------------------#
+## Flush buffer and close current file
+    def close(self):
+        """Write the remaining rows and close the current file
+
+        Returns:
+        files -- list of paths to the files written
+        """
+
+        if self.buffer_rows > 0:
+            buffered = pa.concat_tables(self.buffer)
+            if self.sort_by is not None:
+                buffered = self.sort_by(buffered)
+            for offset in range(0, buffered.num_rows, self.row_group_size):
+                self.__write_row_group( buffered.slice(offset, self.row_group_size) )
+            self.buffer = []
+            self.buffer_rows = 0
+
+        self.__close_file()
+
+        return self.files
+
+#------------------------------------------------------------------------------#
+## Write one row group
+    def __write_row_group(self, table):
+        """Write a table as a single row group, opening a new file if needed"""
+
+        if self.writer is None:
+            self.fname = os.path.join(self.out_dir, self.basename + "_" + str(self.part) + ".parquet")
+            self.writer = pq.ParquetWriter(self.fname, self.schema, **self.writer_kwargs)
+
+        self.writer.write_table(table, row_group_size=table.num_rows)
+        self.file_row_groups += 1
+        self.nrows += table.num_rows
+
+        if self.file_row_groups >= self.row_groups_per_file:
+            self.__close_file()
+
+#------------------------------------------------------------------------------#
+## Close current file
+    def __close_file(self):
+        """Close the current file"""
+
+        if self.writer is None:
+            return
+
+        self.writer.close()
+        self.files.append(self.fname)
+
+        self.writer = None
+        self.part += 1
+        self.file_row_groups = 0
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+## @file bench_balance.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Fri 08 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the size-aware balance of daskTools: wall time to convert a set
+# of synthetic profile files whose sizes span two orders of magnitude, as in
+# the GDAC, on a local dask cluster, with chunks of a fixed number of files
+# and with chunks and tasks balanced by bytes. The per-chunk skew estimated
+# from the read time of each file is printed as well.
+#
+# Usage: python bench_balance.py [--nfiles 120] [--nworkers 4] [--chunk 30] [--nlevels 200]
+
+import argparse
+import tempfile
+import time
+import numpy as np
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the size-aware balance of the conversion.")
+    parser.add_argument("--nfiles", type=int, default=120)
+    parser.add_argument("--nworkers", type=int, default=4)
+    parser.add_argument("--chunk", type=int, default=30)
+    parser.add_argument("--nlevels", type=int, default=200)
+    args = parser.parse_args()
+
+    from dask.distributed import Client, LocalCluster
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_file
+
+    # heavy-tailed number of profiles per float: most floats are small, a
+    # few have hundreds of profiles
+    rng = np.random.default_rng(0)
+    nprof = np.clip( rng.lognormal(2.5, 1.5, size=args.nfiles).astype(int), 1, 1000 )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = []
+        for k in range(args.nfiles):
+            wmoid = 1900001 + k
+            fname = tmp_dir + "/dac/aoml/" + str(wmoid) + "/" + str(wmoid) + "_prof.nc"
+            flist.append( write_argo_file(fname, wmoid=wmoid, nprof=int(nprof[k]), nlevels=args.nlevels, seed=k) )
+        schema = generateSchema(outdir=tmp_dir + "/", db="phy")
+
+        print("Files: " + str(args.nfiles) + " PHY files, " + str(nprof.min()) + " to " + str(nprof.max()) + " profiles each")
+        with LocalCluster(n_workers=args.nworkers, threads_per_worker=1, processes=True) as cluster, Client(cluster):
+            # warm up the workers, so that imports do not weigh on the first run
+            daskTools(db_type="PHY", out_dir=tmp_dir + "/warmup/", flist=flist[:args.nworkers], schema_path=schema.schema_fname, reader="arrow").convert_to_parquet()
+
+            for balance in ["files", "bytes"]:
+                converter = daskTools(db_type="PHY", out_dir=tmp_dir + "/" + balance + "/", flist=flist, schema_path=schema.schema_fname, chunk=args.chunk, reader="arrow", balance=balance)
+                start_time = time.time()
+                converter.convert_to_parquet()
+                elapsed_time = time.time() - start_time
+                print(balance + ": " + "{:.1f}".format(elapsed_time) + " s, " + str(len(converter.plan)) + " chunks, " + str(sum(len(tasks) for tasks in converter.plan)) + " tasks")
+                converter.balance_report()
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+## @file bench_bloom.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the membership index on single-float queries of a synthetic
+# database whose rows are clustered in space, so that the PLATFORM_NUMBER
+# ranges of the row groups overlap: row groups skipped by the min/max
+# statistics and by the membership index, and time of the queries with the
+# statistics alone and through argoReader.query
+#
+# Usage: python bench_bloom.py [--nfloats 200] [--nprof 50] [--nlevels 100] [--row_group_size 20000] [--cluster space] [--lookups 20]
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the membership index.")
+    parser.add_argument("--nfloats", type=int, default=200)
+    parser.add_argument("--nprof", type=int, default=50)
+    parser.add_argument("--nlevels", type=int, default=100)
+    parser.add_argument("--row_group_size", type=int, default=20000)
+    parser.add_argument("--cluster", type=str, default="space")
+    parser.add_argument("--lookups", type=int, default=20)
+    args = parser.parse_args()
+
+    import dask
+    import numpy as np
+    import pyarrow.dataset as pds
+    import argo2parquet.argo_bloom as ab
+    import argo2parquet.argo_catalog as ac
+    import argo2parquet.argo_manifest as am
+    from argo2parquet.argoReader import argoReader
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = write_argo_tree(tmp_dir + "/dac", nfloats=args.nfloats, nprof=args.nprof, nlevels=args.nlevels)
+        out_dir = tmp_dir + "/parquet/"
+        with contextlib.redirect_stdout(io.StringIO()), dask.config.set(scheduler="sync"):
+            schema = generateSchema(outdir=tmp_dir + "/schemas/", db="phy")
+            converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream", row_group_size=args.row_group_size, cluster=None if args.cluster.lower() == "none" else args.cluster.split(","))
+            converter.convert_to_parquet()
+            ac.update_catalog(out_dir, "PHY")
+
+        start_time = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            index = ab.update_index(out_dir, "PHY")
+        index_time = time.time() - start_time
+
+        fragments = am.list_fragments(out_dir, "PHY")
+        print("Database: " + str(args.nfloats*args.nprof*args.nlevels) + " rows, " + str(len(fragments)) + " fragments, " + str(len(index["fragment"])) + " row groups, clustered by " + args.cluster)
+        print("membership index built in " + "{:.2f}".format(index_time) + " s")
+
+        reader = argoReader(out_dir, "PHY")
+        dataset = pds.dataset(fragments, format="parquet")
+
+        rng = np.random.default_rng(0)
+        wmoids = 1900001 + rng.integers(args.nfloats, size=args.lookups)
+
+        selected = 0
+        stats = 0
+        stats_time = 0
+        bloom_time = 0
+        for wmoid in wmoids:
+            with contextlib.redirect_stdout(io.StringIO()):
+                s, st, total = reader.bloom_report(int(wmoid))
+            selected += s
+            stats += st
+
+            start_time = time.time()
+            scanned = dataset.to_table(filter=pds.field("PLATFORM_NUMBER") == int(wmoid))
+            stats_time += time.time() - start_time
+
+            start_time = time.time()
+            table = reader.query(floats=[int(wmoid)])
+            bloom_time += time.time() - start_time
+            assert table.num_rows == scanned.num_rows
+
+        print("row groups read per float: " + "{:.1f}".format(stats/args.lookups) + " with the statistics, " + "{:.1f}".format(selected/args.lookups) + " with the membership index, of " + str(total))
+        print("single float: statistics " + "{:.1f}".format(stats_time/args.lookups*1e3) + " ms, membership index " + "{:.1f}".format(bloom_time/args.lookups*1e3) + " ms per query")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+## @file bench_catalog.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the lookups of single floats and cycles in a database of
+# synthetic profile files: filtered scan of the parquet dataset against the
+# reads through the catalog of argoReader, and time to build the catalog
+#
+# Usage: python bench_catalog.py [--nfloats 200] [--nprof 50] [--nlevels 100] [--row_group_size 50000] [--lookups 20] [--cluster time]
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the catalog lookups.")
+    parser.add_argument("--nfloats", type=int, default=200)
+    parser.add_argument("--nprof", type=int, default=50)
+    parser.add_argument("--nlevels", type=int, default=100)
+    parser.add_argument("--row_group_size", type=int, default=50000)
+    parser.add_argument("--lookups", type=int, default=20)
+    parser.add_argument("--cluster", type=str, default=None, help="sort keys of the rows, e.g. time")
+    args = parser.parse_args()
+
+    import dask
+    import numpy as np
+    import pyarrow.parquet as pq
+    import argo2parquet.argo_catalog as ac
+    import argo2parquet.argo_manifest as am
+    from argo2parquet.argoReader import argoReader
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = write_argo_tree(tmp_dir + "/dac", nfloats=args.nfloats, nprof=args.nprof, nlevels=args.nlevels)
+        out_dir = tmp_dir + "/parquet/"
+        with contextlib.redirect_stdout(io.StringIO()), dask.config.set(scheduler="sync"):
+            schema = generateSchema(outdir=tmp_dir + "/schemas/", db="phy")
+            converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream", row_group_size=args.row_group_size, cluster=None if args.cluster is None else args.cluster.split(","))
+            converter.convert_to_parquet()
+
+        fragments = am.list_fragments(out_dir, "PHY")
+        row_groups = sum(pq.ParquetFile(f).metadata.num_row_groups for f in fragments)
+        print("Database: " + str(args.nfloats*args.nprof*args.nlevels) + " rows, " + str(len(fragments)) + " fragments, " + str(row_groups) + " row groups, rows " + ("in file order" if args.cluster is None else "clustered by " + args.cluster))
+
+        start_time = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ac.update_catalog(out_dir, "PHY")
+        print("catalog built in " + "{:.2f}".format(time.time() - start_time) + " s")
+
+        rng = np.random.default_rng(0)
+        wmoids = 1900001 + rng.integers(args.nfloats, size=args.lookups)
+        cycles = 1 + rng.integers(args.nprof, size=args.lookups)
+
+        start_time = time.time()
+        reader = argoReader(out_dir, "PHY")
+        open_time = time.time() - start_time
+
+        queries = {
+            "float": lambda k: ([("PLATFORM_NUMBER", "==", wmoids[k])], (wmoids[k],)),
+            "cycle": lambda k: ([("PLATFORM_NUMBER", "==", wmoids[k]), ("CYCLE_NUMBER", "==", cycles[k])], (wmoids[k], cycles[k])),
+        }
+        for name, query in queries.items():
+            scan_time = 0
+            catalog_time = 0
+            for k in range(args.lookups):
+                filters, key = query(k)
+                start_time = time.time()
+                scanned = pq.ParquetDataset(fragments, filters=filters).read()
+                scan_time += time.time() - start_time
+                start_time = time.time()
+                table = reader.read_float(*key)
+                catalog_time += time.time() - start_time
+                assert table.num_rows == scanned.num_rows
+
+            print("single " + name + ": dataset scan " + "{:.1f}".format(scan_time/args.lookups*1e3) + " ms, catalog " + "{:.1f}".format(catalog_time/args.lookups*1e3) + " ms per lookup (" + str(table.num_rows) + " rows)")
+
+        print("catalog loaded in " + "{:.1f}".format(open_time*1e3) + " ms")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
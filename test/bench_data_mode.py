@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+## @file bench_data_mode.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Mon 04 Nov 2024
+
+##########################################################################
+#
+# Micro-benchmark of the <PARAM>_DATA_MODE expansion on a synthetic Sprof
+# dataset. The element-wise implementation is timed on a subset of the
+# profiles and extrapolated, as its cost is linear in N_PROF.
+#
+# Usage: python bench_data_mode.py [--nprof 500] [--nlevels 1000] [--legacy_nprof 20]
+
+import argparse
+import tempfile
+import time
+from test_data_mode import legacy_assign_data_mode, bgc_converter
+from synthetic import make_parameter_dataset
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of <PARAM>_DATA_MODE expansion.")
+    parser.add_argument("--nprof", type=int, default=500)
+    parser.add_argument("--nlevels", type=int, default=1000)
+    parser.add_argument("--legacy_nprof", type=int, default=20, help="Profiles used to time the element-wise implementation")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        converter = bgc_converter(tmp_dir)
+
+    ds = make_parameter_dataset(nprof=args.nprof, nlevels=args.nlevels)
+    start_time = time.time()
+    out = converter._daskTools__assign_data_mode(ds)
+    vectorized_time = time.time() - start_time
+
+    legacy_nprof = min(args.legacy_nprof, args.nprof)
+    ds_sub = make_parameter_dataset(nprof=legacy_nprof, nlevels=args.nlevels)
+    start_time = time.time()
+    ref = legacy_assign_data_mode(ds_sub, converter.VARS)
+    legacy_time = (time.time() - start_time)*args.nprof/legacy_nprof
+
+    identical = all(
+        out[v].isel(N_PROF=slice(0,legacy_nprof)).values.tobytes() == ref[v].values.tobytes()
+        for v in converter.VARS if "_DATA_MODE" in v
+    )
+
+    print("N_PROF x N_LEVELS: " + str(args.nprof) + " x " + str(args.nlevels))
+    print("Element-wise (extrapolated from " + str(legacy_nprof) + " profiles): " + "{:.2f}".format(legacy_time) + " s")
+    print("Vectorized: " + "{:.4f}".format(vectorized_time) + " s")
+    print("Speedup: " + "{:.0f}".format(legacy_time/vectorized_time) + "x")
+    print("Byte-identical on common profiles: " + str(identical))
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
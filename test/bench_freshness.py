@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+## @file bench_freshness.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Wed 13 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the per-float freshness check of argo_gdac on a synthetic
+# index the size of the PHY one: the legacy check runs more_recent() for each
+# float, a full scan of the index each time, and is timed on --legacy_floats
+# floats and extrapolated; the new check is one groupby max of date_update
+# and a vectorized comparison with the mtimes of the local files.
+#
+# Usage: python bench_freshness.py [--nfloats 20000] [--nprof 150] [--legacy_floats 200]
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the freshness check of the local mirror.")
+    parser.add_argument("--nfloats", type=int, default=20000)
+    parser.add_argument("--nprof", type=int, default=150)
+    parser.add_argument("--legacy_floats", type=int, default=200)
+    args = parser.parse_args()
+
+    import argo2parquet.argo_state as argo_state
+    import argo2parquet.argo_tools as at
+
+    rng = np.random.default_rng(0)
+    wmoids = 1900000 + np.arange(args.nfloats)
+    filepaths = np.array(["aoml/" + str(w) + "/" for w in wmoids])
+    index = pd.DataFrame({
+        "filepath_main": np.repeat(filepaths, args.nprof),
+        "wmoid": np.repeat(wmoids, args.nprof),
+        "date_update": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, args.nfloats*args.nprof), unit="D"),
+    })
+    print("Index: " + str(len(index)) + " rows, " + str(args.nfloats) + " floats")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fnames = []
+        for w in wmoids:
+            fname = os.path.join(tmp_dir, str(w) + "_prof.nc")
+            open(fname, "w").close()
+            fnames.append(fname)
+
+        start_time = time.time()
+        legacy = [at.more_recent(f, w, index) for f, w in zip(fnames[:args.legacy_floats], wmoids)]
+        legacy_time = (time.time() - start_time)*args.nfloats/args.legacy_floats
+
+        start_time = time.time()
+        latest = argo_state.latest_updates(index)
+        exists, newer = argo_state.newer_than_index(fnames, latest)
+        new_time = time.time() - start_time
+
+        assert newer[:args.legacy_floats].tolist() == [bool(r) for r in legacy]
+
+    print("more_recent() per float: " + "{:.1f}".format(legacy_time) + " s (extrapolated from " + str(args.legacy_floats) + " floats)")
+    print("groupby + vectorized mtimes: " + "{:.2f}".format(new_time) + " s")
+    print("Speedup: " + "{:.0f}".format(legacy_time/new_time) + "x")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+## @file bench_gdac_index.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Wed 13 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the GDAC index loading on a synthetic index the size of the
+# PHY one: pandas read_csv with five regex passes (as argo_gdac did before),
+# the single-pass arrow parser, and the cached feather snapshot.
+#
+# Usage: python bench_gdac_index.py [--nfloats 20000] [--nprof 150] [--bgc]
+
+import argparse
+import os
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the GDAC index parser.")
+    parser.add_argument("--nfloats", type=int, default=20000)
+    parser.add_argument("--nprof", type=int, default=150)
+    parser.add_argument("--bgc", action="store_true")
+    args = parser.parse_args()
+
+    import argo2parquet.argo_tools as at
+    from synthetic import write_gdac_index
+    from test_gdac_index import legacy_gdac_index
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        gdac_file = write_gdac_index(os.path.join(tmp_dir, "index.txt"), nfloats=args.nfloats, nprof=args.nprof, bgc=args.bgc)
+        print("Index: " + str(args.nfloats*args.nprof) + " rows, " + "{:.0f}".format(os.path.getsize(gdac_file)/1024**2) + " MB")
+
+        start_time = time.time()
+        legacy_gdac_index(gdac_file)
+        print("read_csv + 5 regex passes: " + "{:.2f}".format(time.time() - start_time) + " s")
+
+        start_time = time.time()
+        at.load_gdac_index(gdac_file)
+        print("arrow parser (and snapshot write): " + "{:.2f}".format(time.time() - start_time) + " s")
+
+        start_time = time.time()
+        at.load_gdac_index(gdac_file)
+        print("cached snapshot: " + "{:.2f}".format(time.time() - start_time) + " s")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+## @file bench_normalize.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the normalized tables on a synthetic database: size of the
+# profile and levels tables against the database, and time of a query of the
+# positions and times of the profiles in a region, and of their levels, from
+# the normalized tables (argoReader.profiles and argoReader.levels) and from
+# the database (argoReader.query)
+#
+# Usage: python bench_normalize.py [--nfloats 200] [--nprof 50] [--nlevels 100] [--compact_schema false] [--repeat 3]
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the normalized tables.")
+    parser.add_argument("--nfloats", type=int, default=200)
+    parser.add_argument("--nprof", type=int, default=50)
+    parser.add_argument("--nlevels", type=int, default=100)
+    parser.add_argument("--compact_schema", type=str, default="false")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    import dask
+    import argo2parquet.argo_bloom as ab
+    import argo2parquet.argo_catalog as ac
+    import argo2parquet.argo_manifest as am
+    import argo2parquet.argo_normalize as an
+    from argo2parquet.argoReader import argoReader
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = write_argo_tree(tmp_dir + "/dac", nfloats=args.nfloats, nprof=args.nprof, nlevels=args.nlevels)
+        out_dir = tmp_dir + "/parquet/"
+        with contextlib.redirect_stdout(io.StringIO()), dask.config.set(scheduler="sync"):
+            schema = generateSchema(outdir=tmp_dir + "/schemas/", db="phy", compact=args.compact_schema.lower() == "true")
+            converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream")
+            converter.convert_to_parquet()
+            ac.update_catalog(out_dir, "PHY")
+            ab.update_index(out_dir, "PHY")
+
+        start_time = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            an.update_normalized(out_dir, "PHY")
+        split_time = time.time() - start_time
+
+        fragments = am.list_fragments(out_dir, "PHY")
+        size = sum(os.path.getsize(f) for f in fragments)
+        sizes = {t: sum(os.path.getsize(an.normalized_fname(out_dir, f, t)) for f in fragments) for t in ["profiles", "levels"]}
+        print("Database: " + str(args.nfloats*args.nprof*args.nlevels) + " rows, " + "{:.1f}".format(size/1e6) + " MB, " + ("compact" if args.compact_schema.lower() == "true" else "default") + " schema")
+        print("normalized: profiles " + "{:.2f}".format(sizes["profiles"]/1e6) + " MB, levels " + "{:.1f}".format(sizes["levels"]/1e6) + " MB, split in " + "{:.2f}".format(split_time) + " s")
+
+        reader = argoReader(out_dir, "PHY")
+        region = (34, 80, -78, -50)
+        columns = ["PLATFORM_NUMBER", "CYCLE_NUMBER", "N_PROF", "JULD", "LATITUDE", "LONGITUDE"]
+        timings = {"profiles (database)": [], "profiles (normalized)": [], "levels (database)": [], "levels (normalized)": []}
+        for k in range(args.repeat):
+            start_time = time.time()
+            wide = reader.query(region=region, columns=columns).group_by(["PLATFORM_NUMBER", "N_PROF"]).aggregate([])
+            timings["profiles (database)"].append( time.time() - start_time )
+
+            start_time = time.time()
+            profiles = reader.profiles(region=region, columns=columns)
+            timings["profiles (normalized)"].append( time.time() - start_time )
+            assert profiles.num_rows == wide.num_rows
+
+            start_time = time.time()
+            wide = reader.query(region=region, params=["TEMP"])
+            timings["levels (database)"].append( time.time() - start_time )
+
+            start_time = time.time()
+            rows = reader.levels(reader.profiles(region=region), params=["TEMP"])
+            timings["levels (normalized)"].append( time.time() - start_time )
+            assert rows.num_rows == wide.num_rows
+
+        print(str(profiles.num_rows) + " profiles, " + str(rows.num_rows) + " levels in the region")
+        for name, t in timings.items():
+            print(name + ": " + "{:.3f}".format(min(t)) + " s")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
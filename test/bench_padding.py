@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+## @file bench_padding.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the conversion of synthetic profile files padded to the
+# longest profile, keeping or dropping the padding levels: rows written,
+# size of the database, conversion time and time to scan it
+#
+# Usage: python bench_padding.py [--db phy] [--nfloats 20] [--nprof 100] [--nlevels 500] [--padding 0.5] [--reader arrow] [--engine stream]
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of dropping the padding levels.")
+    parser.add_argument("--db", type=str, default="phy")
+    parser.add_argument("--nfloats", type=int, default=20)
+    parser.add_argument("--nprof", type=int, default=100)
+    parser.add_argument("--nlevels", type=int, default=500)
+    parser.add_argument("--padding", type=float, default=0.5)
+    parser.add_argument("--reader", type=str, default="arrow")
+    parser.add_argument("--engine", type=str, default="stream")
+    args = parser.parse_args()
+
+    import dask
+    import pyarrow.parquet as pq
+    import argo2parquet.argo_manifest as am
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_file
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bgc = args.db == "bgc"
+        flist = [
+            write_argo_file(tmp_dir + "/dac/" + str(1900001 + k) + ("_Sprof.nc" if bgc else "_prof.nc"), wmoid=1900001 + k, nprof=args.nprof, nlevels=args.nlevels, bgc=bgc, seed=k, padding=args.padding)
+            for k in range(args.nfloats)
+        ]
+        with contextlib.redirect_stdout(io.StringIO()):
+            schema = generateSchema(outdir=tmp_dir + "/schemas/", db=args.db)
+        print("Files: " + str(args.nfloats) + " " + args.db.upper() + " files, " + str(args.nprof) + " profiles of up to " + str(args.nlevels) + " levels, up to " + "{:.0%}".format(args.padding) + " of padding per profile")
+
+        for drop_padding in [False, True]:
+            out_dir = tmp_dir + "/parquet_" + str(drop_padding) + "/"
+            converter = daskTools(db_type=args.db.upper(), out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader=args.reader, engine=args.engine, drop_padding=drop_padding)
+
+            start_time = time.time()
+            with contextlib.redirect_stdout(io.StringIO()), dask.config.set(scheduler="sync"):
+                converter.convert_to_parquet()
+            convert_time = time.time() - start_time
+
+            fragments = am.list_fragments(out_dir, args.db.upper())
+            nbytes = sum(os.path.getsize(f) for f in fragments)
+            start_time = time.time()
+            table = pq.ParquetDataset(fragments).read(columns=["PLATFORM_NUMBER", "JULD", "PRES_ADJUSTED", "TEMP_ADJUSTED"])
+            scan_time = time.time() - start_time
+
+            print(("padding dropped" if drop_padding else "padding kept") + ": " + str(table.num_rows) + " rows, " + "{:.1f}".format(nbytes/1024**2) + " MB, conversion " + "{:.2f}".format(convert_time) + " s, scan " + "{:.3f}".format(scan_time) + " s")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
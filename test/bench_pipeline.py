@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+## @file bench_pipeline.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the download of a database followed by its conversion,
+# against the pipelined download and conversion, on synthetic profile files
+# served by a local HTTP server that takes --delay seconds per file to
+# stand in for the GDAC
+#
+# Usage: python bench_pipeline.py [--nfloats 40] [--nprof 50] [--nlevels 200] [--delay 0.5] [--nproc 4] [--batch_size 10] [--queue_size 20]
+
+import argparse
+import contextlib
+import functools
+import http.server
+import io
+import os
+import tempfile
+import threading
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the pipelined download and conversion.")
+    parser.add_argument("--nfloats", type=int, default=40)
+    parser.add_argument("--nprof", type=int, default=50)
+    parser.add_argument("--nlevels", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--nproc", type=int, default=4)
+    parser.add_argument("--batch_size", type=int, default=10)
+    parser.add_argument("--queue_size", type=int, default=20)
+    args = parser.parse_args()
+
+    import pandas as pd
+    import argo2parquet.argo_tools as at
+    from argo2parquet.argo_convert import argo_convert
+    from argo2parquet.argo_pipeline import argo_pipeline
+    from conftest import write_index
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_argo_tree(tmp_dir + "/gdac/dac", nfloats=args.nfloats, nprof=args.nprof, nlevels=args.nlevels)
+        floats = [ ("aoml", 1900001 + k, "20200102000000") for k in range(args.nfloats) ]
+
+        class SlowHandler(http.server.SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            def send_head(self):
+                time.sleep(delay)
+                return super().send_head()
+
+        delay = args.delay
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SlowHandler, directory=tmp_dir + "/gdac"))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        dac_url_root = "http://127.0.0.1:" + str(server.server_address[1]) + "/dac/"
+        print("Files: " + str(args.nfloats) + " files, " + str(args.nprof*args.nlevels) + " rows each, " + str(args.delay) + " s per download, " + str(args.nproc) + " concurrent downloads")
+
+        for pipeline in [False, True]:
+            index_dir = tmp_dir + "/index_" + str(pipeline) + "/"
+            save_to = tmp_dir + "/mirror_" + str(pipeline) + "/"
+            out_dir = tmp_dir + "/parquet_" + str(pipeline) + "/"
+            os.makedirs(index_dir)
+            write_index(index_dir, floats)
+
+            start_time = time.time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if pipeline:
+                    argo_pipeline(
+                        index_dir, save_to, ["phy"], out_dir, tmp_dir + "/schemas/", download_mode="async", nproc=args.nproc, dac_url_root=dac_url_root,
+                        batch_size=args.batch_size, queue_size=args.queue_size, converter_kwargs={"reader": "arrow"}, n_workers=1
+                    )
+                else:
+                    _, metadata, fnames = at.argo_gdac(
+                        gdac_path=index_dir, dataset="phy", save_to=save_to, skip_downloads=False, dac_url_root=dac_url_root,
+                        NPROC=args.nproc, verbose=False, checktime=True, download_mode="async"
+                    )
+                    download_time = time.time() - start_time
+                    argo_convert([fnames, []], [metadata, pd.DataFrame()], ["phy"], out_dir, tmp_dir + "/schemas/", reader="arrow", n_workers=1)
+            elapsed_time = time.time() - start_time
+            if pipeline:
+                print("pipelined download and conversion: " + "{:.1f}".format(elapsed_time) + " s")
+            else:
+                print("download then conversion: " + "{:.1f}".format(elapsed_time) + " s (download " + "{:.1f}".format(download_time) + " s, conversion " + "{:.1f}".format(elapsed_time - download_time) + " s)")
+
+        server.shutdown()
+        server.server_close()
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
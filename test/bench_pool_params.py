@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+## @file bench_pool_params.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Fri 08 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the split of the files among processes of
+# convertTools.poolParams: the previous packer, which recomputed the size of
+# a process after each file it assigned, against the heap-based largest-first
+# packing of argo_balance.lpt_bins, on synthetic file sizes
+#
+# Usage: python bench_pool_params.py [--nfiles 20000] [--size_per_proc 40]
+
+import argparse
+import time
+import numpy as np
+##########################################################################
+
+def legacy_pool_chunks(size_flist, size_per_proc, NPROC):
+    """Packing of convertTools.poolParams before argo_balance, kept as
+    reference: alternately takes the largest and the smallest file left until
+    the process is full
+
+    Returns:
+    chunks_ids -- list of lists of file indices
+    unassigned -- number of files left out
+    """
+
+    ids_sort = np.argsort(np.array(size_flist))
+
+    chunks_ids = []
+    x = np.copy(ids_sort)
+
+    for j in range(NPROC):
+        chunk_ids = []
+        chunk_size = 0
+        while ((chunk_size<size_per_proc) and (len(x) > 0)):
+            if len(chunk_ids)%2 == 0:
+                chunk_ids.append(x[-1])
+                x = x[:-1]
+            else:
+                chunk_ids.append(x[0])
+                x = x[1:]
+            chunk_size = sum(np.asarray(size_flist)[chunk_ids])
+        chunks_ids.append(chunk_ids)
+
+    return chunks_ids, len(x)
+
+def report(name, elapsed_time, loads, size_flist, unassigned):
+    """Print planning time, imbalance and spread of the loads of a packing"""
+
+    import argo2parquet.argo_balance as ab
+
+    loads = np.asarray(loads)
+    print(
+        name + ": " + "{:.2f}".format(elapsed_time) + " s, imbalance " + "{:.3f}".format(ab.imbalance(loads, size_flist.max()))
+        + ", process sizes " + "{:.1f}".format(loads.min()) + "-" + "{:.1f}".format(np.median(loads)) + "-" + "{:.1f}".format(loads.max()) + " MB (min-median-max), "
+        + str(unassigned) + " files unassigned"
+    )
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the split of the files among processes.")
+    parser.add_argument("--nfiles", type=int, default=20000)
+    parser.add_argument("--size_per_proc", type=float, default=40)
+    args = parser.parse_args()
+
+    import argo2parquet.argo_balance as ab
+
+    # sizes in MB, from a few KB to a few hundred MB
+    size_flist = np.random.default_rng(0).lognormal(0, 1.5, size=args.nfiles)
+    NPROC = int(np.ceil(size_flist.sum()/args.size_per_proc))
+    size_per_proc = size_flist.sum()/NPROC
+    print("Files: " + str(args.nfiles) + ", " + "{:.0f}".format(size_flist.sum()) + " MB, " + str(NPROC) + " processes")
+
+    start_time = time.time()
+    chunks_ids, unassigned = legacy_pool_chunks(list(size_flist), size_per_proc, NPROC)
+    elapsed_time = time.time() - start_time
+    loads = [size_flist[c].sum() for c in chunks_ids]
+    report("legacy", elapsed_time, loads, size_flist, unassigned)
+
+    start_time = time.time()
+    chunks_ids = ab.lpt_bins(size_flist, NPROC)
+    elapsed_time = time.time() - start_time
+    loads = [size_flist[c].sum() for c in chunks_ids]
+    unassigned = args.nfiles - sum(len(c) for c in chunks_ids)
+    report("lpt", elapsed_time, loads, size_flist, unassigned)
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
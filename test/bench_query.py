@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+## @file bench_query.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Fri 08 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the flat and partitioned layouts, with and without clustering
+# of the rows, for the queries of notebooks/Example_1_Map.ipynb: number of
+# files opened, fraction of row groups pruned and time to read the rows
+# selected by the region and region+time+pressure filters from a synthetic
+# database. The partitioned database is queried with the filters extended by
+# argo_layout.partition_filters().
+#
+# Usage: python bench_query.py [--nfloats 200] [--nprof 250] [--nlevels 100] [--tile_size 10] [--row_group_size 50000] [--time_bucket M] [--repeat 3]
+#
+# Clustering is benchmarked with (time, space, pres) and (space, time, pres)
+# sort keys.
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+import dask
+import pyarrow.dataset as pds
+import pyarrow.parquet as pq
+##########################################################################
+
+QUERIES = {
+    "region": [("LATITUDE",">",34), ("LATITUDE","<",80), ("LONGITUDE",">",-78), ("LONGITUDE","<",-50)],
+    "region+time+pres": [("LATITUDE",">",34), ("LATITUDE","<",80), ("LONGITUDE",">",-78), ("LONGITUDE","<",-50),
+                         ("JULD",">=",datetime(2023,1,1)), ("JULD","<=",datetime(2023,12,31)),
+                         ("PRES_ADJUSTED",">=",100), ("PRES_ADJUSTED","<=",300)],
+}
+
+def run_query(out_dir, schema, filters, repeat):
+    """Read the rows selected by filters, returns files opened, rows and best time"""
+
+    dataset = pds.dataset(out_dir, schema=schema, format="parquet", partitioning="hive")
+    expression = pq.filters_to_expression(filters)
+    nfiles = len(list(dataset.get_fragments(filter=expression)))
+
+    elapsed_time = []
+    for _ in range(repeat):
+        start_time = time.time()
+        table = dataset.to_table(filter=expression)
+        elapsed_time.append( time.time() - start_time )
+
+    return nfiles, table.num_rows, min(elapsed_time)
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the parquet layouts for the notebook queries.")
+    parser.add_argument("--nfloats", type=int, default=200)
+    parser.add_argument("--nprof", type=int, default=250)
+    parser.add_argument("--nlevels", type=int, default=100)
+    parser.add_argument("--tile_size", type=int, default=10)
+    parser.add_argument("--row_group_size", type=int, default=50000)
+    parser.add_argument("--time_bucket", type=str, default="M")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    import argo2parquet.argo_layout as al
+    import argo2parquet.argo_manifest as am
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = write_argo_tree(tmp_dir + "/dac", nfloats=args.nfloats, nprof=args.nprof, nlevels=args.nlevels)
+        schema = generateSchema(outdir=tmp_dir + "/", db="phy")
+
+        results = {}
+        for layout in ["flat", "partitioned"]:
+            for cluster in [None, ["time", "space", "pres"], ["space", "time", "pres"]]:
+                label = layout + ("" if cluster is None else "+" + ",".join(cluster))
+                out_dir = tmp_dir + "/" + label + "/"
+                converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname,
+                                      reader="arrow", engine="stream", layout=layout, tile_size=args.tile_size,
+                                      row_group_size=args.row_group_size, cluster=cluster, time_bucket=args.time_bucket)
+                with dask.config.set(scheduler="processes"):
+                    converter.convert_to_parquet()
+
+                nfragments = len(am.list_fragments(out_dir, "PHY"))
+                pruning = converter.pruning_report(filters=QUERIES)
+                for name, filters in QUERIES.items():
+                    if layout == "partitioned":
+                        result = run_query(out_dir, al.partitioned_schema(converter.schema), al.partition_filters(filters, args.tile_size), args.repeat)
+                    else:
+                        result = run_query(out_dir, converter.schema, filters, args.repeat)
+                    results[(label, name)] = (nfragments,) + result + pruning[name]
+
+        print("Database: " + str(args.nfloats) + " floats, " + str(args.nfloats*args.nprof*args.nlevels) + " rows")
+        for (label, name), (nfragments, nfiles, nrows, elapsed_time, selected, total) in results.items():
+            speedup = results[("flat", name)][3]/elapsed_time
+            print(label + ", " + name + ": " + str(nfiles) + "/" + str(nfragments) + " files opened, "
+                  + "{:.1%}".format(1 - selected/total) + " of " + str(total) + " row groups pruned, "
+                  + str(nrows) + " rows, " + "{:.3f}".format(elapsed_time) + " s (x" + "{:.1f}".format(speedup) + ")")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
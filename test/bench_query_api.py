@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+## @file bench_query_api.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of argoReader.query against the reads of the example notebooks,
+# which open a pyarrow.parquet.ParquetDataset with the filters of each query,
+# on a synthetic database: files opened and time for the queries of
+# notebooks/Example_1_Map.ipynb, and for a region across the antimeridian
+#
+# Usage: python bench_query_api.py [--nfloats 200] [--nprof 250] [--nlevels 100] [--row_group_size 50000] [--cluster space,time,pres] [--layout flat] [--repeat 3]
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from datetime import datetime
+##########################################################################
+
+QUERIES = {
+    "region": {"region": (34, 80, -78, -50)},
+    "region+time+pres": {"region": (34, 80, -78, -50), "time": (datetime(2023,1,1), datetime(2023,12,31)), "pres": (100, 300)},
+    "antimeridian": {"region": (-10, 10, 170, -170)},
+}
+
+def notebook_filters(query):
+    """Filters of a query as written in the notebooks; the antimeridian is
+    crossed with two lists of filters combined with OR"""
+
+    filters = []
+    if "time" in query:
+        filters += [("JULD", ">=", query["time"][0]), ("JULD", "<=", query["time"][1])]
+    if "pres" in query:
+        filters += [("PRES_ADJUSTED", ">=", query["pres"][0]), ("PRES_ADJUSTED", "<=", query["pres"][1])]
+
+    lat_min, lat_max, lon_min, lon_max = query["region"]
+    filters += [("LATITUDE", ">=", lat_min), ("LATITUDE", "<=", lat_max)]
+    if lon_min <= lon_max:
+        return filters + [("LONGITUDE", ">=", lon_min), ("LONGITUDE", "<=", lon_max)]
+
+    return [filters + [("LONGITUDE", ">=", lon_min)], filters + [("LONGITUDE", "<=", lon_max)]]
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the query API.")
+    parser.add_argument("--nfloats", type=int, default=200)
+    parser.add_argument("--nprof", type=int, default=250)
+    parser.add_argument("--nlevels", type=int, default=100)
+    parser.add_argument("--row_group_size", type=int, default=50000)
+    parser.add_argument("--cluster", type=str, default="space,time,pres")
+    parser.add_argument("--layout", type=str, default="flat")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    import dask
+    import pyarrow.parquet as pq
+    import argo2parquet.argo_catalog as ac
+    import argo2parquet.argo_manifest as am
+    from argo2parquet.argoReader import argoReader
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = write_argo_tree(tmp_dir + "/dac", nfloats=args.nfloats, nprof=args.nprof, nlevels=args.nlevels)
+        out_dir = tmp_dir + "/parquet/"
+        cluster = None if args.cluster.lower() == "none" else args.cluster.split(",")
+        with contextlib.redirect_stdout(io.StringIO()), dask.config.set(scheduler="sync"):
+            schema = generateSchema(outdir=tmp_dir + "/schemas/", db="phy")
+            converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream", row_group_size=args.row_group_size, cluster=cluster, layout=args.layout)
+            converter.convert_to_parquet()
+            ac.update_catalog(out_dir, "PHY")
+
+        fragments = am.list_fragments(out_dir, "PHY")
+        print("Database: " + str(args.nfloats*args.nprof*args.nlevels) + " rows, " + str(len(fragments)) + " fragments, " + args.layout + " layout, clustered by " + args.cluster)
+
+        start_time = time.time()
+        reader = argoReader(out_dir, "PHY")
+        print("reader opened in " + "{:.1f}".format((time.time() - start_time)*1e3) + " ms")
+
+        for name, query in QUERIES.items():
+            notebook_time = []
+            query_time = []
+            for _ in range(args.repeat):
+                start_time = time.time()
+                notebook = pq.ParquetDataset(fragments, filters=notebook_filters(query)).read()
+                notebook_time.append( time.time() - start_time )
+
+                start_time = time.time()
+                table = reader.query(**query)
+                query_time.append( time.time() - start_time )
+            assert table.num_rows == notebook.num_rows
+
+            nfiles = len(reader.query_files(**{k: v for k, v in query.items() if k != "pres"}))
+            print(name + ": " + str(table.num_rows) + " rows, notebook read " + "{:.3f}".format(min(notebook_time)) + " s (" + str(len(fragments)) + " files), query " + "{:.3f}".format(min(query_time)) + " s (" + str(nfiles) + " files)")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+## @file bench_read_vars.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Per-file benchmark of the xarray reader of daskTools: time to open a
+# synthetic profile file with the argo xarray engine, which decodes and casts
+# every variable, against opening it with only the variables to convert (see
+# daskTools.open_argo_dataset), and the bytes decoded in each case
+#
+# Usage: python bench_read_vars.py [--db bgc] [--nprof 200] [--nlevels 500] [--nhistory 200] [--repeat 5]
+
+import argparse
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the column-pruned netCDF reads.")
+    parser.add_argument("--db", type=str, default="bgc")
+    parser.add_argument("--nprof", type=int, default=200)
+    parser.add_argument("--nlevels", type=int, default=500)
+    parser.add_argument("--nhistory", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    import xarray as xr
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_file
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        argo_file = write_argo_file(tmp_dir + "/1900001_prof.nc", nprof=args.nprof, nlevels=args.nlevels, nhistory=args.nhistory, bgc=args.db == "bgc")
+        schema = generateSchema(outdir=tmp_dir + "/", db=args.db)
+        converter = daskTools(db_type=args.db.upper(), out_dir=tmp_dir, flist=[], schema_path=schema.schema_fname)
+        print("File: " + args.db.upper() + ", " + str(args.nprof) + " profiles, " + str(args.nlevels) + " levels, " + str(args.nhistory) + " history records")
+
+        openers = {
+            "argo engine, all variables": lambda: xr.open_dataset(argo_file, engine="argo"),
+            "variables to convert only": lambda: converter.open_argo_dataset(argo_file),
+        }
+        for name, opener in openers.items():
+            open_time = 0
+            read_time = 0
+            for _ in range(args.repeat):
+                start_time = time.time()
+                ds = opener()
+                nbytes = sum(ds[v].nbytes for v in ds.variables)
+                open_time += time.time() - start_time
+                invars = list(set(converter.VARS) & set(ds.data_vars))
+                df = ds[invars].to_dataframe().reset_index()
+                read_time += time.time() - start_time
+                ds.close()
+            print(name + ": " + str(len(ds.variables)) + " variables, " + "{:.1f}".format(nbytes/1024**2) + " MB decoded, open " + "{:.3f}".format(open_time/args.repeat) + " s, open and flatten " + "{:.3f}".format(read_time/args.repeat) + " s per file (" + str(len(df)) + " rows)")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
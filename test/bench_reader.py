@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+## @file bench_reader.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Wed 06 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the xarray and arrow readers of daskTools: files per second
+# and peak resident memory to read a set of synthetic profile files. Each
+# reader runs in its own process so that peak memory is not shared.
+# 'arrow-table' reads the arrow tables without converting them to pandas.
+#
+# Usage: python bench_reader.py [--db bgc] [--nfiles 10] [--nprof 200] [--nlevels 500]
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+##########################################################################
+
+def run_reader(reader, db, schema_fname, flist):
+    """Read all files with one reader and print files/sec and peak RSS (MB)"""
+
+    from argo2parquet.daskTools import daskTools
+    import dask
+    import argo2parquet.argo_arrow as aa
+
+    converter = daskTools(db_type=db.upper(), out_dir="./", flist=flist, schema_path=schema_fname, reader=reader.split("-")[0])
+    rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+    start_time = time.time()
+    nrows = 0
+    for f in flist:
+        if reader == "arrow-table":
+            df = aa.read_argo_arrow(f, converter.schema)
+        else:
+            df, _ = dask.compute(*converter.read_argo(f), scheduler="sync")
+        nrows += len(df)
+        del df
+    elapsed_time = time.time() - start_time
+
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+    print("RESULT", len(flist)/elapsed_time, rss_peak - rss_start, nrows)
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the profile file readers.")
+    parser.add_argument("--db", type=str, default="bgc")
+    parser.add_argument("--nfiles", type=int, default=10)
+    parser.add_argument("--nprof", type=int, default=200)
+    parser.add_argument("--nlevels", type=int, default=500)
+    parser.add_argument("--worker", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--files", type=str, nargs="*", help=argparse.SUPPRESS)
+    parser.add_argument("--schema", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_reader(args.worker, args.db, args.schema, args.files)
+        return
+
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = write_argo_tree(tmp_dir, nfloats=args.nfiles, bgc=args.db=="bgc", nprof=args.nprof, nlevels=args.nlevels)
+        schema = generateSchema(outdir=tmp_dir + "/", db=args.db)
+        size = sum(os.path.getsize(f) for f in flist)/1024**2
+
+        print("Files: " + str(args.nfiles) + " " + args.db.upper() + " files, " + "{:.1f}".format(size) + " MB on disk")
+        for reader in ["xarray", "arrow", "arrow-table"]:
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", reader, "--db", args.db, "--schema", schema.schema_fname, "--files"] + flist,
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = [line for line in out.splitlines() if line.startswith("RESULT")][-1].split()
+            print(reader + ": " + "{:.2f}".format(float(result[1])) + " files/s, peak RSS increase " + "{:.0f}".format(float(result[2])) + " MB, " + result[3] + " rows")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
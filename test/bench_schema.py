@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+## @file bench_schema.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the default schema against the compact schema of
+# generateSchema, with and without its per-column encodings: size of the
+# database and time to scan all of its columns, and a few of them
+#
+# Usage: python bench_schema.py [--db bgc] [--nfloats 20] [--nprof 100] [--nlevels 300] [--repeat 3] [--engine stream]
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the compact schema.")
+    parser.add_argument("--db", type=str, default="bgc")
+    parser.add_argument("--nfloats", type=int, default=20)
+    parser.add_argument("--nprof", type=int, default=100)
+    parser.add_argument("--nlevels", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engine", type=str, default="stream")
+    args = parser.parse_args()
+
+    import dask
+    import pyarrow.parquet as pq
+    import argo2parquet.argo_manifest as am
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_file
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bgc = args.db == "bgc"
+        flist = [
+            write_argo_file(tmp_dir + "/dac/" + str(1900001 + k) + ("_Sprof.nc" if bgc else "_prof.nc"), wmoid=1900001 + k, nprof=args.nprof, nlevels=args.nlevels, bgc=bgc, seed=k)
+            for k in range(args.nfloats)
+        ]
+        print("Files: " + str(args.nfloats) + " " + args.db.upper() + " files, " + str(args.nprof) + " profiles of " + str(args.nlevels) + " levels")
+
+        schemas = {
+            "default schema": {},
+            "compact types, default encodings": {"compact": True, "column_encoding": {}},
+            "compact types and encodings": {"compact": True},
+        }
+        for name, schema_kwargs in schemas.items():
+            out_dir = tmp_dir + "/parquet_" + str(len(os.listdir(tmp_dir))) + "/"
+            with contextlib.redirect_stdout(io.StringIO()):
+                schema = generateSchema(outdir=out_dir + "schemas/", db=args.db, **schema_kwargs)
+            converter = daskTools(db_type=args.db.upper(), out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine=args.engine)
+
+            start_time = time.time()
+            with contextlib.redirect_stdout(io.StringIO()), dask.config.set(scheduler="sync"):
+                converter.convert_to_parquet()
+            convert_time = time.time() - start_time
+
+            fragments = am.list_fragments(out_dir, args.db.upper())
+            nbytes = sum(os.path.getsize(f) for f in fragments)
+            columns = ["PLATFORM_NUMBER", "CYCLE_NUMBER", "JULD", "PRES_ADJUSTED", "TEMP_ADJUSTED", "TEMP_DATA_MODE" if bgc else "DATA_MODE"]
+            scan_time = 0
+            columns_time = 0
+            for _ in range(args.repeat):
+                start_time = time.time()
+                table = pq.ParquetDataset(fragments).read()
+                scan_time += time.time() - start_time
+                start_time = time.time()
+                pq.ParquetDataset(fragments).read(columns=columns)
+                columns_time += time.time() - start_time
+
+            print(name + ": " + "{:.1f}".format(nbytes/1024**2) + " MB, conversion " + "{:.2f}".format(convert_time) + " s, scan of all columns " + "{:.3f}".format(scan_time/args.repeat) + " s (" + "{:.1f}".format(table.num_rows*args.repeat/scan_time/1e6) + " Mrows/s), scan of " + str(len(columns)) + " columns " + "{:.3f}".format(columns_time/args.repeat) + " s")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+## @file bench_shared_cluster.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the conversion of the PHY and BGC databases one after the
+# other, each on its own dask cluster, against their conversion at the same
+# time on a single shared cluster, on synthetic profile files
+#
+# Usage: python bench_shared_cluster.py [--nphy 60] [--nbgc 20] [--nprof 50] [--nlevels 200] [--n_workers 2] [--threads_per_worker 2]
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the shared cluster conversion.")
+    parser.add_argument("--nphy", type=int, default=60)
+    parser.add_argument("--nbgc", type=int, default=20)
+    parser.add_argument("--nprof", type=int, default=50)
+    parser.add_argument("--nlevels", type=int, default=200)
+    parser.add_argument("--n_workers", type=int, default=2)
+    parser.add_argument("--threads_per_worker", type=int, default=2)
+    args = parser.parse_args()
+
+    import pandas as pd
+    from argo2parquet.argo_convert import argo_convert
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist_phy = write_argo_tree(tmp_dir + "/dac", nfloats=args.nphy, nprof=args.nprof, nlevels=args.nlevels)
+        flist_bgc = write_argo_tree(tmp_dir + "/dac", nfloats=args.nbgc, nprof=args.nprof, nlevels=args.nlevels, bgc=True, first_wmoid=5900001)
+        print("Files: " + str(args.nphy) + " PHY and " + str(args.nbgc) + " BGC files, " + str(args.nprof*args.nlevels) + " rows each")
+
+        for shared in [False, True]:
+            start_time = time.time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                argo_convert(
+                    [flist_phy, flist_bgc], [pd.DataFrame(), pd.DataFrame()], ["phy", "bgc"], tmp_dir + "/parquet_" + str(shared) + "/", tmp_dir + "/schemas/",
+                    reader="arrow", n_workers=args.n_workers, threads_per_worker=args.threads_per_worker if shared else 1, shared_cluster=shared
+                )
+            elapsed_time = time.time() - start_time
+            print(("shared cluster" if shared else "one cluster per database") + ": " + "{:.1f}".format(elapsed_time) + " s")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
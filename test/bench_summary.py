@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+## @file bench_summary.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the gridded summaries on a synthetic database: time to build
+# them, their size against the size of the database, and time of a map of the
+# mean temperature per cell from the summaries (argoReader.gridded) against a
+# read of the whole database grouped by cell, as in
+# notebooks/Example_1_Map.ipynb
+#
+# Usage: python bench_summary.py [--nfloats 200] [--nprof 50] [--nlevels 100] [--cell 5] [--repeat 3]
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+##########################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the gridded summaries.")
+    parser.add_argument("--nfloats", type=int, default=200)
+    parser.add_argument("--nprof", type=int, default=50)
+    parser.add_argument("--nlevels", type=int, default=100)
+    parser.add_argument("--cell", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    import dask
+    import numpy as np
+    import pyarrow.parquet as pq
+    import argo2parquet.argo_bloom as ab
+    import argo2parquet.argo_catalog as ac
+    import argo2parquet.argo_manifest as am
+    import argo2parquet.argo_summary as asm
+    from argo2parquet.argoReader import argoReader
+    from argo2parquet.daskTools import daskTools
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = write_argo_tree(tmp_dir + "/dac", nfloats=args.nfloats, nprof=args.nprof, nlevels=args.nlevels)
+        out_dir = tmp_dir + "/parquet/"
+        with contextlib.redirect_stdout(io.StringIO()), dask.config.set(scheduler="sync"):
+            schema = generateSchema(outdir=tmp_dir + "/schemas/", db="phy")
+            converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream")
+            converter.convert_to_parquet()
+            ac.update_catalog(out_dir, "PHY")
+            ab.update_index(out_dir, "PHY")
+
+        start_time = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = asm.update_summary(out_dir, "PHY", cell=args.cell)
+        build_time = time.time() - start_time
+
+        fragments = am.list_fragments(out_dir, "PHY")
+        db_size = sum(os.path.getsize(f) for f in fragments)
+        summary_size = os.path.getsize(asm.summary_fname(out_dir, "PHY"))
+        print("Database: " + str(args.nfloats*args.nprof*args.nlevels) + " rows, " + "{:.1f}".format(db_size/1e6) + " MB in " + str(len(fragments)) + " fragments")
+        print("summary: " + str(len(summary)) + " rows, " + "{:.2f}".format(summary_size/1e6) + " MB, built in " + "{:.2f}".format(build_time) + " s")
+
+        reader = argoReader(out_dir, "PHY")
+        scan_time = []
+        summary_time = []
+        for k in range(args.repeat):
+            start_time = time.time()
+            df = pq.ParquetDataset(fragments).read(columns=["LATITUDE", "LONGITUDE", "TEMP_ADJUSTED"]).to_pandas()
+            df["lat_cell"] = np.floor(df["LATITUDE"]/args.cell)*args.cell
+            df["lon_cell"] = np.floor(((df["LONGITUDE"] + 180) % 360 - 180)/args.cell)*args.cell
+            scanned = df.groupby(["lat_cell", "lon_cell"])["TEMP_ADJUSTED"].mean()
+            scan_time.append( time.time() - start_time )
+
+            # the first call loads the summary
+            reader.grid_summary = None
+            start_time = time.time()
+            grid = reader.gridded(["TEMP"])
+            summary_time.append( time.time() - start_time )
+        assert np.allclose(grid["TEMP_ADJUSTED_mean"], scanned.dropna().to_numpy())
+
+        print("map of the mean temperature: scan " + "{:.3f}".format(min(scan_time)) + " s, summary " + "{:.3f}".format(min(summary_time)) + " s (" + str(len(grid)) + " cells)")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
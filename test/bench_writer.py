@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+## @file bench_writer.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Thu 07 Nov 2024
+
+##########################################################################
+#
+# Benchmark of the dask and stream output engines of daskTools: files per
+# second and peak resident memory to convert a set of synthetic profile files
+# with the synchronous scheduler. Each engine runs in its own process so that
+# peak memory is not shared.
+#
+# Usage: python bench_writer.py [--db phy] [--nfiles 40] [--nprof 200] [--nlevels 500] [--chunk 20] [--row_group_size 250000]
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+##########################################################################
+
+def run_engine(engine, db, schema_fname, out_dir, chunk, row_group_size, flist):
+    """Convert all files with one engine and print files/sec and peak RSS (MB)"""
+
+    import dask
+    from argo2parquet.daskTools import daskTools
+
+    converter = daskTools(db_type=db.upper(), out_dir=out_dir, flist=flist, schema_path=schema_fname, chunk=chunk, reader="arrow", engine=engine, row_group_size=row_group_size, ntasks=1)
+    rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+    start_time = time.time()
+    with dask.config.set(scheduler="sync"):
+        converter.convert_to_parquet()
+    elapsed_time = time.time() - start_time
+
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+    print("RESULT", len(flist)/elapsed_time, rss_peak - rss_start)
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the parquet output engines.")
+    parser.add_argument("--db", type=str, default="phy")
+    parser.add_argument("--nfiles", type=int, default=40)
+    parser.add_argument("--nprof", type=int, default=200)
+    parser.add_argument("--nlevels", type=int, default=500)
+    parser.add_argument("--chunk", type=int, default=20)
+    parser.add_argument("--row_group_size", type=int, default=250000)
+    parser.add_argument("--worker", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--files", type=str, nargs="*", help=argparse.SUPPRESS)
+    parser.add_argument("--schema", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--out_dir", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_engine(args.worker, args.db, args.schema, args.out_dir, args.chunk, args.row_group_size, args.files)
+        return
+
+    from argo2parquet.generateSchema import generateSchema
+    from synthetic import write_argo_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flist = write_argo_tree(tmp_dir + "/dac", nfloats=args.nfiles, bgc=args.db=="bgc", nprof=args.nprof, nlevels=args.nlevels)
+        schema = generateSchema(outdir=tmp_dir + "/", db=args.db)
+
+        print("Files: " + str(args.nfiles) + " " + args.db.upper() + " files, " + str(args.nprof*args.nlevels) + " rows each")
+        for engine in ["dask", "stream"]:
+            out_dir = tmp_dir + "/" + engine + "/"
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", engine, "--db", args.db, "--schema", schema.schema_fname, "--out_dir", out_dir,
+                 "--chunk", str(args.chunk), "--row_group_size", str(args.row_group_size), "--files"] + flist,
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = [line for line in out.splitlines() if line.startswith("RESULT")][-1].split()
+            size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(out_dir) for f in fs)/1024**2
+            print(engine + ": " + "{:.2f}".format(float(result[1])) + " files/s, peak RSS increase " + "{:.0f}".format(float(result[2])) + " MB, " + "{:.1f}".format(size) + " MB on disk")
+
+##########################################################################
+
+if __name__ == "__main__":
+    main()
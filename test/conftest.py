@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+## @file conftest.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Tue 12 Nov 2024
+
+##########################################################################
+import functools
+import http.server
+import os
+import pytest
+import threading
+from types import SimpleNamespace
+##########################################################################
+
+INDEX_HEADER = "# Title : Profile directory file of the Argo Global Data Assembly Center\n" + "#\n"*7
+INDEX_COLUMNS = "file,date,latitude,longitude,ocean,profiler_type,institution,date_update\n"
+
+def write_index(index_dir, floats):
+    """Write ar_index_global_prof.txt with two profiles for each (dac, wmoid,
+    date_update) in floats"""
+
+    rows = []
+    for dac, wmoid, date_update in floats:
+        for cycle in [1, 2]:
+            rows.append(dac + "/" + str(wmoid) + "/profiles/R" + str(wmoid) + "_00" + str(cycle) + ".nc,20200101000000,10.0,-30.0,A,851,AO," + date_update)
+
+    with open(os.path.join(index_dir, "ar_index_global_prof.txt"), "w") as f:
+        f.write(INDEX_HEADER + INDEX_COLUMNS + "\n".join(rows) + "\n")
+
+@pytest.fixture
+def gdac(tmp_path):
+    """Local HTTP stand-in for the GDAC serving a fake dac/ tree, with the
+    index of its floats and the list of the paths requested to the server"""
+
+    root = tmp_path / "gdac"
+    floats = []
+    for k, dac in enumerate(["aoml", "coriolis", "aoml"]):
+        wmoid = 1900001 + k
+        folder = root / "dac" / dac / str(wmoid)
+        folder.mkdir(parents=True)
+        (folder / (str(wmoid) + "_prof.nc")).write_bytes(os.urandom(200000 + k))
+        floats.append( (dac, wmoid, "20200102000000") )
+
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    write_index(str(index_dir), floats)
+
+    requests = []
+    class RecordingHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+        def send_head(self):
+            requests.append( (self.command, self.path) )
+            return super().send_head()
+
+    handler = functools.partial(RecordingHandler, directory=str(root))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield SimpleNamespace(
+        url = "http://127.0.0.1:" + str(server.server_address[1]) + "/",
+        root = root,
+        index_dir = str(index_dir) + "/",
+        floats = floats,
+        requests = requests,
+    )
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+## @file synthetic.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Mon 04 Nov 2024
+
+##########################################################################
+#
+# Helpers to generate synthetic Argo profile files (_prof.nc and _Sprof.nc)
+# with the same layout as the GDAC ones, used by tests and benchmarks
+
+import numpy as np
+import netCDF4
+from pathlib import Path
+##########################################################################
+
+FILL_FLOAT = 99999.0
+FILL_INT = 99999
+
+PHY_PARAMS = ["PRES", "TEMP", "PSAL"]
+BGC_PARAMS = ["PRES", "TEMP", "PSAL", "DOXY", "CHLA", "BBP700", "NITRATE"]
+
+#------------------------------------------------------------------------------#
+## Write fixed-width character variable
+def _put_chars(nc, name, dims, values, width):
+    """Write an array of python strings into a netCDF char variable
+
+    Arguments:
+    nc     -- open netCDF4 dataset
+    name   -- variable name
+    dims   -- dimensions of the variable (without the string dimension)
+    values -- numpy array of python strings with shape matching dims
+    width  -- size of the string dimension
+    """
+
+    strdim = "STRING" + str(width)
+    if strdim not in nc.dimensions:
+        nc.createDimension(strdim, width)
+
+    var = nc.createVariable(name, "S1", tuple(dims) + (strdim,), fill_value=b" ")
+    values = np.asarray(values, dtype="U" + str(width))
+    padded = np.char.ljust(values, width).astype("S" + str(width))
+    var[:] = padded.view("S1").reshape(values.shape + (width,))
+
+    return var
+
+#------------------------------------------------------------------------------#
+## Write char variable with one character per element
+def _put_flags(nc, name, dims, values):
+    """Write an array of single characters into a netCDF char variable"""
+
+    var = nc.createVariable(name, "S1", tuple(dims), fill_value=b" ")
+    var[:] = np.asarray(values, dtype="S1")
+
+    return var
+
+#------------------------------------------------------------------------------#
+## Generate a synthetic Argo profile file
+def write_argo_file(path, wmoid=1900001, nprof=10, nlevels=50, bgc=False, seed=0, nhistory=10, padding=0.2):
+    """Write a synthetic Argo profile file
+
+    Arguments:
+    path     -- destination path of the netCDF file
+    wmoid    -- float WMO identifier
+    nprof    -- number of profiles (N_PROF)
+    nlevels  -- number of levels (N_LEVELS)
+    bgc      -- if True, write an Sprof-like file with PARAMETER_DATA_MODE
+    seed     -- seed for the random generator
+    nhistory -- size of the N_HISTORY dimension (variables never converted)
+    padding  -- fraction of levels left as fill values at the bottom of each
+                profile, as in GDAC files padded to the longest profile
+
+    Returns:
+    path -- path to the generated file
+    """
+
+    rng = np.random.default_rng(seed)
+    params = BGC_PARAMS if bgc else PHY_PARAMS
+    nparam = len(params)
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    nc = netCDF4.Dataset(path, "w", format="NETCDF4")
+    nc.setncattr("Conventions", "Argo-3.1 CF-1.6")
+    nc.set_auto_mask(False)
+
+    nc.createDimension("N_PROF", nprof)
+    nc.createDimension("N_LEVELS", nlevels)
+    nc.createDimension("N_PARAM", nparam)
+    nc.createDimension("N_CALIB", 1)
+    nc.createDimension("N_HISTORY", nhistory)
+
+    _put_chars(nc, "PLATFORM_NUMBER", ["N_PROF"], np.full(nprof, str(wmoid)), 8)
+    cyc = nc.createVariable("CYCLE_NUMBER", "i4", ("N_PROF",), fill_value=FILL_INT)
+    cyc.setncattr("conventions", "0...N, 0 : launch cycle (if exists), 1 : first complete cycle")
+    cyc[:] = np.arange(1, nprof + 1)
+    _put_flags(nc, "DIRECTION", ["N_PROF"], rng.choice(["A", "D"], size=nprof, p=[0.9, 0.1]))
+    _put_flags(nc, "DATA_MODE", ["N_PROF"], rng.choice(["R", "A", "D"], size=nprof))
+
+    juld = nc.createVariable("JULD", "f8", ("N_PROF",), fill_value=FILL_FLOAT)
+    juld.setncattr("units", "days since 1950-01-01 00:00:00 UTC")
+    juld.setncattr("conventions", "Relative julian days with decimal part (as parts of day)")
+    juld[:] = 25000.0 + 10.0*np.arange(nprof) + rng.random(nprof)
+    _put_flags(nc, "JULD_QC", ["N_PROF"], np.full(nprof, "1"))
+
+    lat = nc.createVariable("LATITUDE", "f8", ("N_PROF",), fill_value=FILL_FLOAT)
+    lat[:] = np.clip(rng.uniform(-60, 60) + np.cumsum(rng.normal(0, 0.5, nprof)), -89.0, 89.0)
+    lon = nc.createVariable("LONGITUDE", "f8", ("N_PROF",), fill_value=FILL_FLOAT)
+    lon[:] = (rng.uniform(-180, 180) + np.cumsum(rng.normal(0, 0.5, nprof)) + 180.0) % 360.0 - 180.0
+    _put_flags(nc, "POSITION_QC", ["N_PROF"], np.full(nprof, "1"))
+
+    # profiles are padded with fill values up to N_LEVELS
+    nvalid = np.maximum(1, (nlevels*(1 - padding*rng.random(nprof))).astype(int))
+    valid = np.arange(nlevels)[None, :] < nvalid[:, None]
+
+    for p in params:
+        base = np.linspace(0, 2000, nlevels)[None, :] + rng.normal(0, 1, (nprof, nlevels))
+        for suffix in ["", "_ADJUSTED", "_ADJUSTED_ERROR"]:
+            var = nc.createVariable(p + suffix, "f4", ("N_PROF", "N_LEVELS"), fill_value=FILL_FLOAT)
+            var[:] = np.where(valid, base, FILL_FLOAT).astype("f4")
+        for suffix in ["_QC", "_ADJUSTED_QC"]:
+            flags = np.where(valid, rng.choice(["1", "2", "3", "4"], size=(nprof, nlevels)), " ")
+            _put_flags(nc, p + suffix, ["N_PROF", "N_LEVELS"], flags)
+        if bgc and p != "PRES":
+            var = nc.createVariable(p + "_dPRES", "f4", ("N_PROF", "N_LEVELS"), fill_value=FILL_FLOAT)
+            var[:] = np.where(valid, rng.normal(0, 1, (nprof, nlevels)), FILL_FLOAT).astype("f4")
+
+    # variables that are never converted
+    _put_chars(nc, "HISTORY_INSTITUTION", ["N_HISTORY", "N_PROF"], np.full((nhistory, nprof), "AO"), 4)
+    _put_chars(nc, "HISTORY_SOFTWARE", ["N_HISTORY", "N_PROF"], np.full((nhistory, nprof), "SOFT"), 4)
+    hist = nc.createVariable("HISTORY_START_PRES", "f4", ("N_HISTORY", "N_PROF"), fill_value=FILL_FLOAT)
+    hist[:] = rng.random((nhistory, nprof))
+
+    parameter = np.tile(np.array(params)[None, None, :], (nprof, 1, 1))
+    _put_chars(nc, "PARAMETER", ["N_PROF", "N_CALIB", "N_PARAM"], parameter, 64)
+    _put_chars(nc, "SCIENTIFIC_CALIB_COMMENT", ["N_PROF", "N_CALIB", "N_PARAM"], np.full((nprof, 1, nparam), "none"), 256)
+    if bgc:
+        _put_flags(nc, "PARAMETER_DATA_MODE", ["N_PROF", "N_PARAM"], rng.choice(["R", "A", "D"], size=(nprof, nparam)))
+
+    nc.close()
+
+    return path
+
+#------------------------------------------------------------------------------#
+## Generate a synthetic GDAC tree
+def write_argo_tree(root, nfloats=5, bgc=False, nprof=10, nlevels=50, dac="aoml", first_wmoid=1900001):
+    """Write a set of synthetic profile files with the GDAC path structure
+
+    Arguments:
+    root        -- root folder, files are stored as <root>/<dac>/<wmoid>/<wmoid>_prof.nc
+    nfloats     -- number of floats
+    bgc         -- if True, write Sprof files
+    nprof       -- number of profiles per float
+    nlevels     -- number of levels per profile
+    dac         -- name of the data assembly center folder
+    first_wmoid -- WMO identifier of the first float
+
+    Returns:
+    flist -- list of paths to the generated files
+    """
+
+    ext = "_Sprof.nc" if bgc else "_prof.nc"
+    flist = []
+    for k in range(nfloats):
+        wmoid = first_wmoid + k
+        fname = str(Path(root, dac, str(wmoid), str(wmoid) + ext))
+        write_argo_file(fname, wmoid=wmoid, nprof=nprof, nlevels=nlevels, bgc=bgc, seed=k)
+        flist.append(fname)
+
+    return flist
+
+#------------------------------------------------------------------------------#
+## Generate a synthetic GDAC index file
+def write_gdac_index(path, nfloats=100, nprof=30, bgc=False, seed=0):
+    """Write a synthetic ar_index_global_prof.txt (or, if bgc,
+    argo_synthetic-profile_index.txt) with the header and line format of the
+    GDAC ones
+
+    Arguments:
+    path    -- destination file
+    nfloats -- number of floats
+    nprof   -- number of profiles per float
+    bgc     -- if True, write the synthetic-profile index format
+    seed    -- seed for the random generator
+
+    Returns:
+    path -- path to the file
+    """
+
+    rng = np.random.default_rng(seed)
+    n = nfloats*nprof
+    dacs = np.array(["aoml", "coriolis", "csiro", "jma", "bodc"])
+    wmoid = (1900000 + rng.permutation(nfloats*10)[:nfloats]).astype(str)
+    wmoid = np.repeat(wmoid, nprof)
+    dac = np.repeat(dacs[rng.integers(0, len(dacs), nfloats)], nprof)
+    cycle = np.char.zfill(np.tile(np.arange(1, nprof + 1), nfloats).astype(str), 3)
+    prefix = rng.choice(["SR", "SD"] if bgc else ["R", "D"], size=n)
+    suffix = rng.choice(["", "D"], size=n, p=[0.95, 0.05])
+    files = dac.astype(object) + "/" + wmoid + "/profiles/" + prefix + wmoid + "_" + cycle + suffix + ".nc"
+
+    seconds = rng.integers(0, 25*365*86400, n).astype("timedelta64[s]")
+    date = (np.datetime64("2000-01-01T00:00:00") + seconds).astype(str)
+    date = np.char.replace(np.char.replace(np.char.replace(date, "-", ""), "T", ""), ":", "")
+    date_update = (np.datetime64("2020-01-01T00:00:00") + seconds//4).astype(str)
+    date_update = np.char.replace(np.char.replace(np.char.replace(date_update, "-", ""), "T", ""), ":", "")
+    latitude = np.char.mod("%.3f", rng.uniform(-80, 80, n)).astype(object)
+    longitude = np.char.mod("%.3f", rng.uniform(-180, 180, n)).astype(object)
+    missing = rng.random(n) < 0.01
+    latitude[missing] = ""
+    longitude[missing] = ""
+    ocean = rng.choice(["A", "I", "P"], size=n)
+    profiler = rng.choice(["845", "846", "851"], size=n)
+    institution = rng.choice(["AO", "IF", "CS"], size=n)
+
+    columns = [files, date, latitude, longitude, ocean, profiler, institution]
+    header = "file,date,latitude,longitude,ocean,profiler_type,institution"
+    if bgc:
+        columns += [rng.choice(["PRES TEMP PSAL", "PRES TEMP PSAL DOXY", "PRES TEMP PSAL DOXY CHLA BBP700"], size=n),
+                    rng.choice(["RRR", "RRRA", "DDDAAR"], size=n)]
+        header += ",parameters,parameter_data_mode"
+    columns.append(date_update)
+    header += ",date_update"
+
+    lines = columns[0].astype(object)
+    for column in columns[1:]:
+        lines = lines + "," + np.asarray(column).astype(object)
+
+    with open(path, "w") as f:
+        f.write("# Title : Profile directory file of the Argo Global Data Assembly Center\n")
+        for k in range(7):
+            f.write("#\n")
+        f.write(header + "\n")
+        f.write("\n".join(lines) + "\n")
+
+    return path
+
+#------------------------------------------------------------------------------#
+## Generate an in-memory dataset with the BGC parameter variables only
+def make_parameter_dataset(nprof=500, nlevels=1000, params=None, seed=0):
+    """Build an xarray dataset holding PARAMETER and PARAMETER_DATA_MODE as
+    returned by the argo engine for an Sprof file
+
+    Arguments:
+    nprof   -- number of profiles (N_PROF)
+    nlevels -- number of levels (N_LEVELS)
+    params  -- list of parameter names in the N_PARAM slots (BGC_PARAMS if None)
+    seed    -- seed for the random generator
+
+    Returns:
+    ds -- xarray dataset
+    """
+
+    import xarray as xr
+
+    rng = np.random.default_rng(seed)
+    if params is None:
+        params = BGC_PARAMS
+    nparam = len(params)
+
+    parameter = np.tile(np.array(params, dtype="U64")[None, None, :], (nprof, 1, 1))
+    parameter = np.char.ljust(parameter, 64)
+    data_mode = rng.choice(["R", "A", "D"], size=(nprof, nparam)).astype("U1")
+
+    ds = xr.Dataset(
+        {
+            "PRES": (["N_PROF", "N_LEVELS"], np.zeros((nprof, nlevels), dtype="f4")),
+            "PARAMETER": (["N_PROF", "N_CALIB", "N_PARAM"], parameter),
+            "PARAMETER_DATA_MODE": (["N_PROF", "N_PARAM"], data_mode),
+        }
+    )
+
+    return ds
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+## @file test_arrow_reader.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Wed 06 Nov 2024
+
+##########################################################################
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import dask
+import pyarrow as pa
+import pytest
+import xarray as xr
+from synthetic import write_argo_file
+##########################################################################
+
+@pytest.mark.parametrize("db", ["phy", "bgc"])
+def test_arrow_reader_matches_xarray(tmp_path, db):
+
+    bgc = db == "bgc"
+    argo_file = write_argo_file(str(tmp_path / "1900001_prof.nc"), nprof=5, nlevels=8, bgc=bgc)
+    schema = generateSchema(outdir=str(tmp_path) + "/", db=db)
+
+    tables = {}
+    for reader in ["xarray", "arrow"]:
+        converter = daskTools(db_type=db.upper(), out_dir=str(tmp_path), flist=[], schema_path=schema.schema_fname, reader=reader)
+        df, _ = dask.compute(*converter.read_argo(argo_file), scheduler="sync")
+        tables[reader] = pa.Table.from_pandas(df, schema=converter.schema, preserve_index=False)
+
+    assert tables["arrow"].num_rows == 5*8
+    for name in tables["xarray"].schema.names:
+        assert tables["arrow"][name].equals(tables["xarray"][name]), name
+
+@pytest.mark.parametrize("db", ["phy", "bgc"])
+def test_pruned_dataset_matches_argo_engine(tmp_path, db):
+
+    argo_file = write_argo_file(str(tmp_path / "1900001_prof.nc"), nprof=5, nlevels=8, bgc=db == "bgc")
+    schema = generateSchema(outdir=str(tmp_path) + "/", db=db)
+    converter = daskTools(db_type=db.upper(), out_dir=str(tmp_path), flist=[], schema_path=schema.schema_fname)
+
+    ds = converter.open_argo_dataset(argo_file)
+    ds_full = xr.open_dataset(argo_file, engine="argo")
+
+    assert set(ds.data_vars) < set(ds_full.data_vars)
+    assert not any(v.startswith("HISTORY_") or v.startswith("SCIENTIFIC_CALIB_") for v in ds.data_vars)
+    for v in ds.data_vars:
+        assert ds[v].dtype == ds_full[v].dtype, v
+        xr.testing.assert_equal(ds[v], ds_full[v])
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+## @file test_async_download.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Mon 11 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_tools as at
+from argo2parquet.argo_async import download_files_async
+import filecmp
+import glob
+import os
+##########################################################################
+
+def test_download_files_async(gdac, tmp_path):
+
+    url, root = gdac.url, gdac.root
+    remote = sorted(glob.glob(str(root / "dac/*/*/*_prof.nc")))
+    urls = [url + os.path.relpath(f, root) for f in remote] + [url + "dac/aoml/0/0_prof.nc"]
+    local_dir = tmp_path / "local"
+    local_dir.mkdir()
+    localfiles = [str(local_dir / os.path.basename(u)) for u in urls]
+
+    downloaded = download_files_async(urls, localfiles, concurrency=2, verbose=False)
+    assert downloaded == [True]*len(remote) + [False]
+    for f, r in zip(localfiles, remote):
+        assert filecmp.cmp(f, r, shallow=False)
+    assert glob.glob(str(local_dir / ".*.part")) == []
+
+    # local copies are newer than the remote files: nothing is downloaded
+    assert download_files_async(urls[:-1], localfiles[:-1], concurrency=2, verbose=False) == [False]*len(remote)
+
+    # the remote file is updated
+    with open(remote[0], "ab") as f:
+        f.write(b"update")
+    os.utime(localfiles[0], (0, 0))
+    assert download_files_async(urls[:-1], localfiles[:-1], concurrency=2, verbose=False) == [True] + [False]*(len(remote)-1)
+    assert filecmp.cmp(localfiles[0], remote[0], shallow=False)
+
+def test_argo_gdac_async(gdac, tmp_path):
+
+    url, root, index_dir = gdac.url, gdac.root, gdac.index_dir
+    save_to = str(tmp_path / "mirror") + "/"
+
+    wmoids, metadata, fnames = at.argo_gdac(
+        gdac_path=index_dir, dataset="phy", save_to=save_to, skip_downloads=False,
+        dac_url_root=url + "dac/", NPROC=4, verbose=False, checktime=True, download_mode="async"
+    )
+
+    assert sorted(wmoids) == [1900001, 1900002, 1900003]
+    for f in fnames:
+        assert filecmp.cmp(f, str(root / "dac" / os.path.relpath(f, save_to)), shallow=False)
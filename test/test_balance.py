@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+## @file test_balance.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Fri 08 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_balance as ab
+import argo2parquet.argo_manifest as am
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+def test_lpt_bins_assigns_every_item():
+
+    sizes = np.random.default_rng(0).lognormal(10, 2, size=1000)
+    bins = ab.lpt_bins(sizes, 16)
+
+    assert len(bins) == 16
+    assert sorted(k for b in bins for k in b) == list(range(1000))
+    # LPT is within 4/3 of the optimum, which is at least the mean load
+    loads = [sizes[b].sum() for b in bins]
+    assert ab.imbalance(loads) <= 4/3 or max(loads) == sizes.max()
+
+    assert ab.lpt_bins([5, 1], 4) == [[0], [1], [], []]
+    assert ab.imbalance([]) == 1.0 and ab.imbalance([2, 2]) == 1.0
+
+def test_plan_chunks_isolates_large_files():
+
+    sizes = np.array([1000] + [10]*99 + [800])
+    plan = ab.plan_chunks(sizes, nchunks=2, ntasks=4)
+
+    assert len(plan) == 2
+    assert sorted(k for tasks in plan for t in tasks for k in t) == list(range(101))
+    # the two large files end up in different chunks, in tasks of their own,
+    # which are scheduled first
+    for tasks in plan:
+        assert tasks[0] in ([0], [100])
+        assert all(len(t) > 1 for t in tasks[1:])
+
+    chunk_bytes = [sum(sizes[t].sum() for t in tasks) for tasks in plan]
+    assert ab.imbalance(chunk_bytes) < 1.1
+
+def test_plan_skew():
+
+    # one long file at the end of a chunk keeps a worker busy after the others
+    plan = ab.plan_fixed(4, 4)
+    wall, skew = ab.plan_skew(plan, [1, 1, 1, 3], 2)
+    assert wall[0] == 4 and skew[0] == pytest.approx(4/3)
+
+    wall, skew = ab.plan_skew([[[3], [0, 1, 2]]], [1, 1, 1, 3], 2)
+    assert wall[0] == 3 and skew[0] == 1
+
+@pytest.mark.parametrize("engine", ["dask", "stream"])
+def test_balanced_conversion(tmp_path, engine):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=6, nprof=2, nlevels=5)
+    write_argo_file(flist[3], wmoid=1900004, nprof=40, nlevels=5)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+
+    tables = {}
+    for balance in ["files", "bytes"]:
+        out_dir = str(tmp_path / balance) + "/"
+        converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, chunk=3, engine=engine, reader="arrow", ntasks=2, balance=balance)
+        converter.convert_to_parquet()
+
+        assert sorted(f for tasks in converter.plan for files in tasks for f in files) == sorted(flist)
+        assert len(converter.status) == len(flist)
+
+        table = pq.ParquetDataset(am.list_fragments(out_dir, "PHY"), schema=converter.schema).read()
+        tables[balance] = table.sort_by([("PLATFORM_NUMBER", "ascending"), ("N_PROF", "ascending"), ("N_LEVELS", "ascending")])
+
+        report = converter.balance_report()
+        assert set(report) == {"files", "bytes"}
+
+    if engine == "dask":
+        # the large float has a task of its own
+        assert [flist[3]] in converter.plan[0] + converter.plan[1]
+
+    assert tables["bytes"].equals(tables["files"])
+
+def test_invalid_balance(tmp_path):
+
+    schema = generateSchema(outdir=str(tmp_path) + "/", db="phy")
+    with pytest.raises(ValueError):
+        daskTools(db_type="PHY", out_dir=str(tmp_path), flist=[], schema_path=schema.schema_fname, balance="rows")
+
+def test_pool_params_assigns_every_file(tmp_path):
+
+    from argo2parquet.convertTools import convertTools
+
+    rng = np.random.default_rng(1)
+    flist = []
+    for k, size in enumerate( (rng.lognormal(0, 2, size=200)*1024**2/20).astype(int) ):
+        fname = tmp_path / (str(1900001 + k) + "_prof.nc")
+        fname.write_bytes(b"\0"*size)
+        flist.append(str(fname))
+
+    converter = convertTools(db_type="PHY", out_dir=str(tmp_path / "parquet") + "/", flist=flist)
+    NPROC, chunks, size_per_proc = converter.poolParams(5)
+
+    assert NPROC == len(chunks)
+    assert sorted(f for chunk in chunks for f in chunk) == sorted(flist)
+    assert converter.imbalance < 1.5
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+## @file test_bloom.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_bloom as ab
+import argo2parquet.argo_catalog as ac
+import argo2parquet.argo_manifest as am
+from argo2parquet.argoReader import argoReader
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import numpy as np
+import os
+import pyarrow.parquet as pq
+from synthetic import write_argo_tree
+##########################################################################
+
+def test_bloom_filters():
+
+    rng = np.random.default_rng(0)
+    values = 1900000 + rng.integers(100000, size=500)
+    bits = np.stack([ab.bloom_bits(values), ab.bloom_bits(values[:10])])
+
+    # no false negatives, few false positives
+    assert ab.might_contain(bits[:1], values).all()
+    assert all(ab.might_contain(bits, [v])[0] for v in values)
+    others = np.setdiff1d(np.arange(2000000, 2010000), values)
+    assert np.mean([ab.might_contain(bits[:1], [v])[0] for v in others]) < 0.01
+    assert ab.might_contain(bits[1:], values[:10]).all()
+
+def test_bloom_queries(tmp_path):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=12, nprof=10, nlevels=10)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream", row_group_size=50, cluster=["time"])
+    converter.convert_to_parquet()
+    ac.update_catalog(out_dir, "PHY")
+    index = ab.update_index(out_dir, "PHY")
+    assert os.path.isfile(out_dir + "metadata/ArgoPHY_bloom.npz")
+
+    fragments = am.list_fragments(out_dir, "PHY")
+    assert len(index["fragment"]) == sum(pq.ParquetFile(f).metadata.num_row_groups for f in fragments)
+
+    # unchanged fragments are not indexed again
+    previous = ab.load_index(out_dir, "PHY")
+    _, nindexed = ab.build_index(out_dir, "PHY", previous=previous)
+    assert nindexed == 0
+
+    df = pq.ParquetDataset(fragments).read().to_pandas()
+    reader = argoReader(out_dir, "PHY")
+    for wmoid in [1900001, 1900006, 1900012]:
+        # every row group of the float is kept
+        row_groups = reader.bloom_row_groups([wmoid])
+        for (fname, row_group), _ in reader.lookup(wmoid).groupby(["file", "row_group"]):
+            assert row_group in row_groups[fname]
+
+        assert reader.query(floats=[wmoid]).num_rows == (df["PLATFORM_NUMBER"] == wmoid).sum() > 0
+        selected, stats, total = reader.bloom_report(wmoid)
+        assert selected <= stats <= total and selected < total
+
+    selected, _, _ = reader.bloom_report(1900003, 4)
+    assert selected <= reader.bloom_report(1900003)[0]
+
+    # fragments changed after indexing are read whole
+    os.utime(fragments[0], (0, 0))
+    assert reader.query(floats=[1900002, 1900009]).num_rows == df["PLATFORM_NUMBER"].isin([1900002, 1900009]).sum()
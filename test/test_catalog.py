@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+## @file test_catalog.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_catalog as ac
+import argo2parquet.argo_manifest as am
+from argo2parquet.argoReader import argoReader
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import os
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+def scan(out_dir, platform_number, cycle_number=None):
+    """Rows of a float read by scanning the whole database"""
+
+    filters = [("PLATFORM_NUMBER", "==", platform_number)]
+    if cycle_number is not None:
+        filters.append(("CYCLE_NUMBER", "==", cycle_number))
+
+    return pq.ParquetDataset(am.list_fragments(out_dir, "PHY"), filters=filters).read()
+
+def sort(table):
+
+    return table.sort_by([(k, "ascending") for k in ["PLATFORM_NUMBER", "N_PROF", "N_LEVELS"]])
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_catalog_lookups(tmp_path, compact):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=5, nprof=4, nlevels=10)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy", compact=compact)
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream", row_group_size=25, cluster=["time"])
+    converter.convert_to_parquet()
+
+    catalog = ac.update_catalog(out_dir, "PHY")
+    assert os.path.isfile(out_dir + "metadata/ArgoPHY_catalog.parquet")
+    assert catalog.groupby(["PLATFORM_NUMBER", "CYCLE_NUMBER"]).ngroups == 5*4
+    assert catalog["rows"].sum() == 5*4*10
+    # clustering by time spreads the cycles of a float across row groups
+    assert catalog.groupby("PLATFORM_NUMBER")["row_group"].nunique().max() > 1
+
+    reader = argoReader(out_dir, "phy")
+    for wmoid in [1900001, 1900003]:
+        assert sort(reader.read_float(wmoid)).equals(sort(scan(out_dir, wmoid)))
+        assert reader.read_float(wmoid, 2).equals(scan(out_dir, wmoid, 2))
+    assert reader.read_float(1900002, [1, 3], columns=["JULD", "TEMP"]).schema.names == ["JULD", "TEMP"]
+    assert reader.read_float(1900002, [1, 3]).num_rows == 2*10
+
+    entries = reader.lookup(1900004, 3)
+    assert len(entries) >= 1 and (entries["juld_min"] <= entries["juld_max"]).all()
+    assert reader.read_float(1999999).num_rows == 0
+    reader.close()
+
+def test_catalog_incremental(tmp_path):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=4, nprof=3, nlevels=5)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", chunk=2)
+    converter.convert_to_parquet()
+    ac.update_catalog(out_dir, "PHY")
+
+    # only the new fragments and the fragment rewritten without the float
+    # are read again
+    write_argo_file(flist[0], wmoid=1900001, nprof=6, nlevels=5, seed=42)
+    converter.update_parquet([flist[0]], [1900001])
+    catalog, nindexed = ac.build_catalog(out_dir, "PHY", previous=ac.load_catalog(out_dir, "PHY"))
+    assert nindexed < len(am.list_fragments(out_dir, "PHY"))
+    assert catalog.equals(ac.build_catalog(out_dir, "PHY")[0])
+    assert (catalog["PLATFORM_NUMBER"] == 1900001).sum() == 6
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+## @file test_compact_schema.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_arrow as aa
+import argo2parquet.argo_manifest as am
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import dask
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+def read_sorted(out_dir):
+    """Read the whole database sorted by float, profile and level, with the
+    dictionary columns decoded"""
+
+    table = pq.ParquetDataset(am.list_fragments(out_dir, "PHY")).read()
+    df = table.to_pandas()
+    for name in df.columns:
+        if df[name].dtype == "category":
+            df[name] = df[name].astype(object)
+
+    return df.sort_values(["PLATFORM_NUMBER","N_PROF","N_LEVELS"]).reset_index(drop=True)
+
+def test_compact_schema_types(tmp_path):
+
+    schema = generateSchema(outdir=str(tmp_path) + "/", db="bgc", compact=True).schema
+
+    assert schema.field("PLATFORM_NUMBER").type == pa.int32()
+    assert schema.field("N_LEVELS").type == pa.int32()
+    assert schema.field("N_PROF").type == pa.int16()
+    assert schema.field("CYCLE_NUMBER").type == pa.int16()
+    assert schema.field("DIRECTION").type == pa.dictionary(pa.int8(), pa.string())
+    assert schema.field("DOXY_DATA_MODE").type == pa.dictionary(pa.int8(), pa.string())
+
+    kwargs = aa.writer_kwargs(pq.read_schema(str(tmp_path) + "/ArgoBGC_schema.metadata"))
+    assert kwargs["column_encoding"]["DOXY"] == "BYTE_STREAM_SPLIT"
+    assert kwargs["column_encoding"]["N_LEVELS"] == "DELTA_BINARY_PACKED"
+    assert "LATITUDE" not in kwargs["column_encoding"] and "LATITUDE" in kwargs["use_dictionary"]
+    assert "DOXY" not in kwargs["use_dictionary"]
+
+    # the default schema is unchanged
+    schema = generateSchema(outdir=str(tmp_path) + "/", db="phy").schema
+    assert schema.field("PLATFORM_NUMBER").type == pa.int64()
+    assert schema.field("DATA_MODE").type == pa.string()
+    assert aa.writer_kwargs(schema) == {}
+
+@pytest.mark.parametrize("db", ["phy", "bgc"])
+def test_compact_readers(tmp_path, db):
+
+    argo_file = write_argo_file(str(tmp_path / "1900001_prof.nc"), nprof=5, nlevels=8, bgc=db == "bgc", padding=0.3)
+    schema = generateSchema(outdir=str(tmp_path) + "/", db=db, compact=True)
+
+    tables = {}
+    for reader in ["xarray", "arrow"]:
+        converter = daskTools(db_type=db.upper(), out_dir=str(tmp_path), flist=[], schema_path=schema.schema_fname, reader=reader)
+        df, _ = dask.compute(*converter.read_argo(argo_file), scheduler="sync")
+        tables[reader] = pa.Table.from_pandas(df, schema=converter.schema, preserve_index=False)
+        table, _ = converter.read_argo_table(argo_file)
+        assert table.schema.equals(converter.schema)
+
+    for name in tables["xarray"].schema.names:
+        assert tables["arrow"][name].equals(tables["xarray"][name]), name
+
+@pytest.mark.parametrize("engine", ["dask", "stream"])
+def test_compact_conversion(tmp_path, engine):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=4, nprof=3, nlevels=10)
+
+    dfs = {}
+    for compact in [False, True]:
+        schema = generateSchema(outdir=str(tmp_path / ("schemas_" + str(compact))) + "/", db="phy", compact=compact)
+        out_dir = str(tmp_path / ("parquet_" + str(compact))) + "/"
+        converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine=engine, chunk=2)
+        converter.convert_to_parquet()
+        dfs[compact] = read_sorted(out_dir)
+
+    # same values, written with the encodings of the compact schema
+    assert dfs[True].astype(dfs[False].dtypes).equals(dfs[False])
+    fragment = am.list_fragments(out_dir, "PHY")[0]
+    md = pq.ParquetFile(fragment).metadata
+    encodings = {md.schema.column(k).name: md.row_group(0).column(k).encodings for k in range(md.num_columns)}
+    assert "BYTE_STREAM_SPLIT" in encodings["TEMP"]
+    assert "DELTA_BINARY_PACKED" in encodings["N_LEVELS"]
+    assert "RLE_DICTIONARY" in encodings["DATA_MODE"]
+    assert pq.read_schema(fragment).field("CYCLE_NUMBER").type == pa.int16()
+
+    # fragments rewritten by an incremental update keep the encodings
+    write_argo_file(flist[1], wmoid=1900002, nprof=5, nlevels=10, seed=42)
+    converter.update_parquet([flist[1]], [1900002])
+    df = read_sorted(out_dir)
+    assert (df["PLATFORM_NUMBER"] == 1900002).sum() == 5*10
+    for fragment in am.list_fragments(out_dir, "PHY"):
+        md = pq.ParquetFile(fragment).metadata
+        assert "BYTE_STREAM_SPLIT" in md.row_group(0).column(md.schema.names.index("TEMP")).encodings
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+## @file test_data_mode.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Mon 04 Nov 2024
+
+##########################################################################
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import numpy as np
+import xarray as xr
+from synthetic import make_parameter_dataset
+##########################################################################
+
+def legacy_assign_data_mode(ds, VARS):
+    """Element-wise <PARAM>_DATA_MODE assignment of v0.1.1, kept as reference"""
+
+    nparam = ds.sizes["N_PARAM"]
+    nprof = ds.sizes["N_PROF"]
+    nlevels = ds.sizes["N_LEVELS"]
+    for v in VARS:
+        if "_DATA_MODE" in v:
+            ds[v] = xr.DataArray(
+                np.full( (nprof,nlevels), "", dtype=str ),
+                dims=["N_PROF","N_LEVELS"]
+            )
+
+    parameter = ds["PARAMETER"].isel(N_CALIB=0)
+    for p in range(nparam):
+        for j in range(nprof):
+            param_name = str(parameter.isel(N_PARAM=p,N_PROF=j).values).strip()
+            if len(param_name) < 1:
+                continue
+            param_data_mode_name = param_name + "_DATA_MODE"
+            if param_data_mode_name not in VARS:
+                continue
+            data_mode = str( ds["PARAMETER_DATA_MODE"].isel(N_PARAM=p,N_PROF=j).values ).strip()
+            for k in range(nlevels):
+                ds[param_data_mode_name][j,k] = data_mode
+
+    return ds
+
+def bgc_converter(tmp_path):
+    """daskTools instance for the BGC database with a freshly generated schema"""
+
+    schema = generateSchema(outdir=str(tmp_path) + "/", db="bgc")
+    return daskTools(db_type="BGC", out_dir=str(tmp_path), flist=[], schema_path=schema.schema_fname)
+
+def test_data_mode_matches_legacy(tmp_path):
+
+    converter = bgc_converter(tmp_path)
+
+    # an empty slot, a parameter not in the target variables, and a parameter
+    # repeated in two slots (the last slot wins)
+    params = ["PRES", "TEMP", "", "RAW_COUNTS", "DOXY", "TEMP"]
+    ds = make_parameter_dataset(nprof=6, nlevels=4, params=params)
+    ds["PARAMETER_DATA_MODE"][1,2] = " "
+
+    ref = legacy_assign_data_mode(ds.copy(deep=True), converter.VARS)
+    out = converter._daskTools__assign_data_mode(ds.copy(deep=True))
+
+    assert list(out.data_vars) == list(ref.data_vars)
+    for v in converter.VARS:
+        if "_DATA_MODE" in v:
+            assert out[v].dtype == ref[v].dtype
+            assert out[v].dims == ref[v].dims
+            assert out[v].values.tobytes() == ref[v].values.tobytes()
+
+    assert (out["TEMP_DATA_MODE"].values == ds["PARAMETER_DATA_MODE"].values[:,[5]]).all()
+    assert (out["CHLA_DATA_MODE"].values == "").all()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+## @file test_download_state.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Tue 12 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_state as argo_state
+import argo2parquet.argo_tools as at
+from conftest import write_index
+import filecmp
+import numpy as np
+import os
+import pandas as pd
+import pytest
+##########################################################################
+
+@pytest.mark.parametrize("download_mode", ["process", "async"])
+def test_index_driven_sync(gdac, tmp_path, download_mode):
+
+    save_to = str(tmp_path / "mirror") + "/"
+    def sync():
+        gdac.requests.clear()
+        _, _, fnames = at.argo_gdac(
+            gdac_path=gdac.index_dir, dataset="phy", save_to=save_to, skip_downloads=False,
+            dac_url_root=gdac.url + "dac/", NPROC=1, verbose=False, checktime=True, download_mode=download_mode
+        )
+        return sorted(fnames)
+
+    fnames = sync()
+    assert len(gdac.requests) == 3
+    state = argo_state.load_state( argo_state.state_fname(gdac.index_dir, "phy") )
+    assert len(state) == 3
+
+    # up-to-date mirror: no request at all
+    assert sync() == fnames
+    assert gdac.requests == []
+
+    # one float is updated in the index, another disappears from the GDAC
+    # (fnames are sorted: aoml/1900001, aoml/1900003, coriolis/1900002)
+    remote = [str(gdac.root / "dac" / os.path.relpath(f, save_to)) for f in fnames]
+    with open(remote[0], "ab") as f:
+        f.write(b"update")
+    os.remove(remote[2])
+    floats = list(gdac.floats)
+    floats[0] = floats[0][:2] + ("20240101000000",)
+    floats[1] = floats[1][:2] + ("20240101000000",)
+    write_index(gdac.index_dir, floats)
+
+    sync()
+    assert sorted(path for _, path in gdac.requests) == sorted("/dac/" + os.path.relpath(f, save_to) for f in [fnames[0], fnames[2]])
+    assert filecmp.cmp(fnames[0], remote[0], shallow=False)
+
+    # the float that failed is tried again at the next sync
+    sync()
+    assert [path for _, path in gdac.requests] == ["/dac/" + os.path.relpath(fnames[2], save_to)]
+
+def test_newer_than_index(tmp_path):
+
+    rng = np.random.default_rng(0)
+    nfloats = 50
+    filepaths = np.array(["aoml/" + str(1900000 + k) + "/" for k in range(nfloats)])
+    wmoids = 1900000 + np.repeat(np.arange(nfloats), 20)
+    index = pd.DataFrame({
+        "filepath_main": np.repeat(filepaths, 20),
+        "wmoid": wmoids,
+        "date_update": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 100, nfloats*20), unit="D"),
+    })
+
+    fnames = []
+    for k in range(nfloats):
+        fname = str(tmp_path / (str(1900000 + k) + "_prof.nc"))
+        fnames.append(fname)
+        if k % 5 == 0:
+            continue
+        open(fname, "w").close()
+        mtime = (pd.Timestamp("2024-01-01") + pd.Timedelta(days=int(rng.integers(0, 100)))).timestamp()
+        os.utime(fname, (mtime, mtime))
+
+    exists, newer = argo_state.newer_than_index(fnames, argo_state.latest_updates(index))
+
+    assert exists.tolist() == [k % 5 != 0 for k in range(nfloats)]
+    assert newer.tolist() == [bool(at.more_recent(f, w, index)) for f, w in zip(fnames, 1900000 + np.arange(nfloats))]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+## @file test_gdac_index.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Wed 13 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_tools as at
+import os
+import pandas as pd
+import pytest
+from synthetic import write_gdac_index
+##########################################################################
+
+def legacy_gdac_index(gdac_file):
+    """Index parsing of argo_gdac before the single-pass parser"""
+
+    gdac_index = pd.read_csv(gdac_file, delimiter=',', header=8, parse_dates=['date','date_update'], date_format='%Y%m%d%H%M%S')
+    gdac_index['wmoid'] = gdac_index['file'].str.extract(r'[a-z]*/[0-9]*/profiles/[A-Z]*([0-9]*)_[0-9]*[A-Z]*.nc').astype(int)
+    gdac_index['filepath_main'] = gdac_index['file'].str.extract('([a-z]*/[0-9]*/)profiles/[A-Z]*[0-9]*_[0-9]*[A-Z]*.nc')
+    gdac_index['filepath'] = gdac_index['file'].str.extract('([a-z]*/[0-9]*/profiles/)[A-Z]*[0-9]*_[0-9]*[A-Z]*.nc')
+    gdac_index['filename'] = gdac_index['file'].str.extract('[a-z]*/[0-9]*/profiles/([A-Z]*[0-9]*_[0-9]*[A-Z]*.nc)')
+    gdac_index['cycle'] = gdac_index['file'].str.extract('[a-z]*/[0-9]*/profiles/[A-Z]*[0-9]*_([0-9]*)[A-Z]*.nc').astype(int)
+
+    return gdac_index
+
+@pytest.mark.parametrize("bgc", [False, True])
+def test_gdac_index_matches_legacy(tmp_path, bgc):
+
+    gdac_file = write_gdac_index(str(tmp_path / "index.txt"), nfloats=50, nprof=20, bgc=bgc)
+    legacy = legacy_gdac_index(gdac_file)
+
+    gdac_index = at.load_gdac_index(gdac_file)
+    assert os.path.isfile(gdac_file + ".feather")
+    pd.testing.assert_frame_equal(gdac_index, legacy, check_dtype=False)
+    for c in ["date", "date_update", "latitude", "wmoid", "cycle"]:
+        assert gdac_index[c].dtype == legacy[c].dtype
+
+    # served from the snapshot
+    cached = at.load_gdac_index(gdac_file)
+    pd.testing.assert_frame_equal(cached, gdac_index)
+
+    # the snapshot is rebuilt when the index file changes
+    write_gdac_index(gdac_file, nfloats=10, nprof=20, bgc=bgc, seed=1)
+    os.utime(gdac_file, ns=(os.stat(gdac_file).st_mtime_ns + 10**9,)*2)
+    assert len(at.load_gdac_index(gdac_file)) == 200
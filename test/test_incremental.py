@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+## @file test_incremental.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Tue 05 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_manifest as am
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import os
+import pyarrow.parquet as pq
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+def read_sorted(out_dir, schema):
+    """Read the whole database sorted by float, profile and level"""
+
+    df = pq.ParquetDataset(out_dir, schema=schema).read().to_pandas()
+    df = df.sort_values(["PLATFORM_NUMBER","N_PROF","N_LEVELS"]).reset_index(drop=True)
+
+    return df
+
+def test_incremental_update(tmp_path):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=4, nprof=3, nlevels=5)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, chunk=2)
+    converter.convert_to_parquet()
+    previous = am.build_manifest(flist)
+
+    # one float is updated, one is added and one disappears from the index
+    write_argo_file(flist[1], wmoid=1900002, nprof=6, nlevels=5, seed=42)
+    os.utime(flist[1], (previous["mtime"][1] + 10, previous["mtime"][1] + 10))
+    new_file = write_argo_file(str(tmp_path / "dac/aoml/1900010/1900010_prof.nc"), wmoid=1900010, nprof=2, nlevels=5)
+    new_flist = [flist[0], flist[1], flist[3], new_file]
+    untouched = set(am.list_fragments(out_dir, "PHY"))
+
+    manifest = am.build_manifest(new_flist)
+    flist_changed, wmoids_removed = am.changed_files(manifest, previous)
+    assert flist_changed == [flist[1], new_file]
+    assert wmoids_removed == [1900002, 1900003]
+
+    converter.update_parquet(flist_changed, wmoids_removed)
+    # the fragment holding only unchanged floats is left as it is
+    assert len( untouched & set(am.list_fragments(out_dir, "PHY")) ) > 0
+
+    ref_dir = str(tmp_path / "ref") + "/"
+    ref = daskTools(db_type="PHY", out_dir=ref_dir, flist=new_flist, schema_path=schema.schema_fname, chunk=2)
+    ref.convert_to_parquet()
+
+    df = read_sorted(out_dir, converter.schema)
+    df_ref = read_sorted(ref_dir, converter.schema)
+    assert df.equals(df_ref)
+
+    # _metadata lists exactly the current fragments
+    md = pq.read_metadata(out_dir + "_metadata")
+    paths = {md.row_group(k).column(0).file_path for k in range(md.num_row_groups)}
+    assert paths == {os.path.relpath(f, out_dir) for f in am.list_fragments(out_dir, "PHY")}
+
+    # nothing to do on a second pass
+    flist_changed, wmoids_removed = am.changed_files(am.build_manifest(new_flist), manifest)
+    assert flist_changed == [] and wmoids_removed == []
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+## @file test_layout.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Fri 08 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_layout as al
+import argo2parquet.argo_manifest as am
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+from datetime import datetime
+import numpy as np
+import pyarrow.dataset as pds
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_tree
+##########################################################################
+
+def test_partition_filters():
+
+    filters = [("LATITUDE",">",34), ("LATITUDE","<",80), ("LONGITUDE",">",-78), ("LONGITUDE","<",-50),
+               ("JULD",">=",datetime(2023,1,1)), ("JULD","<=",datetime(2023,12,31)), ("PRES_ADJUSTED",">=",100)]
+
+    assert al.partition_filters(filters) == filters + [
+        ("LAT_TILE",">=",30), ("LAT_TILE","<=",80), ("LON_TILE",">=",-80), ("LON_TILE","<=",-50),
+        ("YEAR",">=",2023), ("YEAR","<=",2023)
+    ]
+
+def test_partition_keys():
+
+    keys = al.partition_keys(
+        np.array(["2023-05-01", "NaT", "1999-12-31"], dtype="datetime64[ns]"),
+        np.array([-0.5, 45.0, np.nan]),
+        np.array([190.0, -180.0, 10.0]),
+    )
+
+    assert keys["YEAR"].tolist() == [2023, al.MISSING_YEAR, 1999]
+    assert keys["LAT_TILE"].tolist() == [-10, 40, al.MISSING_TILE]
+    assert keys["LON_TILE"].tolist() == [-170, -180, al.MISSING_TILE]
+
+    # a row at 180 is kept by the partition filters of a range reaching 180
+    keys = al.partition_keys(np.array(["2023-05-01"], dtype="datetime64[ns]"), np.array([0.0]), np.array([180.0]))
+    assert keys["LON_TILE"].tolist() == [170]
+    lon_tile = [bound for key, op, bound in al.partition_filters([("LONGITUDE",">",175)]) if key == "LON_TILE"]
+    assert lon_tile == [170] and keys["LON_TILE"][0] >= lon_tile[0]
+
+@pytest.mark.parametrize("engine", ["dask", "stream"])
+def test_partitioned_layout(tmp_path, engine):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=4, nprof=120, nlevels=4)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+
+    ref_dir = str(tmp_path / "flat") + "/"
+    ref = daskTools(db_type="PHY", out_dir=ref_dir, flist=flist, schema_path=schema.schema_fname, chunk=2, engine=engine, ntasks=2)
+    ref.convert_to_parquet()
+
+    out_dir = str(tmp_path / "partitioned") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, chunk=2, engine=engine, ntasks=2, layout="partitioned")
+    converter.convert_to_parquet()
+
+    # every row is in the partition of its time and position
+    table = pq.ParquetDataset(out_dir, schema=al.partitioned_schema(converter.schema)).read()
+    keys = al.partition_keys(table["JULD"].to_numpy(), table["LATITUDE"].to_numpy(), table["LONGITUDE"].to_numpy())
+    for key in al.PARTITION_KEYS:
+        assert (table[key].to_numpy() == keys[key]).all()
+
+    filters = [("LATITUDE",">",-20), ("LATITUDE","<",20), ("JULD",">=",datetime(2019,1,1)), ("JULD","<=",datetime(2019,12,31))]
+    sort = [("PLATFORM_NUMBER","ascending"),("N_PROF","ascending"),("N_LEVELS","ascending")]
+    df_ref = pq.ParquetDataset(ref_dir, schema=ref.schema, filters=filters).read().sort_by(sort).to_pandas()
+
+    dataset = pds.dataset(out_dir, schema=al.partitioned_schema(converter.schema), partitioning="hive")
+    expression = pq.filters_to_expression(al.partition_filters(filters))
+    df = dataset.to_table(filter=expression).sort_by(sort).drop(al.PARTITION_KEYS).to_pandas()
+
+    assert len(df_ref) > 0
+    assert df.equals(df_ref)
+    assert len(list(dataset.get_fragments(filter=expression))) < len(am.list_fragments(out_dir, "PHY"))
+
+def test_morton_key():
+
+    key = al.morton_key(np.array([-90.0, -90.0, 90.0, np.nan]), np.array([-180.0, 179.99, 179.99, 0.0]), bits=2)
+
+    assert key.tolist() == [0, 0b1010, 0b1111, np.iinfo("uint64").max]
+
+@pytest.mark.parametrize("engine", ["dask", "stream"])
+def test_cluster(tmp_path, engine):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=6, nprof=60, nlevels=10)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+
+    filters = {
+        "time": [("JULD",">=",datetime(2019,1,1)), ("JULD","<",datetime(2019,4,1))],
+        "time+pres": [("JULD",">=",datetime(2019,1,1)), ("JULD","<",datetime(2019,4,1)), ("PRES",">=",100), ("PRES","<=",300)],
+    }
+    pruning = {}
+    tables = {}
+    for cluster in [None, ["time", "space", "pres"]]:
+        out_dir = str(tmp_path / str(cluster is not None)) + "/"
+        converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, chunk=6,
+                              engine=engine, ntasks=1, row_group_size=200, cluster=cluster, time_bucket="M")
+        converter.convert_to_parquet()
+        if engine == "dask":
+            # one row group per file, clustering only sorts within files
+            for fragment in am.list_fragments(out_dir, "PHY"):
+                table = pq.read_table(fragment)
+                pq.write_table(table, fragment, row_group_size=200)
+        pruning[cluster is not None] = converter.pruning_report(filters=filters)
+        sort = [("PLATFORM_NUMBER","ascending"),("N_PROF","ascending"),("N_LEVELS","ascending")]
+        tables[cluster is not None] = pq.ParquetDataset(out_dir, schema=converter.schema).read().sort_by(sort)
+
+    assert tables[True].equals(tables[False])
+
+    # rows are sorted by month first
+    fragment = am.list_fragments(str(tmp_path / "True"), "PHY")[0]
+    month = pq.read_table(fragment, columns=["JULD"])["JULD"].to_numpy().astype("datetime64[M]")
+    assert (np.diff(month.astype("int64")) >= 0).all()
+
+    for name in filters:
+        assert pruning[True][name][1] == pruning[False][name][1]
+        assert pruning[True][name][0] < pruning[False][name][0]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+## @file test_normalize.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_catalog as ac
+import argo2parquet.argo_manifest as am
+import argo2parquet.argo_normalize as an
+from argo2parquet.argoReader import argoReader
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import numpy as np
+import os
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+@pytest.mark.parametrize("layout,compact", [("flat", False), ("partitioned", False), ("flat", True)])
+def test_normalized(tmp_path, layout, compact):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=8, nprof=6, nlevels=10)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy", compact=compact)
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream", row_group_size=70, layout=layout)
+    converter.convert_to_parquet()
+    ac.update_catalog(out_dir, "PHY")
+
+    fragments = am.list_fragments(out_dir, "PHY")
+    assert an.update_normalized(out_dir, "PHY") == len(fragments)
+    assert an.update_normalized(out_dir, "PHY") == 0
+    # the normalized tables are not fragments of the database
+    assert am.list_fragments(out_dir, "PHY") == fragments
+
+    df = pq.ParquetDataset(fragments).read().to_pandas()
+    levels = pq.read_schema(an.normalized_fname(out_dir, fragments[0], "levels"))
+    assert "PROFILE_ID" in levels.names and "LATITUDE" not in levels.names and "PLATFORM_NUMBER" not in levels.names
+
+    reader = argoReader(out_dir, "PHY")
+    profiles = reader.profiles()
+    assert profiles.num_rows == df.groupby(["PLATFORM_NUMBER", "N_PROF"]).ngroups == 8*6
+    assert "TEMP" not in profiles.schema.names
+
+    # profiles selected by region and time, without the levels
+    region = (-30, 30, -90, 90)
+    profiles = reader.profiles(region=region, columns=["LATITUDE", "LONGITUDE"])
+    keep = df["LATITUDE"].between(-30, 30) & df["LONGITUDE"].between(-90, 90)
+    assert profiles.num_rows == df.loc[keep].groupby(["PLATFORM_NUMBER", "N_PROF"]).ngroups > 0
+    assert profiles.schema.names == ["PROFILE_ID", "LATITUDE", "LONGITUDE"]
+
+    # levels joined on demand
+    rows = reader.levels(reader.profiles(region=region))
+    assert rows.num_rows == keep.sum()
+    assert rows["TEMP"].to_pandas().sum() == pytest.approx(df.loc[keep, "TEMP"].sum())
+    assert rows["LATITUDE"].to_pandas().sum() == pytest.approx(df.loc[keep, "LATITUDE"].sum())
+
+    rows = reader.levels(reader.profiles(floats=[1900002]), pres=(100, 500), params=["PSAL"])
+    keep = (df["PLATFORM_NUMBER"] == 1900002) & df["PRES_ADJUSTED"].between(100, 500)
+    assert rows.num_rows == keep.sum() > 0
+    assert "PSAL_ADJUSTED" in rows.schema.names and "TEMP" not in rows.schema.names
+    assert reader.levels(reader.profiles(floats=[1999999])).num_rows == 0
+
+def test_normalized_incremental(tmp_path):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=4, nprof=3, nlevels=5)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", chunk=1)
+    converter.convert_to_parquet()
+
+    with pytest.raises(ValueError):
+        argoReader(out_dir, "PHY").profiles()
+
+    an.update_normalized(out_dir, "PHY")
+
+    # only the new fragments and the fragment rewritten without the float are
+    # split again, and the files of the deleted fragments are removed
+    write_argo_file(flist[0], wmoid=1900001, nprof=6, nlevels=5, seed=42)
+    converter.update_parquet([flist[0]], [1900001, 1900002])
+    assert 0 < an.update_normalized(out_dir, "PHY") < len(am.list_fragments(out_dir, "PHY"))
+    ac.update_catalog(out_dir, "PHY")
+
+    fragments = am.list_fragments(out_dir, "PHY")
+    normalized = pq.ParquetDataset(an.normalized_dir(out_dir, "profiles")).read()
+    assert len(os.listdir(an.normalized_dir(out_dir, "profiles"))) == len(fragments)
+    assert np.sum(normalized["PROFILE_ID"].to_numpy()//an.PROFILE_ID_STRIDE == 1900001) == 6
+    assert np.sum(normalized["PROFILE_ID"].to_numpy()//an.PROFILE_ID_STRIDE == 1900002) == 0
+
+    reader = argoReader(out_dir, "PHY")
+    assert reader.levels(reader.profiles(floats=[1900001])).num_rows == 6*5
+
+def test_normalized_empty_database(tmp_path):
+
+    out_dir = str(tmp_path / "parquet") + "/"
+    an.update_normalized(out_dir, "PHY")
+    os.makedirs(an.normalized_dir(out_dir))
+
+    reader = argoReader(out_dir, "PHY")
+    profiles = reader.profiles()
+    assert profiles.num_rows == 0
+    assert reader.levels(profiles, params=["TEMP"]).num_rows == 0
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+## @file test_padding.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_arrow as aa
+import argo2parquet.argo_manifest as am
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import dask
+import netCDF4
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+def test_padding_rows():
+
+    n_prof = np.array([0, 0, 0, 1, 1, 1])
+    n_levels = np.array([0, 1, 2, 0, 1, 2])
+    padded = np.array([False, False, True, True, True, True])
+
+    # the empty profile keeps its first level
+    assert aa.padding_rows(n_prof, n_levels, padded).tolist() == [False, False, True, False, True, True]
+    assert aa.padding_rows([], [], []).tolist() == []
+    assert aa.measurement_vars(["PLATFORM_NUMBER", "PRES", "PRES_QC", "DOXY_dPRES", "DOXY_DATA_MODE", "JULD"]) == ["PRES", "DOXY_dPRES"]
+
+@pytest.mark.parametrize("db", ["phy", "bgc"])
+def test_drop_padding_readers(tmp_path, db):
+
+    argo_file = write_argo_file(str(tmp_path / "1900001_prof.nc"), nprof=6, nlevels=20, bgc=db == "bgc", padding=0.5)
+    # the last profile has no measurement at all
+    with netCDF4.Dataset(argo_file, "a") as nc:
+        for name in aa.measurement_vars(nc.variables):
+            if nc.variables[name].dimensions == ("N_PROF", "N_LEVELS"):
+                nc.variables[name][5, :] = 99999.0
+    with netCDF4.Dataset(argo_file, "r") as nc:
+        nvalid = (nc.variables["PRES"][:].filled(np.nan) == nc.variables["PRES"][:].filled(np.nan)).sum(axis=1)
+
+    schema = generateSchema(outdir=str(tmp_path) + "/", db=db)
+
+    tables = {}
+    for reader in ["xarray", "arrow"]:
+        converter = daskTools(db_type=db.upper(), out_dir=str(tmp_path), flist=[], schema_path=schema.schema_fname, reader=reader, drop_padding=True)
+        df, status = dask.compute(*converter.read_argo(argo_file), scheduler="sync")
+        tables[reader] = pa.Table.from_pandas(df, schema=converter.schema, preserve_index=False)
+
+        assert status["rows"] == nvalid.sum() + 1
+        assert status["rows"] + status["dropped"] == 6*20
+        assert df.loc[df["N_PROF"] == 5, "N_LEVELS"].tolist() == [0]
+
+    for name in tables["xarray"].schema.names:
+        assert tables["arrow"][name].equals(tables["xarray"][name]), name
+
+    table, status = converter.read_argo_table(argo_file)
+    assert table.num_rows == status["rows"] == nvalid.sum() + 1
+
+@pytest.mark.parametrize("engine", ["dask", "stream"])
+def test_drop_padding_conversion(tmp_path, engine):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=3, nprof=4, nlevels=10)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+
+    rows = {}
+    for drop_padding in [False, True]:
+        out_dir = str(tmp_path / ("parquet_" + str(drop_padding))) + "/"
+        converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine=engine, drop_padding=drop_padding)
+        converter.convert_to_parquet()
+
+        table = pq.ParquetDataset(am.list_fragments(out_dir, "PHY")).read()
+        rows[drop_padding] = table.num_rows
+        status = converter.status_table()
+        assert status["rows"].sum() == table.num_rows
+
+        dropped, _ = converter.padding_report()
+        if drop_padding:
+            assert dropped > 0 and dropped == status["dropped"].sum()
+            assert not table.to_pandas()[aa.measurement_vars(table.schema.names)].isna().all(axis=1).any()
+        else:
+            assert dropped == 0
+
+    assert rows[False] == 3*4*10
+    assert rows[True] == rows[False] - dropped
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+## @file test_pipeline.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_manifest as am
+from argo2parquet.argo_pipeline import argo_pipeline, fileQueue
+from conftest import write_index
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file
+import threading
+import time
+##########################################################################
+
+def test_file_queue_backpressure():
+
+    files = fileQueue(2)
+    files.put("unchanged_prof.nc", False)
+    files.put("a_prof.nc", True)
+    files.put("b_prof.nc", True)
+
+    # the queue is full: the next download blocks until a batch is converted
+    putter = threading.Thread(target=files.put, args=("c_prof.nc", True), daemon=True)
+    putter.start()
+    time.sleep(0.2)
+    assert putter.is_alive()
+
+    # batches hold at most as many fetched files as the queue
+    batch, finished = files.take(3)
+    assert batch == [("unchanged_prof.nc", False), ("a_prof.nc", True)] and not finished
+    files.release(batch)
+    putter.join(timeout=5)
+    assert not putter.is_alive()
+
+    files.close()
+    assert files.take(3) == ([("b_prof.nc", True), ("c_prof.nc", True)], False)
+    assert files.take(3) == ([], True)
+
+    with pytest.raises(ValueError):
+        fileQueue(0)
+
+@pytest.mark.parametrize("download_mode", ["process", "async"])
+def test_pipeline(gdac, tmp_path, download_mode):
+
+    # the GDAC serves valid profile files
+    for k, (dac, wmoid, _) in enumerate(gdac.floats):
+        write_argo_file(str(gdac.root / "dac" / dac / str(wmoid) / (str(wmoid) + "_prof.nc")), wmoid=wmoid, nprof=2+k, nlevels=5, seed=k)
+
+    save_to = str(tmp_path / "mirror") + "/"
+    out_dir = str(tmp_path / "parquet") + "/"
+    db_dir = out_dir + "phy/"
+    def run(incremental):
+        gdac.requests.clear()
+        return argo_pipeline(
+            gdac.index_dir, save_to, ["phy"], out_dir, str(tmp_path / "schemas") + "/", incremental=incremental,
+            download_mode=download_mode, nproc=2, dac_url_root=gdac.url + "dac/", batch_size=2, queue_size=2,
+            converter_kwargs={"reader": "arrow"}, n_workers=1
+        )
+
+    def read():
+        table = pq.ParquetDataset(am.list_fragments(db_dir, "PHY")).read()
+        return table.to_pandas().groupby("PLATFORM_NUMBER").size().to_dict()
+
+    flists, metadata = run(False)
+    assert len(gdac.requests) == 3 and len(flists[0]) == 3
+    assert read() == {1900001: 2*5, 1900002: 3*5, 1900003: 4*5}
+    assert len(pd.read_parquet(am.manifest_fname(db_dir, "phy"))) == 3
+    assert (pd.read_parquet(am.status_fname(db_dir, "phy"))["status"] == "ok").all()
+    assert os.path.isfile(db_dir + "metadata/ArgoPHY_metadata.parquet")
+
+    # one float is updated on the GDAC: only its file is downloaded and
+    # converted again
+    dac, wmoid, _ = gdac.floats[1]
+    write_argo_file(str(gdac.root / "dac" / dac / str(wmoid) / (str(wmoid) + "_prof.nc")), wmoid=wmoid, nprof=6, nlevels=5)
+    floats = list(gdac.floats)
+    floats[1] = floats[1][:2] + ("20240101000000",)
+    write_index(gdac.index_dir, floats)
+
+    fragments = set(am.list_fragments(db_dir, "PHY"))
+    run(True)
+    assert len(gdac.requests) == 1
+    assert read() == {1900001: 2*5, 1900002: 6*5, 1900003: 4*5}
+    assert len(set(am.list_fragments(db_dir, "PHY")) - fragments) == 1
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+## @file test_query.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_catalog as ac
+import argo2parquet.argo_manifest as am
+from argo2parquet.argoReader import argoReader
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_tree
+##########################################################################
+
+def expected_rows(df, region=None, time=None, pres=None, floats=None, qc_vars=None, qc=None):
+    """Rows selected by a query, filtered with pandas on the whole database"""
+
+    keep = np.ones(len(df), dtype=bool)
+    if region is not None:
+        lat_min, lat_max, lon_min, lon_max = region
+        keep &= (df["LATITUDE"] >= lat_min) & (df["LATITUDE"] <= lat_max)
+        if lon_min <= lon_max:
+            keep &= (df["LONGITUDE"] >= lon_min) & (df["LONGITUDE"] <= lon_max)
+        else:
+            keep &= (df["LONGITUDE"] >= lon_min) | (df["LONGITUDE"] <= lon_max)
+    if time is not None:
+        keep &= (df["JULD"] >= pd.Timestamp(time[0])) & (df["JULD"] <= pd.Timestamp(time[1]))
+    if pres is not None:
+        keep &= (df["PRES_ADJUSTED"] >= pres[0]) & (df["PRES_ADJUSTED"] <= pres[1])
+    if floats is not None:
+        keep &= df["PLATFORM_NUMBER"].isin(floats)
+    for name in qc_vars or []:
+        keep &= df[name].isin(qc)
+
+    return int(keep.fillna(False).sum())
+
+@pytest.mark.parametrize("layout", ["flat", "partitioned"])
+def test_query(tmp_path, layout):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=12, nprof=10, nlevels=10)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine="stream", row_group_size=50, layout=layout)
+    converter.convert_to_parquet()
+    ac.update_catalog(out_dir, "PHY")
+
+    df = pq.ParquetDataset(am.list_fragments(out_dir, "PHY")).read().to_pandas()
+    reader = argoReader(out_dir, "PHY")
+
+    lon = df["LONGITUDE"].dropna().sort_values().to_numpy()
+    juld = df["JULD"].dropna().sort_values()
+    queries = [
+        {"region": (-30, 30, -90, 90)},
+        # across the antimeridian
+        {"region": (-90, 90, lon[len(lon)*3//4], lon[len(lon)//4])},
+        {"time": (juld.iloc[len(juld)//3], juld.iloc[2*len(juld)//3]), "pres": (100, 500)},
+        {"floats": [1900002, 1900007], "time": ("1900-01-01", "2100-01-01")},
+    ]
+    for q in queries:
+        table = reader.query(**q)
+        assert table.num_rows == expected_rows(df, **q) > 0, q
+
+    # the files outside the region or time window are not opened
+    q = {"region": (-90, 90, lon[0], lon[len(lon)//10])}
+    assert len(reader.query_files(**q)) < len(am.list_fragments(out_dir, "PHY"))
+    assert reader.query(**q).num_rows == expected_rows(df, **q)
+
+    # parameters and QC flags
+    table = reader.query(pres=(0, 1000), params=["TEMP"], qc=[1, 2])
+    assert "TEMP_ADJUSTED" in table.schema.names and "PSAL" not in table.schema.names
+    assert table.num_rows == expected_rows(df, pres=(0, 1000), qc_vars=["TEMP_ADJUSTED_QC", "PRES_ADJUSTED_QC"], qc=[1, 2]) > 0
+    with pytest.raises(ValueError):
+        reader.query(qc=[1])
+
+    # the same rows as pandas and dask dataframes
+    q = {"region": (-30, 30, -90, 90), "params": ["PSAL"]}
+    rows = reader.query(**q).num_rows
+    assert len(reader.query(**q, output="pandas")) == rows
+    assert len(reader.query(**q, output="dask").compute()) == rows
+    assert reader.query(region=(0, 1, 0, 1e-9), params=["PSAL"], output="pandas").columns.tolist() == reader.query(**q).schema.names
+
+def test_query_empty_database(tmp_path):
+
+    out_dir = str(tmp_path / "parquet") + "/"
+    reader = argoReader(out_dir, "PHY")
+    assert reader.schema is None
+    assert reader.query(params=["TEMP"]).num_rows == 0
+    assert len(reader.query(region=(-30, 30, -90, 90), params=["TEMP"], output="pandas")) == 0
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+## @file test_resources.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_resources as ar
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+from dask.utils import parse_bytes
+import os
+import pytest
+from synthetic import write_argo_tree
+##########################################################################
+
+GB = 1024**3
+
+def test_cgroup_v2_limits(tmp_path):
+
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    (tmp_path / "memory.max").write_text(str(GB) + "\n")
+    (tmp_path / "memory.current").write_text(str(GB//4) + "\n")
+
+    assert ar.available_cores(str(tmp_path)) == min(len(os.sched_getaffinity(0)), 1)
+    assert ar.available_memory(str(tmp_path)) <= GB - GB//4
+
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    (tmp_path / "memory.max").write_text("max\n")
+    assert ar.available_cores(str(tmp_path)) == len(os.sched_getaffinity(0))
+    assert ar.available_memory(str(tmp_path)) > 0
+
+def test_cgroup_v1_limits(tmp_path):
+
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "memory").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (tmp_path / "memory" / "memory.limit_in_bytes").write_text(str(GB//2) + "\n")
+    (tmp_path / "memory" / "memory.usage_in_bytes").write_text("0\n")
+
+    assert ar.available_cores(str(tmp_path)) == len(os.sched_getaffinity(0))
+    assert ar.available_memory(str(tmp_path)) <= GB//2
+
+def test_plan_resources_scales_with_host():
+
+    # BGC-like files: the largest is 200 MB on disk and 10 times larger in memory
+    laptop = ar.plan_resources(10, 200*1024**2, ncores=8, memory=32*GB)
+    node = ar.plan_resources(10, 200*1024**2, ncores=64, memory=512*GB)
+    assert laptop[0] < node[0] <= 64
+    assert laptop[1] == node[1] == 1
+    for nw, tw, memlim in [laptop, node]:
+        assert nw*parse_bytes(memlim) <= 0.85*(32*GB if nw == laptop[0] else 512*GB) + 1024
+        assert parse_bytes(memlim) >= 3*10*200*1024**2
+
+    # small files: the cores set the number of workers
+    nw, tw, memlim = ar.plan_resources(3, 1024**2, ncores=8, memory=32*GB)
+    assert nw == 8
+
+    # overrides
+    assert ar.plan_resources(10, 200*1024**2, ncores=8, memory=32*GB, n_workers=2, threads_per_worker=2, memory_limit="5.5GB") == (2, 2, "5.5GB")
+    assert ar.plan_resources(10, 200*1024**2, ncores=8, memory=32*GB, memory_limit="13GB")[0] == 2
+
+    # no files on disk to size the tasks
+    nw, tw, memlim = ar.plan_resources(1.0, 0, engine="stream", ncores=8, memory=32*GB)
+    assert nw == 8 and ar.task_memory(1.0, 0, "stream") == ar.TASK_MEMORY_MIN
+
+def test_expansion_factor(tmp_path):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=3, nprof=4, nlevels=20)
+    schema = generateSchema(outdir=str(tmp_path) + "/", db="phy")
+
+    for engine in ["dask", "stream"]:
+        converter = daskTools(db_type="PHY", out_dir=str(tmp_path), flist=flist, schema_path=schema.schema_fname, reader="arrow", engine=engine)
+        expansion, largest = ar.expansion_factor(flist + [str(tmp_path / "missing_prof.nc")], converter.memory_footprint)
+        assert expansion >= 1
+        assert largest == max(os.path.getsize(f) for f in flist)
+
+    with pytest.raises(ValueError):
+        converter.memory_footprint(str(tmp_path / "missing_prof.nc"))
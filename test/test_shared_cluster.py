@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+## @file test_shared_cluster.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+from argo2parquet.argo_convert import argo_convert
+import argo2parquet.argo_manifest as am
+import argo2parquet.argo_resources as ar
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_tree
+##########################################################################
+
+def test_plan_shared_resources():
+
+    GB = 1024**3
+    nw, tw, memlim, worker_resources, task_resources = ar.plan_shared_resources({"phy": GB, "bgc": 6*GB}, ncores=16, memory=100*GB)
+
+    assert (nw, tw) == (4, 4)
+    assert worker_resources["MEMORY"] == int(0.85*100*GB/4) // 2**20
+    # a worker runs up to 4 PHY tasks, or 3 BGC tasks, at a time
+    assert worker_resources["MEMORY"] // task_resources["phy"]["MEMORY"] >= 4
+    assert worker_resources["MEMORY"] // task_resources["bgc"]["MEMORY"] == 3
+
+    # tasks larger than a worker are still schedulable
+    _, _, _, worker_resources, task_resources = ar.plan_shared_resources({"bgc": 100*GB}, ncores=4, memory=8*GB)
+    assert task_resources["bgc"]["MEMORY"] == worker_resources["MEMORY"]
+
+def index_subset(flist):
+    """GDAC index subset of a list of files, one row per file"""
+
+    return pd.DataFrame({"file": flist, "wmoid": [am.file_wmoid(f) for f in flist], "date_update": pd.Timestamp("2024-11-09")})
+
+@pytest.mark.parametrize("shared_cluster", [True, False])
+def test_shared_cluster_conversion(tmp_path, shared_cluster):
+
+    flist_phy = write_argo_tree(str(tmp_path / "dac"), nfloats=3, nprof=3, nlevels=5)
+    flist_bgc = write_argo_tree(str(tmp_path / "dac"), nfloats=2, nprof=3, nlevels=5, bgc=True, first_wmoid=5900001)
+    out_dir = str(tmp_path / "parquet") + "/"
+
+    argo_convert(
+        [flist_phy, flist_bgc], [index_subset(flist_phy), index_subset(flist_bgc)], ["phy", "bgc"], out_dir, str(tmp_path / "schemas") + "/",
+        reader="arrow", engine="dask", n_workers=1, threads_per_worker=2, shared_cluster=shared_cluster
+    )
+
+    for db_name, flist in [("phy", flist_phy), ("bgc", flist_bgc)]:
+        db_dir = out_dir + db_name + "/"
+        fragments = am.list_fragments(db_dir, db_name.upper())
+        assert len(fragments) > 0
+        table = pq.ParquetDataset(fragments).read()
+        assert table.num_rows == len(flist)*3*5
+        assert set(table["PLATFORM_NUMBER"].to_pylist()) == {am.file_wmoid(f) for f in flist}
+
+        status = pd.read_parquet(am.status_fname(db_dir, db_name))
+        assert (status["status"] == "ok").all() and len(status) == len(flist)
+        assert len(pd.read_parquet(am.manifest_fname(db_dir, db_name))) == len(flist)
+        # the GDAC index subset survives the overwrite of the database
+        assert len(pd.read_parquet(db_dir + "metadata/Argo" + db_name.upper() + "_metadata.parquet")) == len(flist)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+## @file test_status.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Fri 08 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_manifest as am
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+def read_sorted(out_dir, schema):
+    """Read the whole database sorted by float, profile and level"""
+
+    df = pq.ParquetDataset(am.list_fragments(out_dir, "PHY"), schema=schema).read().to_pandas()
+    df = df.sort_values(["PLATFORM_NUMBER","N_PROF","N_LEVELS"]).reset_index(drop=True)
+
+    return df
+
+@pytest.mark.parametrize("engine", ["dask", "stream"])
+def test_status_and_retry(tmp_path, engine):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=4, nprof=3, nlevels=5)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+
+    # one file is truncated on download
+    with open(flist[2], "wb") as f:
+        f.write(b"CDF\x01 not a netCDF file")
+
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, chunk=2, engine=engine, reader="arrow")
+    converter.convert_to_parquet()
+
+    assert converter.failed_files() == [flist[2]]
+
+    status = converter.status_table()
+    assert len(status) == 4
+    assert status["file"].tolist() == flist
+    assert status["status"].tolist() == ["ok", "ok", "failed", "ok"]
+    assert status["wmoid"][2] == 1900003
+    assert status["rows"].tolist() == [15, 15, 0, 15]
+    assert status["error"][2] != "" and status["error"][0] == ""
+    assert (status["bytes"] > 0).all() and (status["duration"] >= 0).all()
+
+    status_fname = am.status_fname(out_dir, "phy")
+    am.save_status(am.merge_status(None, status, flist), status_fname)
+    previous_status = am.load_manifest(status_fname)
+    assert previous_status.equals(status)
+
+    # the file is fixed, and only the file is converted again
+    write_argo_file(flist[2], wmoid=1900003, nprof=3, nlevels=5)
+    flist_failed = am.failed_status_files(previous_status, flist)
+    assert flist_failed == [flist[2]]
+
+    converter.update_parquet(flist_failed, [am.file_wmoid(f) for f in flist_failed])
+    assert converter.status_table()["file"].tolist() == flist_failed
+    status = am.merge_status(previous_status, converter.status_table(), flist)
+    assert status["status"].tolist() == ["ok"]*4
+    assert am.failed_status_files(status) == []
+
+    ref_dir = str(tmp_path / "ref") + "/"
+    ref = daskTools(db_type="PHY", out_dir=ref_dir, flist=flist, schema_path=schema.schema_fname, chunk=2, engine=engine, reader="arrow")
+    ref.convert_to_parquet()
+
+    assert status_fname not in am.list_fragments(out_dir, "PHY")
+    assert read_sorted(out_dir, converter.schema).equals( read_sorted(ref_dir, converter.schema) )
+
+def test_merge_status_drops_removed_files():
+
+    status = am.status_frame([
+        {"file": f, "wmoid": k, "status": "ok", "error": "", "message": "", "rows": 1, "bytes": 1, "duration": 0.}
+        for k, f in enumerate(["a", "b", "c"])
+    ])
+    status.loc[1, "status"] = "failed"
+
+    merged = am.merge_status(status, status.iloc[[2]], ["b", "c", "d"])
+    assert merged["file"].tolist() == ["b", "c"]
+    assert am.failed_status_files(merged, ["d", "c", "b"]) == ["b"]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+## @file test_stream_writer.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Thu 07 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_manifest as am
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+from argo2parquet.streamWriter import streamWriter
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_tree
+##########################################################################
+
+def read_sorted(out_dir, schema):
+    """Read the whole database sorted by float, profile and level"""
+
+    table = pq.ParquetDataset(out_dir, schema=schema).read()
+    return table.sort_by([("PLATFORM_NUMBER","ascending"),("N_PROF","ascending"),("N_LEVELS","ascending")])
+
+def test_stream_writer_row_groups(tmp_path):
+
+    schema = pa.schema([("x", pa.int64())])
+    writer = streamWriter(str(tmp_path), "Argotest", schema, row_group_size=10, row_groups_per_file=2)
+    for n in [3, 15, 4, 9]:
+        writer.write( pa.table({"x": pa.array(range(n), type=pa.int64())}) )
+    files = writer.close()
+
+    # 31 rows: 10+10 | 10+1
+    assert [pq.ParquetFile(f).metadata.num_row_groups for f in files] == [2, 2]
+    sizes = [pq.ParquetFile(f).metadata.row_group(k).num_rows for f in files for k in range(2)]
+    assert sizes == [10, 10, 10, 1]
+
+@pytest.mark.parametrize("reader", ["xarray", "arrow"])
+def test_stream_engine_matches_dask(tmp_path, reader):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=5, nprof=3, nlevels=7)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+
+    ref_dir = str(tmp_path / "dask") + "/"
+    ref = daskTools(db_type="PHY", out_dir=ref_dir, flist=flist, schema_path=schema.schema_fname, chunk=2, reader=reader)
+    ref.convert_to_parquet()
+
+    out_dir = str(tmp_path / "stream") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader=reader, engine="stream", row_group_size=20, ntasks=2)
+    converter.convert_to_parquet()
+
+    fragments = am.list_fragments(out_dir, "PHY")
+    row_groups = [pq.ParquetFile(f).metadata.row_group(k).num_rows for f in fragments for k in range(pq.ParquetFile(f).metadata.num_row_groups)]
+    assert max(row_groups) == 20 and sum(row_groups) == 5*3*7
+
+    table = read_sorted(out_dir, converter.schema)
+    table_ref = read_sorted(ref_dir, converter.schema).select(table.schema.names)
+    for name in table.schema.names:
+        assert table[name].equals(table_ref[name].cast(table[name].type)), name
+
+    md = pq.read_metadata(out_dir + "_metadata")
+    assert md.num_rows == 5*3*7
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+## @file test_summary.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_manifest as am
+import argo2parquet.argo_summary as asm
+from argo2parquet.argoReader import argoReader
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import numpy as np
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+def gridded_df(out_dir, cell):
+    """Rows of the database that the summaries hold, with their cells"""
+
+    df = pq.ParquetDataset(am.list_fragments(out_dir, "PHY")).read().to_pandas()
+    df = df.dropna(subset=["LATITUDE", "LONGITUDE", "JULD", "PRES_ADJUSTED"])
+    df["lat_cell"] = np.floor(df["LATITUDE"]/cell)*cell
+    df["lon_cell"] = np.floor(((df["LONGITUDE"] + 180) % 360 - 180)/cell)*cell
+
+    return df
+
+def test_summary(tmp_path):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=8, nprof=6, nlevels=20)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", chunk=3, row_group_size=40)
+    converter.convert_to_parquet()
+
+    summary = asm.update_summary(out_dir, "PHY", cell=10)
+    assert os.path.isfile(out_dir + "metadata/ArgoPHY_summary.parquet")
+    assert os.path.isfile(out_dir + "metadata/ArgoPHY_summary_partials.parquet")
+
+    df = gridded_df(out_dir, 10)
+    for name in ["PRES_ADJUSTED", "TEMP_ADJUSTED", "PSAL_ADJUSTED"]:
+        assert summary[name + "_count"].sum() == df[name].count() > 0
+        assert summary[name + "_sum"].sum() == pytest.approx(df[name].astype(float).sum())
+        assert summary[name + "_sumsq"].sum() == pytest.approx((df[name].astype(float)**2).sum())
+        assert summary[name + "_min"].min() == df[name].min()
+        assert summary[name + "_max"].max() == df[name].max()
+
+    # the merged partials are the summary of the whole database
+    table = pq.ParquetDataset(am.list_fragments(out_dir, "PHY")).read()
+    whole = asm.summarize_table(table, asm.summary_vars(table.schema), asm.summary_grid(cell=10))
+    whole = asm.merge_summaries([whole])
+    assert len(whole) == len(summary)
+    assert np.allclose(whole["TEMP_ADJUSTED_sum"], summary["TEMP_ADJUSTED_sum"])
+
+    # map of the mean temperature, from the summary alone
+    reader = argoReader(out_dir, "PHY")
+    grid = reader.gridded(["TEMP"])
+    expected = df.groupby(["lat_cell", "lon_cell"])["TEMP_ADJUSTED"].agg(["mean", "std", "count"]).reset_index()
+    assert len(grid) == len(expected)
+    assert np.allclose(grid["TEMP_ADJUSTED_mean"], expected["mean"])
+    assert np.allclose(grid["TEMP_ADJUSTED_std"], expected["std"]*np.sqrt((expected["count"] - 1)/expected["count"]), equal_nan=True)
+
+    # selection at the resolution of the grid
+    grid = reader.gridded(["PSAL"], region=(0, 30, -180, 180), pres=(100, 400), by=["pres_bin"])
+    keep = (df["lat_cell"] >= 0) & (df["lat_cell"] <= 30) & (df["PRES_ADJUSTED"] >= 100) & (df["PRES_ADJUSTED"] < 500)
+    assert grid["PSAL_ADJUSTED_count"].sum() == df.loc[keep, "PSAL_ADJUSTED"].count()
+    assert set(grid["pres_bin"]) <= {100, 125, 150, 200, 250, 300, 400}
+
+def test_summary_incremental(tmp_path):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=4, nprof=3, nlevels=5)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", chunk=2)
+    converter.convert_to_parquet()
+    asm.update_summary(out_dir, "PHY")
+
+    grid = asm.summary_grid()
+    previous = asm.load_summary(out_dir, "PHY", partials=True)
+    assert asm.build_partials(out_dir, "PHY", grid, previous=previous)[1] == 0
+    # a different grid summarizes every fragment again
+    assert asm.build_partials(out_dir, "PHY", asm.summary_grid(cell=1), previous=previous)[1] == len(am.list_fragments(out_dir, "PHY"))
+
+    # only the new fragments and the fragment rewritten without the float are
+    # summarized again
+    write_argo_file(flist[0], wmoid=1900001, nprof=6, nlevels=5, seed=42)
+    converter.update_parquet([flist[0]], [1900001])
+    partials, nsummarized = asm.build_partials(out_dir, "PHY", grid, previous=previous)
+    assert 0 < nsummarized < len(am.list_fragments(out_dir, "PHY"))
+
+    summary = asm.update_summary(out_dir, "PHY")
+    df = gridded_df(out_dir, grid["cell"])
+    assert summary["TEMP_ADJUSTED_count"].sum() == df["TEMP_ADJUSTED"].count()
+    assert summary["TEMP_ADJUSTED_sum"].sum() == pytest.approx(df["TEMP_ADJUSTED"].astype(float).sum())
+
+    with pytest.raises(ValueError):
+        asm.summary_grid(cell=7)
+
+def test_summary_empty(tmp_path):
+
+    # database without fragments
+    out_dir = str(tmp_path / "empty") + "/"
+    assert len(asm.update_summary(out_dir, "PHY")) == 0
+    assert len(asm.update_summary(out_dir, "PHY")) == 0
+
+    # fragments without adjusted values, as those of real-time floats
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=2, nprof=3, nlevels=5)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+    out_dir = str(tmp_path / "parquet") + "/"
+    converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", chunk=1)
+    converter.convert_to_parquet()
+    fragments = am.list_fragments(out_dir, "PHY")
+    for fragment in fragments:
+        table = pq.read_table(fragment)
+        index = table.schema.get_field_index("PRES_ADJUSTED")
+        table = table.set_column(index, table.schema.field(index), pa.nulls(table.num_rows, table.schema.field(index).type))
+        pq.write_table(table, fragment)
+
+    summary = asm.update_summary(out_dir, "PHY")
+    assert len(summary) == 0
+    assert len(argoReader(out_dir, "PHY").gridded(["TEMP"])) == 0
+
+    # the fragments are not read again
+    grid = asm.summary_grid()
+    previous = asm.load_summary(out_dir, "PHY", partials=True)
+    assert len(previous) == len(fragments)
+    assert asm.build_partials(out_dir, "PHY", grid, previous=previous)[1] == 0
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+## @file test_write_profiles.py
+#
+#
+## @author Enrico Milanese <enrico.milanese@whoi.edu>
+#
+## @date Sat 09 Nov 2024
+
+##########################################################################
+import argo2parquet.argo_arrow as aa
+import argo2parquet.argo_manifest as am
+from argo2parquet.daskTools import daskTools
+from argo2parquet.generateSchema import generateSchema
+import pyarrow.parquet as pq
+import pytest
+from synthetic import write_argo_file, write_argo_tree
+##########################################################################
+
+def column_chunks(fragment):
+    """Metadata of the column chunks of the first row group, by column name"""
+
+    md = pq.ParquetFile(fragment).metadata
+    return {md.schema.column(k).name: md.row_group(0).column(k) for k in range(md.num_columns)}
+
+def test_writer_kwargs(tmp_path):
+
+    schema = generateSchema(outdir=str(tmp_path) + "/", db="phy").schema
+
+    assert aa.writer_kwargs(schema) == {}
+    assert aa.writer_kwargs(schema, "fast-write") == {"compression": "lz4"}
+
+    kwargs = aa.writer_kwargs(schema, "archive")
+    assert kwargs["compression"] == "zstd"
+    assert kwargs["compression_level"]["TEMP"] == 19
+    assert kwargs["compression_level"]["LATITUDE"] == 9
+    assert set(kwargs["compression_level"]) == set(schema.names)
+
+    # the profile comes on top of the encodings of the compact schema
+    schema = generateSchema(outdir=str(tmp_path) + "/", db="phy", compact=True).schema
+    kwargs = aa.writer_kwargs(schema, "query-optimized")
+    assert kwargs["write_page_index"] and kwargs["column_encoding"]["TEMP"] == "BYTE_STREAM_SPLIT"
+
+    with pytest.raises(ValueError):
+        aa.writer_kwargs(schema, "fastest")
+    with pytest.raises(ValueError):
+        daskTools(db_type="PHY", out_dir=str(tmp_path), flist=[], schema_path=str(tmp_path) + "/ArgoPHY_schema.metadata", write_profile="fastest")
+
+@pytest.mark.parametrize("engine", ["dask", "stream"])
+def test_write_profiles_conversion(tmp_path, engine):
+
+    flist = write_argo_tree(str(tmp_path / "dac"), nfloats=3, nprof=3, nlevels=10)
+    schema = generateSchema(outdir=str(tmp_path) + "/schemas/", db="phy")
+
+    expected = {None: "SNAPPY", "fast-write": "LZ4", "archive": "ZSTD", "query-optimized": "ZSTD"}
+    tables = {}
+    for write_profile, codec in expected.items():
+        out_dir = str(tmp_path / ("parquet_" + str(write_profile))) + "/"
+        converter = daskTools(db_type="PHY", out_dir=out_dir, flist=flist, schema_path=schema.schema_fname, reader="arrow", engine=engine, write_profile=write_profile)
+        converter.convert_to_parquet()
+
+        fragments = am.list_fragments(out_dir, "PHY")
+        tables[write_profile] = pq.ParquetDataset(fragments).read().sort_by([("PLATFORM_NUMBER", "ascending"), ("N_PROF", "ascending"), ("N_LEVELS", "ascending")])
+        chunks = column_chunks(fragments[0])
+        assert {c.compression for c in chunks.values()} == {codec}
+        assert chunks["TEMP"].has_offset_index == (write_profile == "query-optimized")
+
+    for write_profile in expected:
+        assert tables[write_profile].equals(tables[None])
+
+    # fragments rewritten by an incremental update keep the profile
+    write_argo_file(flist[0], wmoid=1900001, nprof=5, nlevels=10, seed=42)
+    converter.update_parquet([flist[0]], [1900001])
+    for fragment in am.list_fragments(out_dir, "PHY"):
+        chunks = column_chunks(fragment)
+        assert chunks["TEMP"].compression == "ZSTD" and chunks["TEMP"].has_offset_index